@@ -1,12 +1,26 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import pyodbc
 import plotly.express as px
 from datetime import datetime
 from streamlit_option_menu import option_menu
-from geopy.geocoders import Nominatim
-from geopy.extra.rate_limiter import RateLimiter
-from contextlib import closing
+import os
+from auth import Authenticator, LoginThrottled
+from chart_data import downsample, largest, top_n
+from data_store import DataStore
+from dtype_schema import normalize_frames
+from figure_cache import FigureCache, cached_chart
+from geocode_cache import geocode_frame
+from leaderboard import RANKINGS
+from parallel_loader import PartialLoadError, failures
+from profiling import cache_stats, diagnostics_page, profiler, show_diagnostics, stage, timed
+from sales_analytics import Filters, SalesAnalytics, SqlSalesAnalytics
+from spatial_grid import MAP_MAX_ZOOM, MAP_MIN_ZOOM, SpatialGrid, fit_zoom
+from sql_sync import SalesSync
+from table_viewer import TableViewer, paginated_table
+from functools import partial
+from db_pool import ConnectionPool
 from PIL import Image
 
 # Configuration de la page Streamlit
@@ -16,41 +30,74 @@ st.set_page_config(
     page_icon="📊",
     initial_sidebar_state="expanded"
 )
+rerun_started = profiler.start_rerun()
+
+# Nombre maximal de connexions SQL ouvertes simultanément par le serveur Streamlit
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
 
 # Connexion à SQL Server
-def get_db_connection():
+def connection_string():
     server = 'DESKTOP-2D5TJUA'
     database = 'Total_Stat'
-    conn_str = (
+    return (
         f"DRIVER={{ODBC Driver 17 for SQL Server}};"
         f"SERVER={server};DATABASE={database};Trusted_Connection=yes;"
     )
-    try:
-        return pyodbc.connect(conn_str)
-    except Exception as e:
-        st.error(f"Erreur de connexion : {e}")
-        return None
+
+@st.cache_resource
+def get_db_pool():
+    """Pool de connexions partagé par toutes les sessions (au lieu d'une connexion par appel)."""
+    return ConnectionPool(lambda: pyodbc.connect(connection_string()), max_size=DB_POOL_SIZE)
+
+def get_db_connection():
+    """Connexion empruntée au pool, à utiliser dans un bloc `with`."""
+    return get_db_pool().connection()
+
+@st.cache_resource
+def get_authenticator():
+    """Limitation des tentatives et sessions partagées par toutes les sessions Streamlit."""
+    return Authenticator(get_db_connection)
 
 # Authentification
 def authenticate(username, password):
-    conn = get_db_connection()
-    if not conn:
-        return None
-    
+    """(utilisateur, jeton de session), ou None ; mot de passe vérifié hors de la base."""
     try:
-        with closing(conn.cursor()) as cursor:
-            cursor.execute(
-                "SELECT u.Hyp, e.Type, e.Date_In FROM Users u "
-                "JOIN Effectifs e ON u.Hyp = e.Hyp "
-                "WHERE u.UserName = ? AND u.PassWord = ?", 
-                (username, password))
-            result = cursor.fetchone()
-            return result if result else None
+        return get_authenticator().login(username, password, client=st.context.ip_address)
+    except LoginThrottled:
+        raise
     except Exception as e:
         st.error(f"Erreur d'authentification : {e}")
         return None
-    finally:
-        conn.close()
+
+def start_session(user, token):
+    """Ouvre la session Streamlit ; le jeton dans l'URL permet de la reprendre au rechargement.
+
+    Le jeton n'est valable que pour l'adresse du client qui s'est connecté,
+    expire après inactivité et est révoqué par « Se déconnecter ».
+    """
+    st.session_state.update(user, authenticated=True, session_token=token)
+    st.query_params['session'] = token
+
+def resume_session():
+    """Reprend une session depuis le jeton de l'URL, sans interroger la base."""
+    token = st.query_params.get('session')
+    if not token:
+        return
+    user = get_authenticator().resume(token, client=st.context.ip_address)
+    if user is not None:
+        st.session_state.update(user, authenticated=True, session_token=token)
+    else:
+        # Jeton expiré, révoqué ou d'un autre client : retiré de l'URL
+        del st.query_params['session']
+
+def end_session():
+    """Révoque le jeton de session et revient à la page de connexion."""
+    token = st.session_state.get('session_token')
+    if token:
+        get_authenticator().logout(token)
+    st.session_state.clear()
+    st.session_state["authenticated"] = False
+    st.query_params.pop('session', None)
 
 # Page de connexion
 def login_page():
@@ -63,132 +110,212 @@ def login_page():
         password = st.text_input("Mot de passe", type="password")
         
         if st.button("Se connecter"):
-            user_data = authenticate(username, password)
-            if user_data:
-                st.session_state.update({
-                    "authenticated": True,
-                    "hyp": user_data[0],
-                    "user_type": user_data[1],
-                    "date_in": user_data[2],
-                    "username": username
-                })
-                st.success("Authentification réussie")
-                st.rerun()
+            try:
+                result = authenticate(username, password)
+            except LoginThrottled as e:
+                st.error(str(e))
             else:
-                st.error("Identifiants incorrects")
+                if result:
+                    start_session(*result)
+                    st.success("Authentification réussie")
+                    st.rerun()
+                else:
+                    st.error("Identifiants incorrects")
 
-@st.cache_data
-def load_data():
-    """Chargement des données depuis SQL Server."""
+# Copie locale des tables, rafraîchie par delta toutes les SYNC_TTL secondes
+SYNC_DIR = os.path.join('.snapshots', 'sql')
+SYNC_TTL = 300
+
+@st.cache_resource
+def get_sales_sync():
+    """Copie locale (Parquet) des ventes, partagée par toutes les sessions."""
+    return SalesSync(SYNC_DIR)
+
+@timed()
+def load_tables(sync, pool):
+    """Chargement des données depuis SQL Server (seules les nouvelles ventes sont lues)."""
+    meta = {}
     try:
-        conn = get_db_connection()
-        if not conn:
-            return pd.DataFrame(), pd.DataFrame()
-
-        with closing(conn.cursor()) as cursor:
-            # Chargement des données Sales
-            cursor.execute("""
-                SELECT Hyp, ORDER_REFERENCE, ORDER_DATE, SHORT_MESSAGE, Country, City, Total_sale, Rating, Id_Sale 
-                FROM Sales""")
-            sales_df = pd.DataFrame.from_records(cursor.fetchall(), 
-                                               columns=[column[0] for column in cursor.description])
-
-            # Chargement des données Staff
-            cursor.execute("""
-                SELECT Hyp, Team, Activité, Date_In 
-                FROM Effectifs""")
-            staff_df = pd.DataFrame.from_records(cursor.fetchall(),
-                                               columns=[column[0] for column in cursor.description])
-
-        return sales_df, staff_df
+        # Sales et Effectifs lus en même temps, chacun sur une connexion du pool
+        with stage('sql_sync'):
+            _, meta['load_report'] = sync.refresh_parallel(pool.connection)
+    except PartialLoadError as e:
+        meta['error'] = str(e)
+        meta['load_report'] = e.report
     except Exception as e:
-        st.error(f"Erreur de chargement des données: {str(e)}")
-        return pd.DataFrame(), pd.DataFrame()
-    finally:
-        if conn:
-            conn.close()
-
-@st.cache_data
-def preprocess_data(df):
-    """Prétraitement des données."""
-    if 'ORDER_DATE' in df.columns:
-        df['ORDER_DATE'] = pd.to_datetime(df['ORDER_DATE'], errors='coerce')
-    if 'Total_sale' in df.columns:
-        df['Total_sale'] = pd.to_numeric(df['Total_sale'], errors='coerce').fillna(0)
-    
-    if 'Date_In' in df.columns:
-        df['Date_In'] = pd.to_datetime(df['Date_In'], errors='coerce')
-    return df
+        # Base injoignable : on sert la dernière copie locale
+        meta['error'] = str(e)
+    # Tables et structures tenues à jour d'une même version : le snapshot les
+    # garde, les deltas suivants en produisent des copies
+    with stage('sync_state'):
+        meta['sync_state'] = sync.state(cubes=[SALES_CUBE],
+                                        trends=[(SALES_CUBE[0], by) for by in TREND_DIMENSIONS],
+                                        leaderboards=[SALES_CUBE[0]])
+    # Dates, montants et catégories partagées entre Sales et Effectifs ; les
+    # tables de la synchronisation ne sont pas modifiées
+    with stage('normalize_frames'):
+        frames, memory_report = normalize_frames({'Sales': meta['sync_state'].sales_df,
+                                                  'Effectifs': meta['sync_state'].staff_df})
+    meta['memory_report'] = memory_report
+    return frames, meta
 
-def filter_data(df, country_filter, team_filter, activity_filter, start_date, end_date, staff_df, current_hyp=None):
-    """Appliquer les filtres aux données en utilisant Hyp comme clé."""
-    filtered_df = df.copy()
-    
-    if current_hyp:
-        return filtered_df[filtered_df['Hyp'] == current_hyp]
-    
-    if 'ORDER_DATE' in filtered_df.columns:
-        filtered_df = filtered_df[
-            (filtered_df['ORDER_DATE'] >= pd.to_datetime(start_date)) & 
-            (filtered_df['ORDER_DATE'] <= pd.to_datetime(end_date))
-        ]
-    
-    if country_filter != 'Tous' and 'Country' in filtered_df.columns:
-        filtered_df = filtered_df[filtered_df['Country'] == country_filter]
-    
-    if 'Hyp' in filtered_df.columns and not staff_df.empty:
-        staff_filtered = staff_df.copy()
-        
-        if team_filter != 'Toutes':
-            staff_filtered = staff_filtered[staff_filtered['Team'] == team_filter]
-        if activity_filter != 'Toutes':
-            staff_filtered = staff_filtered[staff_filtered['Activité'] == activity_filter]
-        
-        filtered_df = filtered_df[filtered_df['Hyp'].isin(staff_filtered['Hyp'])]
+# Intervalle (secondes) auquel le thread de rechargement vérifie l'âge des données
+SYNC_POLL = 5
+
+@st.cache_resource
+def get_data_store():
+    """Données partagées par toutes les sessions, rechargées toutes les SYNC_TTL secondes.
+
+    Le rechargement (delta SQL, index, cube, géocodage) tourne dans un thread de
+    fond ; les sessions continuent d'utiliser le snapshot précédent pendant ce temps.
+    """
+    sync = get_sales_sync()
+    store = DataStore(partial(load_tables, sync, get_db_pool()), max_age=SYNC_TTL,
+                      warmup=warm_snapshot)
+    store.start_refresher(poll=SYNC_POLL)
+    return store
+
+@st.cache_resource
+def get_figure_cache():
+    """Figures partagées par les sessions, par version des données et filtres."""
+    return FigureCache()
+
+def frame_version(*frames):
+    """Empreinte du contenu de petits DataFrames agrégés, pour les clés du cache des figures."""
+    return tuple(int(pd.util.hash_pandas_object(df, index=False).sum()) for df in frames)
+
+def none_if_all(value):
+    """Les valeurs 'Tous' / 'Toutes' des listes déroulantes signifient « pas de filtre »."""
+    return None if value in ('Tous', 'Toutes') else value
+
+# Cube journalier des ventes tenu à jour par la synchronisation
+SALES_CUBE = ('Total_sale', ('Country', 'City', 'Hyp'))
+# Séries de tendances tenues à jour par la synchronisation (Team : regroupement des Hyp)
+TREND_DIMENSIONS = ('Hyp', 'City')
+
+def get_analytics(snapshot):
+    """Calculs locaux (index, cube, résultats mémorisés) d'un snapshot des ventes."""
+    def build():
+        # Cube, séries et classement tenus à jour par la synchronisation, de la
+        # version du snapshot (seuls les jours des nouvelles ventes sont recalculés)
+        state = snapshot.meta['sync_state']
+        trends = {('Sales', by): state.trends[(SALES_CUBE[0], by)] for by in TREND_DIMENSIONS}
+        return SalesAnalytics(snapshot.frames, tables={'Sales': SALES_CUBE}, staff_table='Effectifs',
+                              staff_columns=('Team', 'Activité'), cubes={'Sales': state.cubes[SALES_CUBE]},
+                              trends=trends, leaderboards={'Sales': state.leaderboards[SALES_CUBE[0]]})
+    return snapshot.derived('analytics', build)
+
+@timed()
+def filter_positions(snapshot, country_filter, team_filter, activity_filter, start_date, end_date):
+    """Positions des ventes retenues par les filtres, en utilisant Hyp comme clé."""
+    filters = Filters(start_date, end_date, none_if_all(country_filter),
+                      team=none_if_all(team_filter), activity=none_if_all(activity_filter))
+    return get_analytics(snapshot).positions(filters)
+
+# Agrégats du tableau de bord calculés par la base (DASHBOARD_PUSHDOWN=0 : sur le cube local)
+DASHBOARD_PUSHDOWN = os.environ.get('DASHBOARD_PUSHDOWN', '1') != '0'
+
+@cache_stats(st.cache_data(ttl=SYNC_TTL))
+def load_filter_options():
+    """Listes des filtres et bornes de dates, lues en base sans charger les tables."""
+    with get_db_connection() as conn:
+        return SqlSalesAnalytics(conn).filter_options()
+
+@cache_stats(st.cache_data(ttl=SYNC_TTL))
+def dashboard_aggregates(start_date, end_date, country, team, activity):
+    """KPI et ventes par ville / équipe calculés en base, mis en cache par jeu de filtres."""
+    filters = Filters(start_date, end_date, country, team=team, activity=activity)
+    with get_db_connection() as conn:
+        return SqlSalesAnalytics(conn).dashboard(filters)
+
+@timed()
+def cube_aggregates(snapshot, start_date, end_date, country, team, activity):
+    """Mêmes agrégats que `dashboard_aggregates`, sur le cube journalier local."""
+    return get_analytics(snapshot).dashboard(Filters(start_date, end_date, country, team=team, activity=activity))
 
-    return filtered_df
+# Résumés par agent gardés en cache (au plus AGENT_CACHE_SIZE agents à la fois)
+AGENT_CACHE_SIZE = 500
 
-@st.cache_data
+@cache_stats(st.cache_data(ttl=SYNC_TTL, max_entries=AGENT_CACHE_SIZE))
+def load_agent_summary(hyp):
+    """KPI et série journalière d'un agent, sans charger la table Sales."""
+    with get_db_connection() as conn:
+        return SqlSalesAnalytics(conn).agent_summary(hyp)
+
+@timed()
+def load_frames():
+    """Snapshot courant des tables Sales et Effectifs (partagé, à ne pas modifier en place)."""
+    store = get_data_store()
+    snapshot = store.current()
+    if store.last_error is not None:
+        st.warning(f"Dernier rechargement en échec, données précédentes affichées : {store.last_error}")
+    if snapshot.meta.get('error'):
+        st.error(f"Erreur de chargement des données: {snapshot.meta['error']}")
+    else:
+        for name, error in failures(snapshot.meta.get('load_report', {})).items():
+            st.warning(f"Table {name} non rafraîchie, copie locale affichée : {error}")
+    return snapshot
+
+@timed()
 def geocode_data(df):
     if 'Latitude' in df.columns and 'Longitude' in df.columns:
         return df
     
-    geolocator = Nominatim(user_agent="sales_dashboard")
-    geocode = RateLimiter(geolocator.geocode, min_delay_seconds=1)
-    
-    cities = df[['City', 'Country']].drop_duplicates()
-    locations = []
-    
-    for _, row in cities.iterrows():
-        try:
-            location = geocode(f"{row['City']}, {row['Country']}")
-            if location:
-                locations.append({
-                    'City': row['City'], 
-                    'Country': row['Country'],
-                    'Latitude': location.latitude,
-                    'Longitude': location.longitude
-                })
-        except:
-            continue
-    
-    if locations:
-        locations_df = pd.DataFrame(locations)
-        df = pd.merge(df, locations_df, on=['City', 'Country'], how='left')
-    return df
+    # Cache SQLite + gazetteer local : aucun appel réseau pendant l'affichage
+    # (les villes inconnues sont ajoutées par `python geocode_cache.py prefill`)
+    return geocode_frame(df)
+
+def get_geocoded_sales(snapshot):
+    """Ventes avec Latitude / Longitude, géocodées une fois par snapshot."""
+    return snapshot.derived('geocoded_sales', lambda: geocode_data(snapshot['Sales']))
+
+def get_spatial_grid(snapshot):
+    """Mailles de la carte Planning (totaux par niveau de zoom et par pays), une fois par snapshot."""
+    return snapshot.derived('sales_grid', lambda: SpatialGrid(get_geocoded_sales(snapshot), 'Total_sale'))
+
+# Choix « tous les pays » de la carte Planning
+ALL_COUNTRIES = "All countries"
+
+def get_viewer(snapshot, name, build_df):
+    """Tableau paginé (permutations triées mémorisées), construit une fois par snapshot."""
+    return snapshot.derived(('viewer', name), lambda: TableViewer(build_df()))
+
+@timed()
+def warm_snapshot(snapshot):
+    """Construit index, cube, géocodage et tri par défaut d'un nouveau snapshot avant sa publication."""
+    get_analytics(snapshot).warm()
+    if not snapshot['Sales'].empty:
+        viewer = get_viewer(snapshot, 'geocoded_sales', lambda: get_geocoded_sales(snapshot))
+        viewer.sort_order('Total_sale', ascending=False)
+        get_spatial_grid(snapshot)
+
+# Niveaux et périodes du panneau de tendances
+TREND_LEVELS = {'Hyp': "Agent", 'Team': "Équipe", 'City': "Ville"}
+TREND_PERIODS = {'W': "Semaine", 'MS': "Mois"}
 
 def manager_dashboard():
-    sales_df, staff_df = load_data()
-    sales_df = preprocess_data(sales_df)
-    staff_df = preprocess_data(staff_df)
+    # En mode agrégé, le tableau de bord ne charge pas les tables : seules les
+    # pages qui affichent des lignes (Sales, Planning) appellent load_frames
+    pushdown = DASHBOARD_PUSHDOWN
+    snapshot = None
+    if pushdown:
+        try:
+            options = load_filter_options()
+        except Exception as e:
+            st.warning(f"Agrégation en base indisponible, calcul local : {e}")
+            pushdown = False
+    if not pushdown:
+        snapshot = load_frames()
+        sales_df, staff_df = snapshot['Sales'], snapshot['Effectifs']
+        options = get_analytics(snapshot).filter_options()
 
     with st.sidebar:
         st.image('TotalEnergies.png', width=200)
         st.markdown("<h1 style='text-align: center; color: #00a083;'>Menu</h1>", unsafe_allow_html=True)
         selected = option_menu(
             menu_title=None,
-            options=["Tableau de bord", "Sales", "Recolt", "Planning"],
-            icons=["bar-chart", "currency-dollar", "list-ul", "calendar"],
+            options=["Tableau de bord", "Tendances", "Classement", "Sales", "Recolt", "Planning"],
+            icons=["bar-chart", "graph-up", "trophy", "currency-dollar", "list-ul", "calendar"],
             default_index=0
         )
         
@@ -196,8 +323,8 @@ def manager_dashboard():
         st.markdown("<h2 style='font-size: 16px; color: #00a083;'>Filtres de Dates</h2>", unsafe_allow_html=True)
         
         with st.expander("Période", expanded=True):
-            min_date = sales_df['ORDER_DATE'].min() if not sales_df.empty else datetime.now()
-            max_date = sales_df['ORDER_DATE'].max() if not sales_df.empty else datetime.now()
+            min_date = options['min_date'] if options['min_date'] is not None else datetime.now()
+            max_date = options['max_date'] if options['max_date'] is not None else datetime.now()
             
             col1, col2 = st.columns(2)
             with col1:
@@ -205,6 +332,16 @@ def manager_dashboard():
             with col2:
                 end_date = st.date_input("Date fin", max_date, min_value=min_date, max_value=max_date)
 
+        with st.expander("Connexions SQL"):
+            st.json(get_db_pool().metrics())
+
+        with st.expander("Cache des figures"):
+            st.json(get_figure_cache().stats())
+
+    if selected in ("Tendances", "Classement", "Sales", "Planning") and snapshot is None:
+        snapshot = load_frames()
+        sales_df, staff_df = snapshot['Sales'], snapshot['Effectifs']
+
     if selected == "Sales":
         st.header("Vue Détailée des Données Sales")
         col1, col2, col3 = st.columns([2, 2, 2])
@@ -218,42 +355,119 @@ def manager_dashboard():
         with col3:
             selected_activity = st.selectbox("Sélectionner activité", ['Toutes'] + sorted(staff_df['Activité'].dropna().unique()))
         
-        filtered_sales = filter_data(sales_df, country_sales_filter, selected_team, selected_activity, start_date, end_date, staff_df)
-        st.dataframe(filtered_sales)
+        sales_positions = filter_positions(snapshot, country_sales_filter, selected_team, selected_activity, start_date, end_date)
+        # Seule la page visible est envoyée au navigateur
+        paginated_table(get_viewer(snapshot, 'Sales', lambda: snapshot['Sales']), sales_positions, key='sales')
 
     elif selected == "Tableau de bord":
         st.header("Analyse Commerciale - Sales")
         col1, col2, col3 = st.columns([2, 2, 2])
         
         with col1:
-            country_sales_filter = st.selectbox("Filtrer par Pays (Sales)", ['Tous'] + sorted(sales_df['Country'].dropna().unique()))
+            country_sales_filter = st.selectbox("Filtrer par Pays (Sales)", ['Tous'] + options['countries'])
         
         with col2:
-            selected_team = st.selectbox("Sélectionner équipe", ['Toutes'] + sorted(staff_df['Team'].dropna().unique()))
+            selected_team = st.selectbox("Sélectionner équipe", ['Toutes'] + options['teams'])
         
         with col3:
-            selected_activity = st.selectbox("Sélectionner activité", ['Toutes'] + sorted(staff_df['Activité'].dropna().unique()))
+            selected_activity = st.selectbox("Sélectionner activité", ['Toutes'] + options['activities'])
             
-        filtered_sales = filter_data(sales_df, country_sales_filter, selected_team, selected_activity, start_date, end_date, staff_df)
+        # KPI et graphiques : lignes agrégées seulement (en base ou sur le cube journalier)
+        filters = (start_date, end_date, none_if_all(country_sales_filter),
+                   none_if_all(selected_team), none_if_all(selected_activity))
+        if pushdown:
+            (total_sales, count_sales, mean_sales), sales_by_city, sales_by_team = dashboard_aggregates(*filters)
+        else:
+            (total_sales, count_sales, mean_sales), sales_by_city, sales_by_team = cube_aggregates(snapshot, *filters)
         
-        if not filtered_sales.empty:
+        if count_sales:
             col1, col2, col3 = st.columns(3)
-            col1.metric("Ventes Totales", f"${filtered_sales['Total_sale'].sum():,.2f}")
-            col2.metric("Vente Moyenne", f"${filtered_sales['Total_sale'].mean():,.2f}")
-            col3.metric("Nombre de Transactions", len(filtered_sales))
+            col1.metric("Ventes Totales", f"${total_sales:,.2f}")
+            col2.metric("Vente Moyenne", f"${mean_sales:,.2f}")
+            col3.metric("Nombre de Transactions", count_sales)
             
-            sales_by_city = filtered_sales.groupby('City')['Total_sale'].sum().reset_index()
-            fig = px.bar(sales_by_city, x='City', y='Total_sale', color='City', title="Ventes par Ville")
-            st.plotly_chart(fig, use_container_width=True)
+            # Figures réutilisées tant que les données et les filtres ne changent pas ;
+            # en mode agrégé, la version est l'empreinte des agrégats reçus de la base
+            version = snapshot.version if snapshot is not None else frame_version(sales_by_city, sales_by_team)
+            key = (version, selected) + filters
+
+            # Catégories bornées (N premières + « Autres ») pour la taille des figures
+            cached_chart(get_figure_cache(), ('sales_by_city',) + key, lambda: px.bar(
+                top_n(sales_by_city, 'City', 'Total_sale'), x='City', y='Total_sale', color='City',
+                title="Ventes par Ville"), use_container_width=True)
             
-            if not staff_df.empty and 'Hyp' in filtered_sales.columns:
-                sales_with_team = filtered_sales.merge(staff_df[['Hyp', 'Team']], on='Hyp', how='left')
-                sales_by_team = sales_with_team.groupby('Team')['Total_sale'].sum().reset_index()
-                fig = px.pie(sales_by_team, names='Team', values='Total_sale', title="Répartition des ventes par équipe")
-                st.plotly_chart(fig, use_container_width=True)
+            if not sales_by_team.empty:
+                cached_chart(get_figure_cache(), ('sales_by_team',) + key, lambda: px.pie(
+                    top_n(sales_by_team, 'Team', 'Total_sale'), names='Team', values='Total_sale',
+                    title="Répartition des ventes par équipe"), use_container_width=True)
         else:
             st.warning("Aucune donnée à afficher pour les ventes.")
         
+    elif selected == "Tendances":
+        st.header("Tendances des ventes")
+        col1, col2, col3 = st.columns([2, 2, 2])
+
+        with col1:
+            trend_by = st.selectbox("Regrouper par", list(TREND_LEVELS), format_func=TREND_LEVELS.get)
+
+        with col2:
+            trend_window = st.radio("Somme glissante", [7, 30], format_func=lambda days: f"{days} jours", horizontal=True)
+
+        with col3:
+            trend_freq = st.radio("Comparer par", list(TREND_PERIODS), format_func=TREND_PERIODS.get, horizontal=True)
+
+        # Cumuls journaliers par entité : aucune lecture des transactions par graphique
+        with stage('trend_panel'):
+            lines, deltas = get_analytics(snapshot).trend_panel(trend_by, trend_window, trend_freq)
+
+        if not lines.empty:
+            key = ('trend_lines', snapshot.version, trend_by, trend_window)
+            cached_chart(get_figure_cache(), key, lambda: px.line(
+                lines.astype({trend_by: str}), x='day', y='Total_sale', color=trend_by,
+                title=f"Ventes sur {trend_window} jours glissants"), use_container_width=True)
+
+            if not deltas.empty:
+                st.subheader(f"Évolution par {TREND_PERIODS[trend_freq].lower()} (période du {deltas['period'].iloc[0]:%d/%m/%Y})")
+                st.dataframe(deltas.drop(columns='period'), hide_index=True, use_container_width=True,
+                             column_config={'delta_pct': st.column_config.NumberColumn(format="%.1f %%")})
+        else:
+            st.warning("Aucune donnée à afficher pour les ventes.")
+
+    elif selected == "Classement":
+        st.header("Classement des agents")
+        col1, col2, col3, col4 = st.columns([2, 2, 2, 2])
+
+        with col1:
+            ranking_by = st.selectbox("Classer par", list(RANKINGS), format_func=RANKINGS.get)
+
+        with col2:
+            selected_team = st.selectbox("Sélectionner équipe", ['Toutes'] + options['teams'])
+
+        with col3:
+            selected_activity = st.selectbox("Sélectionner activité", ['Toutes'] + options['activities'])
+
+        with col4:
+            min_count = st.number_input("Ventes minimum", min_value=1, value=1, step=1)
+
+        top = st.slider("Nombre d'agents affichés", 5, 100, 20, step=5)
+        filters = Filters(start_date, end_date, team=none_if_all(selected_team),
+                          activity=none_if_all(selected_activity))
+        # Totaux par Hyp sur la période puis sélection partielle des premiers
+        with stage('leaderboard'):
+            ranking, ranked = get_analytics(snapshot).ranking(filters, ranking_by, top, int(min_count))
+
+        if not ranking.empty:
+            st.caption(f"{ranked} agents classés sur la période")
+            key = ('leaderboard', snapshot.version, ranking_by, top, int(min_count)) + filters
+            cached_chart(get_figure_cache(), key, lambda: px.bar(
+                ranking.astype({'Hyp': str}), x=ranking_by, y='Hyp', orientation='h',
+                hover_data=[column for column in ('NOM', 'PRENOM', 'Team') if column in ranking.columns],
+                title=f"{RANKINGS[ranking_by]} par agent").update_yaxes(autorange='reversed'),
+                use_container_width=True)
+            st.dataframe(ranking.rename(columns=RANKINGS), hide_index=True, use_container_width=True)
+        else:
+            st.warning("Aucun agent à classer sur la période.")
+
     elif selected == "Planning":
         st.header("Planification")
         col1, col2 = st.columns([1, 5])
@@ -273,126 +487,172 @@ def manager_dashboard():
         with col3:
             st.metric("Transactions", len(sales_df))
             
-        fig = px.bar(
-            sales_df.groupby('City')['Total_sale'].sum().reset_index(),
+        cached_chart(get_figure_cache(), ('planning_by_city', snapshot.version), lambda: px.bar(
+            top_n(sales_df.groupby('City', observed=True)['Total_sale'].sum().reset_index(), 'City', 'Total_sale'),
             x='City',
             y='Total_sale',
             color='City',
             title="Sales by City"
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        ), use_container_width=True)
             
         if 'Latitude' not in sales_df.columns or 'Longitude' not in sales_df.columns:
             with st.spinner("Geocoding cities... This may take a while for large datasets"):
-                sales_df = geocode_data(sales_df)
+                # Géocodage fait une fois par snapshot, partagé par les sessions
+                sales_df = get_geocoded_sales(snapshot)
             
         countries = sorted(sales_df['Country'].unique())
-        selected_country = st.selectbox("Select Country", countries)
-        filtered_df = sales_df[sales_df['Country'] == selected_country]
-            
-        city_data = filtered_df.groupby(['City', 'Latitude', 'Longitude']).agg(
-            TOTAL_SALES=('Total_sale', 'sum'),
-            TRANSACTION_COUNT=('Total_sale', 'count')
-        ).reset_index().dropna()
+        selected_country = st.selectbox("Select Country", [ALL_COUNTRIES] + countries, index=1 if countries else 0)
+        if selected_country == ALL_COUNTRIES:
+            groups, positions = None, None
+            filtered_df = sales_df
+        else:
+            groups = [selected_country]
+            country_mask = (sales_df['Country'] == selected_country).to_numpy()
+            positions = np.flatnonzero(country_mask)
+            filtered_df = sales_df[country_mask]
+
+        # Mailles précalculées par niveau de zoom : la carte ne lit que celles du niveau affiché
+        grid = get_spatial_grid(snapshot)
+        extent = grid.extent(groups)
             
-        if not city_data.empty:
+        if extent is not None:
             st.subheader(f"Sales Map - {selected_country}")
+            zoom = st.slider("Map detail level", MAP_MIN_ZOOM, MAP_MAX_ZOOM, fit_zoom(*extent),
+                             key=f"map_zoom_{selected_country}")
             
-            fig = px.scatter_mapbox(
-                city_data,
-                lat="Latitude",
-                lon="Longitude",
-                size="TOTAL_SALES",
-                color="TOTAL_SALES",
-                hover_name="City",
-                hover_data={
-                    "TOTAL_SALES": ":$.2f",
-                    "TRANSACTION_COUNT": True,
-                    "Latitude": False,
-                    "Longitude": False
-                },
-                zoom=5,
-                center={
-                    "lat": city_data['Latitude'].mean(),
-                    "lon": city_data['Longitude'].mean()
-                },
-                title=f"Sales Distribution in {selected_country}",
-                size_max=30,
-                color_continuous_scale=px.colors.sequential.Viridis,
-                mapbox_style="open-street-map"
-            )
-            
-            fig.update_layout(
-                height=600,
-                margin={"r":0,"t":40,"l":0,"b":0},
-                coloraxis_colorbar={
-                    "title": "Sales Amount",
-                    "tickprefix": "$"
-                }
-            )
-            
-            st.plotly_chart(fig, use_container_width=True)
+            def sales_map():
+                # Les mailles les plus importantes, dans la limite de points de la figure
+                map_data = largest(grid.bins(zoom, groups), 'TOTAL_SALES')
+                lat_min, lat_max, lon_min, lon_max = extent
+                fig = px.scatter_mapbox(
+                    map_data,
+                    lat="Latitude",
+                    lon="Longitude",
+                    size="TOTAL_SALES",
+                    color="TOTAL_SALES",
+                    hover_name="City",
+                    hover_data={
+                        "TOTAL_SALES": ":$.2f",
+                        "TRANSACTION_COUNT": True,
+                        "CITY_COUNT": True,
+                        "Latitude": False,
+                        "Longitude": False
+                    },
+                    zoom=zoom,
+                    center={
+                        "lat": (lat_min + lat_max) / 2,
+                        "lon": (lon_min + lon_max) / 2
+                    },
+                    title=f"Sales Distribution in {selected_country}",
+                    size_max=30,
+                    color_continuous_scale=px.colors.sequential.Viridis,
+                    mapbox_style="open-street-map"
+                )
+
+                fig.update_layout(
+                    height=600,
+                    margin={"r":0,"t":40,"l":0,"b":0},
+                    coloraxis_colorbar={
+                        "title": "Sales Amount",
+                        "tickprefix": "$"
+                    }
+                )
+                return fig
+
+            map_key = (snapshot.version, selected_country)
+            cached_chart(get_figure_cache(), ('planning_map', zoom) + map_key, sales_map, use_container_width=True)
             
             st.subheader("Top Cities by Sales")
-            top_cities = city_data.sort_values('TOTAL_SALES', ascending=False).head(10)
-            fig_bar = px.bar(
-                top_cities,
+            # Comme la carte : seules les villes géocodées
+            cached_chart(get_figure_cache(), ('planning_top_cities',) + map_key, lambda: px.bar(
+                filtered_df.dropna(subset=['Latitude', 'Longitude'])
+                .groupby('City', observed=True)['Total_sale'].sum()
+                .nlargest(10).rename('TOTAL_SALES').reset_index(),
                 x='City',
                 y='TOTAL_SALES',
                 color='TOTAL_SALES',
                 labels={'TOTAL_SALES': 'Total Sales ($)'},
                 text_auto='.2s'
-            )
-            st.plotly_chart(fig_bar, use_container_width=True)
+            ), use_container_width=True)
         else:
             st.warning("No geographic data available for the selected country")
             
         st.subheader("Detailed Sales Data")
-        st.dataframe(
-            filtered_df.sort_values('Total_sale', ascending=False),
-            use_container_width=True,
-            height=400
-        )
+        # Tri Total_sale décroissant précalculé pour le snapshot ; seule la page visible est envoyée
+        viewer = get_viewer(snapshot, 'geocoded_sales', lambda: get_geocoded_sales(snapshot))
+        paginated_table(viewer, positions, key='planning_detail',
+                        sort_column='Total_sale', ascending=False, height=400)
 
         if not staff_df.empty:
-            fig = px.bar(staff_df.groupby('Team').size().reset_index(name='Count'),
-                         x='Team', y='Count', color='Team',
-                         title="Répartition des effectifs par équipe")
-            st.plotly_chart(fig, use_container_width=True)
+            cached_chart(get_figure_cache(), ('staff_by_team', snapshot.version), lambda: px.bar(
+                top_n(staff_df.groupby('Team', observed=True).size().reset_index(name='Count'), 'Team', 'Count'),
+                x='Team', y='Count', color='Team',
+                title="Répartition des effectifs par équipe"), use_container_width=True)
         
         st.markdown("---")
 
+    return selected
+
+def diagnostics():
+    """Page de diagnostic cachée (DASHBOARD_PROFILING=1, puis ?diagnostics=1), réservée aux managers."""
+    diagnostics_page({
+        'figure_cache': get_figure_cache().stats(),
+        'db_pool': get_db_pool().metrics(),
+        'data_store': get_data_store().stats(),
+        'auth': get_authenticator().metrics(),
+        'load_report': get_data_store().current().meta.get('load_report', {}),
+        'analytics': get_analytics(get_data_store().current()).stats(),
+    })
+
 def agent_dashboard():
     st.title(f"Bienvenue {st.session_state['username']}")
     st.info(f"Votre date d'entrée : {st.session_state['date_in'].strftime('%d/%m/%Y')}")
     st.write("Vous avez un accès limité à l'application.")
 
-    sales_df, staff_df = load_data()
-    sales_df = preprocess_data(sales_df)
-    agent_sales = filter_data(sales_df, None, None, None, None, None, staff_df, st.session_state['hyp'])
+    try:
+        summary = load_agent_summary(st.session_state['hyp'])
+    except Exception as e:
+        # Base injoignable : résumé calculé sur la dernière copie locale
+        st.error(f"Erreur de chargement des données: {str(e)}")
+        summary = get_analytics(get_data_store().current()).agent_summary(st.session_state['hyp'])
     
     st.header("Vos Performances")
     
-    if not agent_sales.empty:
+    if summary['count']:
         col1, col2, col3 = st.columns(3)
-        col1.metric("Ventes Totales", f"${agent_sales['Total_sale'].sum():,.2f}")
-        col2.metric("Vente Moyenne", f"${agent_sales['Total_sale'].mean():,.2f}")
-        col3.metric("Nombre de Transactions", len(agent_sales))
+        col1.metric("Ventes Totales", f"${summary['total']:,.2f}")
+        col2.metric("Vente Moyenne", f"${summary['mean']:,.2f}")
+        col3.metric("Nombre de Transactions", summary['count'])
         
-        sales_by_date = agent_sales.groupby(agent_sales['ORDER_DATE'].dt.date)['Total_sale'].sum().reset_index()
-        fig = px.line(sales_by_date, x='ORDER_DATE', y='Total_sale', title="Vos ventes par date")
-        st.plotly_chart(fig, use_container_width=True)
+        # Série réduite par LTTB au-delà du budget de points de la figure
+        key = ('agent_daily', st.session_state['hyp'], frame_version(summary['daily']))
+        cached_chart(get_figure_cache(), key, lambda: px.line(
+            downsample(summary['daily'], 'ORDER_DATE', 'Total_sale'), x='ORDER_DATE', y='Total_sale',
+            title="Vos ventes par date"), use_container_width=True)
     else:
         st.warning("Aucune donnée de vente disponible")
 
 # Gestion de l'état de connexion
 if "authenticated" not in st.session_state:
     st.session_state["authenticated"] = False
+    resume_session()
 
 if st.session_state["authenticated"]:
     if st.session_state["user_type"] in ["Manager", "Hyperviseur"]:
-        manager_dashboard()
+        if show_diagnostics():
+            diagnostics()
+            page = "Diagnostic"
+        else:
+            page = manager_dashboard()
     else:
         agent_dashboard()
+        page = "Agent"
+    with st.sidebar:
+        if st.button("Se déconnecter"):
+            end_session()
+            st.rerun()
 else:
-    login_page()
\ No newline at end of file
+    login_page()
+    page = "Connexion"
+
+profiler.end_rerun(rerun_started, page)
\ No newline at end of file
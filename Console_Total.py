@@ -1,10 +1,22 @@
+import os
+import numpy as np
 import pandas as pd
 import streamlit as st
 import plotly.express as px
 from datetime import datetime
 from streamlit_option_menu import option_menu
-from geopy.geocoders import Nominatim
-from geopy.extra.rate_limiter import RateLimiter
+from chart_data import largest, top_n
+from data_store import DataStore, Snapshot
+from dtype_schema import normalize_frames
+from figure_cache import FigureCache, cached_chart
+from geocode_cache import geocode_frame
+from leaderboard import RANKINGS
+from parallel_loader import Source, failures, load_parallel
+from profiling import diagnostics_page, profiler, show_diagnostics, stage, timed
+from sales_analytics import Filters, SalesAnalytics, SOURCE_DTYPES, SOURCE_SHEETS, preprocess_data
+from snapshot_cache import load_snapshot
+from spatial_grid import MAP_MAX_ZOOM, MAP_MIN_ZOOM, SpatialGrid, fit_zoom
+from table_viewer import TableViewer, paginated_table
 
 # Configuration de la page Streamlit
 st.set_page_config(
@@ -13,54 +25,155 @@ st.set_page_config(
     page_icon="📊",
     initial_sidebar_state="expanded"
 )
+rerun_started = profiler.start_rerun()
 
-@st.cache_data
+# Classeur source (feuilles et types : voir sales_analytics)
+SOURCE_FILE = 'Sources.xlsm'
+
+def load_workbook():
+    """Feuilles Sales / Recolt / Effectif du classeur (via le snapshot Parquet)."""
+    # Le classeur n'est re-parsé que si son contenu a changé
+    return load_snapshot(SOURCE_FILE, SOURCE_SHEETS, SOURCE_DTYPES)
+
+@timed()
+def load_sources():
+    """Chargement des données Excel (via le snapshot Parquet), prétraitées et typées."""
+    # Tables du tableau de bord et vue Planning lues en même temps ; la vue
+    # Planning est facultative : en cas d'échec, la page est vide et le
+    # rapport de chargement le signale
+    with stage('load_snapshot'):
+        results, load_report = load_parallel({
+            'workbook': Source(load_workbook),
+            'planning': Source(load_planning_recolt, required=False),
+        })
+    frames = results['workbook']
+    with stage('preprocess_data'):
+        tables = {
+            'Sales': preprocess_data(frames['Sales']),
+            'Recolt': preprocess_data(frames['Recolt']),
+            'Effectif': preprocess_data(frames['Effectif'].drop_duplicates()),
+        }
+    with stage('normalize_frames'):
+        frames, memory_report = normalize_frames(tables)
+    frames['Planning'] = results.get('planning', pd.DataFrame())
+    return frames, {'memory_report': memory_report, 'load_report': load_report}
+
+@timed()
+def load_planning_recolt():
+    """Recolt (colonnes A:H) nettoyée pour la page Planning."""
+    sheet_name = 'Recolt'
+    
+    # Colonnes A:H lues en flux, TRANSACTION typée pendant la lecture
+    df = load_snapshot(
+        SOURCE_FILE,
+        {sheet_name: 'A:H'},
+        {sheet_name: {'TRANSACTION': 'float'}}
+    )[sheet_name]
+    
+    # Nettoyage des données
+    df_clean = df.dropna().copy()
+    df_clean['TRANSACTION'] = df_clean['TRANSACTION'].fillna(0)
+    
+    return df_clean.reset_index(drop=True)
+
+def snapshot_analytics(snapshot):
+    """Calculs du tableau de bord (index, cubes, résultats mémorisés) d'un snapshot."""
+    return snapshot.derived('analytics', lambda: SalesAnalytics(snapshot.frames))
+
+def snapshot_geocoded_planning(snapshot):
+    """Table de la page Planning avec Latitude / Longitude (cache SQLite + gazetteer, sans réseau)."""
+    def build():
+        df = snapshot['Planning']
+        if 'Latitude' in df.columns and 'Longitude' in df.columns:
+            return df
+        with stage('geocode'):
+            return geocode_frame(df)
+    return snapshot.derived('planning_geocoded', build)
+
+def snapshot_spatial_grid(snapshot):
+    """Mailles de la carte Planning (totaux par niveau de zoom et par pays)."""
+    return snapshot.derived('planning_grid', lambda: SpatialGrid(snapshot_geocoded_planning(snapshot), 'TRANSACTION'))
+
+def snapshot_viewer(snapshot, table):
+    """Tableau paginé (permutations triées mémorisées) d'une table du snapshot."""
+    return snapshot.derived(('viewer', table), lambda: TableViewer(snapshot[table]))
+
+def snapshot_reconciliation_viewer(snapshot, report):
+    """Tableau paginé des ventes impayées ('unpaid') ou des encaissements orphelins ('orphans')."""
+    def build():
+        reconciliation = snapshot_analytics(snapshot).reconciliation()
+        return TableViewer(reconciliation.unpaid() if report == 'unpaid' else reconciliation.orphans)
+    return snapshot.derived(('viewer', report), build)
+
+def snapshot_planning_viewer(snapshot):
+    """Tableau paginé du détail de la page Planning."""
+    return snapshot.derived(('viewer', 'planning_geocoded'), lambda: TableViewer(snapshot_geocoded_planning(snapshot)))
+
+@timed()
+def warm_snapshot(snapshot):
+    """Construit index, cubes, géocodage et tri par défaut d'un nouveau snapshot avant sa publication."""
+    snapshot_analytics(snapshot).warm()
+    if not snapshot['Planning'].empty:
+        snapshot_planning_viewer(snapshot).sort_order('TRANSACTION', ascending=False)
+        snapshot_spatial_grid(snapshot)
+
+# Choix « tous les pays » de la carte Planning
+ALL_COUNTRIES = "All countries"
+
+# Intervalle (secondes) de vérification du classeur source par le thread de rechargement
+SOURCE_POLL = int(os.environ.get('SOURCE_POLL', 10))
+
+def source_signature():
+    """Date de modification et taille du classeur (None s'il est absent)."""
+    try:
+        stat = os.stat(SOURCE_FILE)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+@st.cache_resource
+def get_data_store():
+    """Données partagées par toutes les sessions : un seul exemplaire en mémoire.
+
+    Le classeur est rechargé en arrière-plan dès qu'il change ; les sessions
+    continuent d'utiliser le snapshot précédent pendant le rechargement.
+    """
+    store = DataStore(load_sources, warmup=warm_snapshot)
+    store.start_refresher(poll=SOURCE_POLL, signature=source_signature)
+    return store
+
+@st.cache_resource
+def get_figure_cache():
+    """Figures partagées par les sessions, par version du snapshot et filtres."""
+    return FigureCache()
+
+@timed()
 def load_data():
-    """Chargement des données Excel."""
+    """Snapshot courant des données (à ne pas modifier en place)."""
+    store = get_data_store()
     try:
-        # Charger les données avec les colonnes correctes
-        sales_df = pd.read_excel(
-            'Sources.xlsm',
-            sheet_name='Sales',
-            usecols=['Hyp', 'ORDER_REFERENCE', 'ORDER_DATE', 'SHORT_MESSAGE', 'Country', 'City', 'Montant', 'Rating'],
-            header=0
-        )
-        recolt_df = pd.read_excel(
-            'Sources.xlsm',
-            sheet_name='Recolt',
-            usecols=['Hyp', 'Banques', 'TRANSACTION', 'ORDER_REFERENCE', 'ORDER_DATE', 'SHORT_MESSAGE', 'City', 'Country'],
-            header=0
-        )
-        staff_df = pd.read_excel(
-            'Sources.xlsm',
-            sheet_name='Effectif',
-            usecols=['ID', 'Hyp', 'ID_AGTSDA', 'UserName', 'NOM', 'PRENOM', 'Team', 'Type', 'Activité', 'Departement', 'Date_In'],
-            header=0
-        ).drop_duplicates()
-        
-        return sales_df, recolt_df, staff_df
+        snapshot = store.current()
     except Exception as e:
         st.error(f"Erreur de chargement des fichiers Excel : {str(e)}")
-        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
-
-@st.cache_data
-def preprocess_data(df):
-    """Prétraitement des données."""
-    if 'ORDER_DATE' in df.columns:
-        df['ORDER_DATE'] = pd.to_datetime(df['ORDER_DATE'], errors='coerce')
-    if 'Montant' in df.columns:
-        df['Montant'] = pd.to_numeric(df['Montant'], errors='coerce').fillna(0)
-    if 'TRANSACTION' in df.columns:
-        df['TRANSACTION'] = pd.to_numeric(df['TRANSACTION'], errors='coerce').fillna(0)
-    if 'Date_In' in df.columns:
-        df['Date_In'] = pd.to_datetime(df['Date_In'], errors='coerce')
-    return df
+        empty = {'Sales': pd.DataFrame(), 'Recolt': pd.DataFrame(), 'Effectif': pd.DataFrame(), 'Planning': pd.DataFrame()}
+        return Snapshot(0, empty, {'memory_report': pd.DataFrame()})
+    if store.last_error is not None:
+        st.warning(f"Dernier rechargement du classeur en échec, données précédentes affichées : {store.last_error}")
+    for name, error in failures(snapshot.meta.get('load_report', {})).items():
+        st.warning(f"Source « {name} » non chargée : {error}")
+    return snapshot
+
+# Page de diagnostic cachée (DASHBOARD_PROFILING=1, puis ?diagnostics=1)
+if show_diagnostics():
+    diagnostics_page({'figure_cache': get_figure_cache().stats(), 'data_store': get_data_store().stats()})
+    st.stop()
 
 # Chargement et prétraitement des données
-sales_df, recolt_df, staff_df = load_data()
-sales_df = preprocess_data(sales_df)
-recolt_df = preprocess_data(recolt_df)
-staff_df = preprocess_data(staff_df)
+snapshot = load_data()
+staff_df = snapshot['Effectif']
+analytics = snapshot_analytics(snapshot)
+sales_options, recolt_options = analytics.filter_options('Sales'), analytics.filter_options('Recolt')
+memory_report = snapshot.meta['memory_report']
 
 # Barre latérale : Menu de navigation
 with st.sidebar:
@@ -68,8 +181,8 @@ with st.sidebar:
     st.markdown("<h1 style='text-align: center; color: #00a083;'>Menu</h1>", unsafe_allow_html=True)
     selected = option_menu(
         menu_title=None,
-        options=["Tableau de bord", "Sales", "Recolt", "Planning"],
-        icons=["bar-chart", "currency-dollar", "list-ul", "calendar"],
+        options=["Tableau de bord", "Classement", "Rapprochement", "Sales", "Recolt", "Planning"],
+        icons=["bar-chart", "trophy", "link", "currency-dollar", "list-ul", "calendar"],
         default_index=0
     )
     
@@ -78,52 +191,44 @@ with st.sidebar:
     
     # Filtres de dates globaux
     with st.expander("Période", expanded=True):
-        min_date = min(
-            sales_df['ORDER_DATE'].min() if not sales_df.empty else datetime.now(),
-            recolt_df['ORDER_DATE'].min() if not recolt_df.empty else datetime.now()
-        )
-        max_date = max(
-            sales_df['ORDER_DATE'].max() if not sales_df.empty else datetime.now(),
-            recolt_df['ORDER_DATE'].max() if not recolt_df.empty else datetime.now()
-        )
+        dates = [options[bound] for options in (sales_options, recolt_options)
+                 for bound in ('min_date', 'max_date') if options[bound] is not None]
+        min_date = min(dates) if dates else datetime.now()
+        max_date = max(dates) if dates else datetime.now()
         col1, col2 = st.columns(2)
         with col1:
             start_date = st.date_input("Date début", min_date, min_value=min_date, max_value=max_date)
         with col2:
             end_date = st.date_input("Date fin", max_date, min_value=min_date, max_value=max_date)
 
-# Defining the filter function
-def filter_data(df, country_filter, team_filter, department_filter, activity_filter, start_date, end_date):
-    """Appliquer les filtres aux données en utilisant Hyp comme clé."""
-    filtered_df = df.copy()
-    
-    # Filtrer par date si la colonne existe
-    if 'ORDER_DATE' in filtered_df.columns:
-        filtered_df = filtered_df[ 
-            (filtered_df['ORDER_DATE'] >= pd.to_datetime(start_date)) & 
-            (filtered_df['ORDER_DATE'] <= pd.to_datetime(end_date))
-        ]
-    
-    # Filtrer par pays si la colonne existe
-    if country_filter != 'Tous' and 'Country' in filtered_df.columns:
-        filtered_df = filtered_df[filtered_df['Country'] == country_filter]
-    
-    # Pour les filtres d'équipe, département et activité, nous devons joindre avec staff_df via Hyp
-    if 'Hyp' in filtered_df.columns and not staff_df.empty:
-        # Créer un sous-ensemble de staff_df basé sur les filtres
-        staff_filtered = staff_df.copy()
-        
-        if team_filter != 'Toutes':
-            staff_filtered = staff_filtered[staff_filtered['Team'] == team_filter]
-        if department_filter != 'Tous':
-            staff_filtered = staff_filtered[staff_filtered['Departement'] == department_filter]
-        if activity_filter != 'Toutes':
-            staff_filtered = staff_filtered[staff_filtered['Activité'] == activity_filter]
-        
-        # Filtrer le dataframe principal en gardant seulement les Hyp qui correspondent
-        filtered_df = filtered_df[filtered_df['Hyp'].isin(staff_filtered['Hyp'])]
+    with st.expander("Mémoire des données"):
+        st.dataframe(memory_report.round(2), hide_index=True)
+
+    with st.expander("Chargement des sources"):
+        st.json(snapshot.meta.get('load_report', {}))
+
+    with st.expander("Cache des figures"):
+        st.json(get_figure_cache().stats())
+
+    with st.expander("Calculs mémorisés"):
+        st.json(analytics.stats())
 
-    return filtered_df
+def none_if_all(value):
+    """Les valeurs 'Tous' / 'Toutes' des listes déroulantes signifient « pas de filtre »."""
+    return None if value in ('Tous', 'Toutes') else value
+
+def dashboard_filters(country_filter, team_filter, department_filter, activity_filter):
+    """Filtres des listes déroulantes et de la période, pour `SalesAnalytics`."""
+    return Filters(start_date, end_date, none_if_all(country_filter), none_if_all(team_filter),
+                   none_if_all(department_filter), none_if_all(activity_filter))
+
+# Defining the filter function
+@timed()
+def filter_positions(table, country_filter, team_filter, department_filter, activity_filter):
+    """Positions des lignes retenues par les filtres, en utilisant Hyp comme clé."""
+    # Les filtres s'appuient sur l'index du snapshot : pas de copie ni de masque sur tout le DataFrame
+    filters = dashboard_filters(country_filter, team_filter, department_filter, activity_filter)
+    return analytics.positions(filters, table)
 
 # Contenu dynamique par page
 if selected == "Sales":
@@ -131,103 +236,189 @@ if selected == "Sales":
     col1, col2, col3, col4 = st.columns([2, 2, 2, 2])
     
     with col1:
-        country_sales_filter = st.selectbox("Filtrer par Pays (Sales)", ['Tous'] + sorted(sales_df['Country'].dropna().unique()))
+        country_sales_filter = st.selectbox("Filtrer par Pays (Sales)", ['Tous'] + sales_options['countries'])
     
     with col2:
-        selected_team = st.selectbox("Sélectionner équipe", ['Toutes'] + sorted(staff_df['Team'].dropna().unique()))
+        selected_team = st.selectbox("Sélectionner équipe", ['Toutes'] + sales_options['teams'])
     
     with col3:
-        selected_department = st.selectbox("Sélectionner département", ['Tous'] + sorted(staff_df['Departement'].dropna().unique()))
+        selected_department = st.selectbox("Sélectionner département", ['Tous'] + sales_options['departments'])
     
     with col4:
-        selected_activity = st.selectbox("Sélectionner activité", ['Toutes'] + sorted(staff_df['Activité'].dropna().unique()))
+        selected_activity = st.selectbox("Sélectionner activité", ['Toutes'] + sales_options['activities'])
     
-    filtered_sales = filter_data(sales_df, country_sales_filter, selected_team, selected_department, selected_activity, start_date, end_date)
-    st.dataframe(filtered_sales)
+    sales_positions = filter_positions('Sales', country_sales_filter, selected_team, selected_department, selected_activity)
+    # Seule la page visible est envoyée au navigateur
+    paginated_table(snapshot_viewer(snapshot, 'Sales'), sales_positions, key='sales')
 
 elif selected == "Recolt":
     st.header("Vue Détailée des Données Recolt")
     col1, col2, col3, col4 = st.columns([2, 2, 2, 2])
     
     with col1:
-        country_recolt_filter = st.selectbox("Filtrer par Pays (Recolt)", ['Tous'] + sorted(recolt_df['Country'].dropna().unique()))
+        country_recolt_filter = st.selectbox("Filtrer par Pays (Recolt)", ['Tous'] + recolt_options['countries'])
     
     with col2:
-        selected_team = st.selectbox("Sélectionner équipe", ['Toutes'] + sorted(staff_df['Team'].dropna().unique()))
+        selected_team = st.selectbox("Sélectionner équipe", ['Toutes'] + sales_options['teams'])
     
     with col3:
-        selected_department = st.selectbox("Sélectionner département", ['Tous'] + sorted(staff_df['Departement'].dropna().unique()))
+        selected_department = st.selectbox("Sélectionner département", ['Tous'] + sales_options['departments'])
     
     with col4:
-        selected_activity = st.selectbox("Sélectionner activité", ['Toutes'] + sorted(staff_df['Activité'].dropna().unique()))
+        selected_activity = st.selectbox("Sélectionner activité", ['Toutes'] + sales_options['activities'])
     
-    filtered_recolt = filter_data(recolt_df, country_recolt_filter, selected_team, selected_department, selected_activity, start_date, end_date)
+    recolt_positions = filter_positions('Recolt', country_recolt_filter, selected_team, selected_department, selected_activity)
 
     col1, col2 = st.columns(2)
     with col1:
-        st.dataframe(filtered_recolt)
+        paginated_table(snapshot_viewer(snapshot, 'Recolt'), recolt_positions, key='recolt')
     with col2:
         # Ajouter des visualisations ou autres éléments pour la deuxième colonne
         pass
 
 elif selected == "Tableau de bord":
     st.header("Analyse Commerciale - Sales")
-    country_recolt_filter = st.selectbox("Filtrer par Pays (Recolt)", ['Tous'] + sorted(recolt_df['Country'].dropna().unique()))
+    country_recolt_filter = st.selectbox("Filtrer par Pays (Recolt)", ['Tous'] + recolt_options['countries'])
     
     
-    selected_team = st.selectbox("Sélectionner équipe", ['Toutes'] + sorted(staff_df['Team'].dropna().unique()))
+    selected_team = st.selectbox("Sélectionner équipe", ['Toutes'] + sales_options['teams'])
     
  
-    selected_department = st.selectbox("Sélectionner département", ['Tous'] + sorted(staff_df['Departement'].dropna().unique()))
+    selected_department = st.selectbox("Sélectionner département", ['Tous'] + sales_options['departments'])
     
  
-    selected_activity = st.selectbox("Sélectionner activité", ['Toutes'] + sorted(staff_df['Activité'].dropna().unique()))
+    selected_activity = st.selectbox("Sélectionner activité", ['Toutes'] + sales_options['activities'])
     
-    country_sales_filter = st.selectbox("Filtrer par Pays (Sales)", ['Tous'] + sorted(sales_df['Country'].dropna().unique()))
-    filtered_sales = filter_data(sales_df, country_sales_filter, selected_team, selected_department, selected_activity, start_date, end_date)
+    country_sales_filter = st.selectbox("Filtrer par Pays (Sales)", ['Tous'] + sales_options['countries'])
     
-    if not filtered_sales.empty:
+    # KPI et graphiques calculés sur le cube journalier, pas sur les transactions
+    sales_filters = dashboard_filters(country_sales_filter, selected_team, selected_department, selected_activity)
+    with stage('cube_select'):
+        total_sales, count_sales, mean_sales = analytics.kpis(sales_filters, 'Sales')
+    
+    if count_sales:
         col1, col2, col3 = st.columns(3)
-        col1.metric("Ventes Totales", f"${filtered_sales['Montant'].sum():,.2f}")
-        col2.metric("Vente Moyenne", f"${filtered_sales['Montant'].mean():,.2f}")
-        col3.metric("Nombre de Transactions", len(filtered_sales))
+        col1.metric("Ventes Totales", f"${total_sales:,.2f}")
+        col2.metric("Vente Moyenne", f"${mean_sales:,.2f}")
+        col3.metric("Nombre de Transactions", count_sales)
         
+        # Figures réutilisées tant que le snapshot et les filtres ne changent pas
+        sales_key = (snapshot.version, selected, start_date, end_date, country_sales_filter,
+                     selected_team, selected_department, selected_activity)
+
         # Ventes par ville
-        sales_by_city = filtered_sales.groupby('City')['Montant'].sum().reset_index()
-        fig = px.bar(sales_by_city, x='City', y='Montant', color='City', title="Ventes par Ville")
-        st.plotly_chart(fig, use_container_width=True)
+        def sales_by_city():
+            # Catégories bornées (N premières + « Autres ») pour la taille des figures
+            data = top_n(analytics.breakdown('City', sales_filters, 'Sales'), 'City', 'Montant')
+            return px.bar(data, x='City', y='Montant', color='City', title="Ventes par Ville")
+        cached_chart(get_figure_cache(), ('sales_by_city',) + sales_key, sales_by_city, use_container_width=True)
         
         # Ventes par équipe (via Hyp -> staff_df)
-        if not staff_df.empty and 'Hyp' in filtered_sales.columns:
-            sales_with_team = filtered_sales.merge(staff_df[['Hyp', 'Team']], on='Hyp', how='left')
-            sales_by_team = sales_with_team.groupby('Team')['Montant'].sum().reset_index()
-            fig = px.pie(sales_by_team, names='Team', values='Montant', title="Répartition des ventes par équipe")
-            st.plotly_chart(fig, use_container_width=True)
+        if not staff_df.empty:
+            def sales_by_team():
+                data = top_n(analytics.breakdown('Team', sales_filters, 'Sales'), 'Team', 'Montant')
+                return px.pie(data, names='Team', values='Montant', title="Répartition des ventes par équipe")
+            cached_chart(get_figure_cache(), ('sales_by_team',) + sales_key, sales_by_team, use_container_width=True)
     else:
         st.warning("Aucune donnée à afficher pour les ventes.")
     
     st.header("Analyse Commerciale - Recolt")
-    country_recolt_filter = st.selectbox("Filtrer par Pays (Recolt)", ['Tous'] + sorted(recolt_df['Country'].dropna().unique()))
-    filtered_recolt = filter_data(recolt_df, country_recolt_filter, selected_team, selected_department, selected_activity, start_date, end_date)
+    country_recolt_filter = st.selectbox("Filtrer par Pays (Recolt)", ['Tous'] + recolt_options['countries'])
+    recolt_filters = dashboard_filters(country_recolt_filter, selected_team, selected_department, selected_activity)
+    with stage('cube_select'):
+        total_recolt, count_recolt, mean_recolt = analytics.kpis(recolt_filters, 'Recolt')
     
-    if not filtered_recolt.empty:
+    if count_recolt:
         col1, col2, col3 = st.columns(3)
-        col1.metric("Montant Total", f"${filtered_recolt['TRANSACTION'].sum():,.2f}")
-        col2.metric("Montant Moyen", f"${filtered_recolt['TRANSACTION'].mean():,.2f}")
-        col3.metric("Nombre de Transactions", len(filtered_recolt))
+        col1.metric("Montant Total", f"${total_recolt:,.2f}")
+        col2.metric("Montant Moyen", f"${mean_recolt:,.2f}")
+        col3.metric("Nombre de Transactions", count_recolt)
         
+        recolt_key = (snapshot.version, selected, start_date, end_date, country_recolt_filter,
+                      selected_team, selected_department, selected_activity)
+
         # Transactions par ville
-        recolt_by_city = filtered_recolt.groupby('City')['TRANSACTION'].sum().reset_index()
-        fig = px.bar(recolt_by_city, x='City', y='TRANSACTION', color='City', title="Montants par Ville")
-        st.plotly_chart(fig, use_container_width=True)
+        def recolt_by_city():
+            data = top_n(analytics.breakdown('City', recolt_filters, 'Recolt'), 'City', 'TRANSACTION')
+            return px.bar(data, x='City', y='TRANSACTION', color='City', title="Montants par Ville")
+        cached_chart(get_figure_cache(), ('recolt_by_city',) + recolt_key, recolt_by_city, use_container_width=True)
         
         # Transactions par banque
-        recolt_by_bank = filtered_recolt.groupby('Banques')['TRANSACTION'].sum().reset_index()
-        fig = px.pie(recolt_by_bank, names='Banques', values='TRANSACTION', title="Répartition par banque")
-        st.plotly_chart(fig, use_container_width=True)
+        def recolt_by_bank():
+            data = top_n(analytics.breakdown('Banques', recolt_filters, 'Recolt'), 'Banques', 'TRANSACTION')
+            return px.pie(data, names='Banques', values='TRANSACTION', title="Répartition par banque")
+        cached_chart(get_figure_cache(), ('recolt_by_bank',) + recolt_key, recolt_by_bank, use_container_width=True)
     else:
         st.warning("Aucune donnée à afficher pour les montants.")
 
+elif selected == "Classement":
+    st.header("Classement des agents - Sales")
+    col1, col2, col3, col4, col5 = st.columns([2, 2, 2, 2, 2])
+
+    with col1:
+        ranking_by = st.selectbox("Classer par", list(RANKINGS), format_func=RANKINGS.get)
+
+    with col2:
+        selected_team = st.selectbox("Sélectionner équipe", ['Toutes'] + sales_options['teams'])
+
+    with col3:
+        selected_department = st.selectbox("Sélectionner département", ['Tous'] + sales_options['departments'])
+
+    with col4:
+        selected_activity = st.selectbox("Sélectionner activité", ['Toutes'] + sales_options['activities'])
+
+    with col5:
+        min_count = st.number_input("Ventes minimum", min_value=1, value=1, step=1)
+
+    top = st.slider("Nombre d'agents affichés", 5, 100, 20, step=5)
+    # Le pays ne s'applique pas au classement (totaux par Hyp sur la période)
+    ranking_filters = dashboard_filters('Tous', selected_team, selected_department, selected_activity)
+    with stage('leaderboard'):
+        ranking, ranked = analytics.ranking(ranking_filters, ranking_by, top, int(min_count))
+
+    if not ranking.empty:
+        st.caption(f"{ranked} agents classés sur la période")
+        ranking_key = ('leaderboard', snapshot.version, ranking_by, top, int(min_count)) + ranking_filters
+        cached_chart(get_figure_cache(), ranking_key, lambda: px.bar(
+            ranking.astype({'Hyp': str}), x=ranking_by, y='Hyp', orientation='h',
+            hover_data=[column for column in ('NOM', 'PRENOM', 'Team') if column in ranking.columns],
+            title=f"{RANKINGS[ranking_by]} par agent").update_yaxes(autorange='reversed'),
+            use_container_width=True)
+        st.dataframe(ranking.rename(columns=RANKINGS), hide_index=True, use_container_width=True)
+    else:
+        st.warning("Aucun agent à classer sur la période.")
+
+elif selected == "Rapprochement":
+    st.header("Rapprochement Sales / Recolt")
+    # Jointure par hachage sur ORDER_REFERENCE, faite une fois par snapshot
+    with stage('reconciliation'):
+        summary, lag_by_hyp, lag_by_bank = analytics.reconciliation_report()
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Ventes encaissées", f"{summary['paid_sales']} / {summary['sales']}")
+    col2.metric("Ventes impayées", f"${summary['unpaid_amount']:,.2f}", f"{summary['unpaid_sales']} ventes",
+                delta_color="off")
+    col3.metric("Encaissements orphelins", f"${summary['orphan_amount']:,.2f}",
+                f"{summary['orphan_collections']} encaissements", delta_color="off")
+    col4.metric("Délai médian", "-" if summary['median_lag_days'] is None else f"{summary['median_lag_days']:.1f} jours")
+    if summary['duplicate_references']:
+        st.caption(f"{summary['duplicate_references']} références de vente en double ignorées")
+
+    tab1, tab2, tab3, tab4 = st.tabs(["Délais par agent", "Délais par banque", "Ventes impayées",
+                                      "Encaissements orphelins"])
+    with tab1:
+        st.dataframe(lag_by_hyp, hide_index=True, use_container_width=True)
+    with tab2:
+        if not lag_by_bank.empty:
+            cached_chart(get_figure_cache(), ('lag_by_bank', snapshot.version), lambda: px.bar(
+                largest(lag_by_bank, 'lag_mean'), x='Banques', y='lag_mean', color='Banques',
+                title="Délai moyen vente -> encaissement (jours)"), use_container_width=True)
+        st.dataframe(lag_by_bank, hide_index=True, use_container_width=True)
+    with tab3:
+        paginated_table(snapshot_reconciliation_viewer(snapshot, 'unpaid'), key='unpaid', sort_column='ORDER_DATE')
+    with tab4:
+        paginated_table(snapshot_reconciliation_viewer(snapshot, 'orphans'), key='orphans', sort_column='ORDER_DATE')
+
 elif selected == "Planning":
     st.header("Planification")
     col1, col2 = st.columns([1, 5])
@@ -239,66 +430,9 @@ elif selected == "Planning":
 
     # Navigation horizontale
     
-# Chargement des données
-@st.cache_data
-def load_data():
-    excel_file = 'Sources.xlsm'
-    sheet_name = 'Recolt'
-    
-    df = pd.read_excel(
-        excel_file,
-        sheet_name=sheet_name,
-        usecols='A:H',
-        header=0,
-        index_col=None
-    )
-    
-    # Nettoyage des données
-    df_clean = df.dropna().copy()
-    df_clean['TRANSACTION'] = pd.to_numeric(
-        df_clean['TRANSACTION'], 
-        errors='coerce'
-    ).fillna(0)
-    
-    return df_clean.reset_index(drop=True)
-
-# Fonction pour géocoder les villes
-@st.cache_data
-def geocode_data(df):
-    if 'Latitude' in df.columns and 'Longitude' in df.columns:
-        return df
-    
-    geolocator = Nominatim(user_agent="sales_dashboard")
-    geocode = RateLimiter(geolocator.geocode, min_delay_seconds=1)
-    
-    cities = df[['City', 'Country']].drop_duplicates()
-    locations = []
-    
-    for _, row in cities.iterrows():
-        try:
-            location = geocode(f"{row['City']}, {row['Country']}")
-            if location:
-                locations.append({'City': row['City'], 
-                                'Country': row['Country'],
-                                'Latitude': location.latitude,
-                                'Longitude': location.longitude})
-            else:
-                locations.append({'City': row['City'], 
-                                'Country': row['Country'],
-                                'Latitude': None,
-                                'Longitude': None})
-        except:
-            locations.append({'City': row['City'], 
-                            'Country': row['Country'],
-                            'Latitude': None,
-                            'Longitude': None})
-    
-    locations_df = pd.DataFrame(locations)
-    df = pd.merge(df, locations_df, on=['City', 'Country'], how='left')
-    return df
-
 try:
-    df = load_data()
+    # Table nettoyée et géocodée une fois par snapshot, partagée par les sessions
+    df = snapshot['Planning']
     
     # Section Dashboard
     
@@ -315,96 +449,111 @@ try:
             st.metric("Transactions", len(df))
         
         # Visualisation
-    fig = px.bar(
-            df.groupby('City')['TRANSACTION'].sum().reset_index(),
+    cached_chart(get_figure_cache(), ('planning_by_city', snapshot.version), lambda: px.bar(
+            top_n(df.groupby('City', observed=True)['TRANSACTION'].sum().reset_index(), 'City', 'TRANSACTION'),
             x='City',
             y='TRANSACTION',
             color='City',
             title="Sales by City"
-        )
-    st.plotly_chart(fig, use_container_width=True)
+        ), use_container_width=True)
         
   
         
         # Géocodage des villes si nécessaire
     if 'Latitude' not in df.columns or 'Longitude' not in df.columns:
             with st.spinner("Geocoding cities... This may take a while for large datasets"):
-                df = geocode_data(df)
+                df = snapshot_geocoded_planning(snapshot)
         
-        # Filtre par pays
+        # Filtre par pays (ou tous les pays)
     countries = sorted(df['Country'].unique())
-    selected_country = st.selectbox("Select Country", countries)
-    filtered_df = df[df['Country'] == selected_country]
+    selected_country = st.selectbox("Select Country", [ALL_COUNTRIES] + countries, index=1 if countries else 0)
+    if selected_country == ALL_COUNTRIES:
+        groups, positions = None, None
+        filtered_df = df
+    else:
+        groups = [selected_country]
+        country_mask = (df['Country'] == selected_country).to_numpy()
+        positions = np.flatnonzero(country_mask)
+        filtered_df = df[country_mask]
         
-        # Préparation des données pour la carte
-    city_data = filtered_df.groupby(['City', 'Latitude', 'Longitude']).agg(
-            TOTAL_SALES=('TRANSACTION', 'sum'),
-            TRANSACTION_COUNT=('TRANSACTION', 'count')
-        ).reset_index().dropna()
+        # Mailles précalculées par niveau de zoom : la carte ne lit que celles du niveau affiché
+    grid = snapshot_spatial_grid(snapshot)
+    extent = grid.extent(groups)
         
-    if not city_data.empty:
+    if extent is not None:
             # Section Carte
             st.subheader(f"Sales Map - {selected_country}")
+            zoom = st.slider("Map detail level", MAP_MIN_ZOOM, MAP_MAX_ZOOM, fit_zoom(*extent),
+                             key=f"map_zoom_{selected_country}")
             
             # Création de la carte avec Plotly
-            fig = px.scatter_mapbox(
-                city_data,
-                lat="Latitude",
-                lon="Longitude",
-                size="TOTAL_SALES",
-                color="TOTAL_SALES",
-                hover_name="City",
-                hover_data={
-                    "TOTAL_SALES": ":$.2f",
-                    "TRANSACTION_COUNT": True,
-                    "Latitude": False,
-                    "Longitude": False
-                },
-                zoom=5,
-                center={
-                    "lat": city_data['Latitude'].mean(),
-                    "lon": city_data['Longitude'].mean()
-                },
-                title=f"Sales Distribution in {selected_country}",
-                size_max=30,
-                color_continuous_scale=px.colors.sequential.Viridis,
-                mapbox_style="open-street-map"  # Utilisez "carto-positron" pour un style plus simple
-            )
-            
-            # Personnalisation de la mise en page
-            fig.update_layout(
-                height=600,
-                margin={"r":0,"t":40,"l":0,"b":0},
-                coloraxis_colorbar={
-                    "title": "Sales Amount",
-                    "tickprefix": "$"
-                }
-            )
-            
-            st.plotly_chart(fig, use_container_width=True)
+            def sales_map():
+                # Les mailles les plus importantes, dans la limite de points de la figure
+                map_data = largest(grid.bins(zoom, groups), 'TOTAL_SALES')
+                lat_min, lat_max, lon_min, lon_max = extent
+                fig = px.scatter_mapbox(
+                    map_data,
+                    lat="Latitude",
+                    lon="Longitude",
+                    size="TOTAL_SALES",
+                    color="TOTAL_SALES",
+                    hover_name="City",
+                    hover_data={
+                        "TOTAL_SALES": ":$.2f",
+                        "TRANSACTION_COUNT": True,
+                        "CITY_COUNT": True,
+                        "Latitude": False,
+                        "Longitude": False
+                    },
+                    zoom=zoom,
+                    center={
+                        "lat": (lat_min + lat_max) / 2,
+                        "lon": (lon_min + lon_max) / 2
+                    },
+                    title=f"Sales Distribution in {selected_country}",
+                    size_max=30,
+                    color_continuous_scale=px.colors.sequential.Viridis,
+                    mapbox_style="open-street-map"  # Utilisez "carto-positron" pour un style plus simple
+                )
+
+                # Personnalisation de la mise en page
+                fig.update_layout(
+                    height=600,
+                    margin={"r":0,"t":40,"l":0,"b":0},
+                    coloraxis_colorbar={
+                        "title": "Sales Amount",
+                        "tickprefix": "$"
+                    }
+                )
+                return fig
+
+            map_key = (snapshot.version, selected_country)
+            cached_chart(get_figure_cache(), ('planning_map', zoom) + map_key, sales_map, use_container_width=True)
             
             # Graphique supplémentaire
             st.subheader("Top Cities by Sales")
-            top_cities = city_data.sort_values('TOTAL_SALES', ascending=False).head(10)
-            fig_bar = px.bar(
-                top_cities,
-                x='City',
-                y='TOTAL_SALES',
-                color='TOTAL_SALES',
-                labels={'TOTAL_SALES': 'Total Sales ($)'},
-                text_auto='.2s'
-            )
-            st.plotly_chart(fig_bar, use_container_width=True)
+            def top_cities():
+                # Comme la carte : seules les villes géocodées
+                data = (filtered_df.dropna(subset=['Latitude', 'Longitude'])
+                        .groupby('City', observed=True)['TRANSACTION'].sum()
+                        .nlargest(10).rename('TOTAL_SALES').reset_index())
+                return px.bar(
+                    data,
+                    x='City',
+                    y='TOTAL_SALES',
+                    color='TOTAL_SALES',
+                    labels={'TOTAL_SALES': 'Total Sales ($)'},
+                    text_auto='.2s'
+                )
+            cached_chart(get_figure_cache(), ('planning_top_cities',) + map_key, top_cities, use_container_width=True)
     else:
             st.warning("No geographic data available for the selected country")
         
         # Tableau de données détaillées
     st.subheader("Detailed Transaction Data")
-    st.dataframe(
-            filtered_df.sort_values('TRANSACTION', ascending=False),
-            use_container_width=True,
-            height=400
-        )
+    # Tri TRANSACTION décroissant précalculé pour le snapshot ; seule la page visible est envoyée
+    paginated_table(snapshot_planning_viewer(snapshot), positions, key='planning_detail',
+                    sort_column='TRANSACTION', ascending=False, height=400)
 
 except Exception as e:
     st.error(f"Error loading data: {str(e)}")
@@ -417,3 +566,5 @@ except Exception as e:
         st.plotly_chart(fig, use_container_width=True)
     
     st.markdown("---")
+
+profiler.end_rerun(rerun_started, selected)
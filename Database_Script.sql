@@ -93,6 +93,7 @@ CREATE INDEX IX_Effectifs_UserName ON Effectifs(UserName);
 CREATE INDEX IX_Effectifs_Team ON Effectifs(Team);
 CREATE INDEX IX_Sales_ORDER_DATE ON Sales(ORDER_DATE);
 CREATE INDEX IX_Sales_Country ON Sales(Country);
+CREATE INDEX IX_Sales_Hyp_ORDER_DATE ON Sales(Hyp, ORDER_DATE);
 CREATE INDEX IX_Recolt_ORDER_DATE ON Recolt(ORDER_DATE);
 CREATE INDEX IX_Logs_DateCreation ON Logs([Date de création]);
 
@@ -0,0 +1,65 @@
+-- Schéma SQLite de substitution pour tester hors SQL Server
+-- (mêmes tables et colonnes que celles lues par Console_Sql_Total.py)
+
+DROP TABLE IF EXISTS Recolt;
+DROP TABLE IF EXISTS Sales;
+DROP TABLE IF EXISTS Effectifs;
+DROP TABLE IF EXISTS Users;
+
+-- Table Users
+CREATE TABLE Users (
+    Hyp VARCHAR(50) PRIMARY KEY,
+    UserName NVARCHAR(100) UNIQUE NOT NULL,
+    PassWord NVARCHAR(255) NOT NULL,
+    Cnx DATETIME,
+    ID_User INTEGER
+);
+
+-- Table Effectifs
+CREATE TABLE Effectifs (
+    Hyp VARCHAR(50) PRIMARY KEY,
+    ID VARCHAR(50),
+    ID_AGTSDA VARCHAR(50),
+    UserName NVARCHAR(100) NOT NULL REFERENCES Users(UserName),
+    NOM NVARCHAR(100) NOT NULL,
+    PRENOM NVARCHAR(100) NOT NULL,
+    Team NVARCHAR(100),
+    Type NVARCHAR(50) CHECK (Type IN ('Agent', 'Manager', 'Admin', 'Hyperviseur')),
+    Activité NVARCHAR(100),
+    Date_In DATE
+);
+
+-- Table Sales
+CREATE TABLE Sales (
+    Id_Sale INTEGER PRIMARY KEY,
+    Hyp VARCHAR(50) NOT NULL,
+    ORDER_REFERENCE VARCHAR(100) UNIQUE NOT NULL,
+    ORDER_DATE DATETIME NOT NULL,
+    SHORT_MESSAGE NVARCHAR(255),
+    Country NVARCHAR(100),
+    City NVARCHAR(100),
+    Total_sale DECIMAL(18,2) CHECK (Total_sale >= 0),
+    Rating DECIMAL(3,1)
+);
+
+-- Table Recolt
+CREATE TABLE Recolt (
+    Id_Recolt INTEGER PRIMARY KEY,
+    Hyp VARCHAR(50) NOT NULL,
+    POINT_OF_SELL_LABEL NVARCHAR(100) NOT NULL,
+    TRANSACTION_AMOUNT DECIMAL(18,2) CHECK (TRANSACTION_AMOUNT >= 0),
+    ORDER_REFERENCE VARCHAR(100) REFERENCES Sales(ORDER_REFERENCE),
+    ORDER_DATE DATETIME NOT NULL,
+    SHORT_MESSAGE NVARCHAR(255),
+    City NVARCHAR(100),
+    Country NVARCHAR(100)
+);
+
+-- Index
+CREATE INDEX IX_Users_UserName ON Users(UserName);
+CREATE INDEX IX_Effectifs_UserName ON Effectifs(UserName);
+CREATE INDEX IX_Effectifs_Team ON Effectifs(Team);
+CREATE INDEX IX_Sales_ORDER_DATE ON Sales(ORDER_DATE);
+CREATE INDEX IX_Sales_Country ON Sales(Country);
+CREATE INDEX IX_Sales_Hyp_ORDER_DATE ON Sales(Hyp, ORDER_DATE);
+CREATE INDEX IX_Recolt_ORDER_DATE ON Recolt(ORDER_DATE);
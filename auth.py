@@ -0,0 +1,363 @@
+"""Authentification de la console SQL : mots de passe hachés, limitation et sessions.
+
+`authenticate` envoyait le mot de passe en clair à la base, comparé à
+`Users.PassWord`, avec une connexion par tentative ; rien ne limitait une
+rafale de connexions. Ici :
+- les mots de passe sont stockés en PBKDF2-SHA256 salé
+  (`pbkdf2_sha256$itérations$sel$empreinte`) et vérifiés dans le processus ;
+  un mot de passe encore en clair est accepté une dernière fois puis
+  remplacé par son empreinte (ou migré en bloc : `python auth.py migrate`) ;
+- chaque tentative consomme un jeton d'un seau par utilisateur et par
+  adresse IP (sans adresse connue, d'un seau commun) : au-delà de la
+  rafale autorisée, la base n'est plus interrogée ;
+- les utilisateurs lus en base, et les noms inconnus, sont gardés
+  USER_CACHE_TTL secondes : une rafale de mauvais mots de passe ou de noms
+  inventés ne relit pas la base à chaque tentative ;
+- une connexion réussie émet un jeton de session signé (HMAC), gardé dans
+  un LRU en mémoire avec les informations de l'utilisateur : les
+  reconnexions de la même session (rechargement de la page) n'interrogent
+  pas la base.
+
+Le jeton passe par l'URL (seul moyen de reprendre une session Streamlit au
+rechargement) : il est donc lié à l'adresse du client qui s'est connecté,
+expire après SESSION_TTL secondes d'inactivité (SESSION_MAX_AGE au plus)
+et est révoqué à la déconnexion.
+"""
+import argparse
+import base64
+import getpass
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+HASH_ALGORITHM = 'pbkdf2_sha256'
+PBKDF2_ITERATIONS = int(os.environ.get('AUTH_PBKDF2_ITERATIONS', 600_000))
+SALT_BYTES = 16
+
+# Expiration des sessions (secondes) : après inactivité, et au plus tard après connexion
+SESSION_TTL = int(os.environ.get('AUTH_SESSION_TTL', 30 * 60))
+SESSION_MAX_AGE = int(os.environ.get('AUTH_SESSION_MAX_AGE', 8 * 3600))
+# Nombre des sessions gardées en mémoire
+SESSION_ENTRIES = int(os.environ.get('AUTH_SESSION_ENTRIES', 1000))
+# Utilisateurs lus en base (et noms inconnus) gardés pour les reconnexions (secondes)
+USER_CACHE_TTL = int(os.environ.get('AUTH_USER_CACHE_TTL', 300))
+# Après un mauvais mot de passe, relecture en base seulement si la ligne en cache a plus de (secondes)
+USER_REFRESH_AFTER = int(os.environ.get('AUTH_USER_REFRESH_AFTER', 30))
+# Tentatives de connexion : rafale autorisée, puis une tentative toutes les LOGIN_REFILL secondes
+LOGIN_BURST = int(os.environ.get('AUTH_LOGIN_BURST', 5))
+LOGIN_REFILL = float(os.environ.get('AUTH_LOGIN_REFILL', 30))
+# Seau commun aux tentatives sans adresse IP (localhost, certains proxys)
+LOGIN_GLOBAL_BURST = int(os.environ.get('AUTH_LOGIN_GLOBAL_BURST', 20))
+LOGIN_GLOBAL_REFILL = float(os.environ.get('AUTH_LOGIN_GLOBAL_REFILL', 2))
+# Clé de signature des jetons ; sans AUTH_SECRET, clé propre au processus
+# (les sessions ne survivent pas à un redémarrage, comme le LRU)
+AUTH_SECRET = os.environ.get('AUTH_SECRET', '').encode() or secrets.token_bytes(32)
+
+USER_QUERY = (
+    "SELECT u.Hyp, e.Type, e.Date_In, u.PassWord FROM Users u "
+    "JOIN Effectifs e ON u.Hyp = e.Hyp "
+    "WHERE u.UserName = ?"
+)
+# Remplacement conditionnel : une autre session a pu changer le mot de passe entre-temps
+UPDATE_PASSWORD = "UPDATE Users SET PassWord = ? WHERE UserName = ? AND PassWord = ?"
+
+
+class LoginThrottled(Exception):
+    """Trop de tentatives de connexion pour cet utilisateur ou cette adresse."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Trop de tentatives, réessayez dans {retry_after:.0f} s")
+        self.retry_after = retry_after
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def hash_password(password, iterations=PBKDF2_ITERATIONS, salt=None):
+    """Empreinte PBKDF2-SHA256 salée, au format `pbkdf2_sha256$itérations$sel$empreinte`."""
+    salt = salt or secrets.token_bytes(SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+    return f"{HASH_ALGORITHM}${iterations}${_b64(salt)}${_b64(digest)}"
+
+
+def is_hashed(stored):
+    """Vrai si la valeur stockée est une empreinte (et non un mot de passe en clair)."""
+    return isinstance(stored, str) and stored.startswith(HASH_ALGORITHM + '$')
+
+
+def verify_password(password, stored):
+    """(mot de passe correct, empreinte à recalculer).
+
+    Une valeur en clair ou hachée avec moins d'itérations que
+    PBKDF2_ITERATIONS est à remplacer après une vérification réussie.
+    """
+    if stored is None:
+        return False, False
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode('utf-8'), str(stored).encode('utf-8')), True
+    try:
+        _, iterations, salt, digest = stored.split('$')
+        iterations = int(iterations)
+        expected = _unb64(digest)
+        actual = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), _unb64(salt), iterations)
+    except ValueError:
+        return False, False
+    return hmac.compare_digest(actual, expected), iterations < PBKDF2_ITERATIONS
+
+
+class RateLimiter:
+    """Seaux à jetons par clé (utilisateur, adresse IP), bornés en nombre de clés."""
+
+    def __init__(self, burst=LOGIN_BURST, refill=LOGIN_REFILL, max_keys=10_000):
+        self.burst = burst
+        self.refill = refill
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # clé -> (jetons, instant de la dernière mise à jour)
+        self._lock = threading.Lock()
+
+    def _tokens(self, key, now):
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - updated) / self.refill)
+
+    def acquire(self, *keys):
+        """Consomme un jeton de chaque seau ; lève LoginThrottled si l'un d'eux est vide."""
+        keys = [key for key in keys if key is not None]
+        now = time.monotonic()
+        with self._lock:
+            tokens = {key: self._tokens(key, now) for key in keys}
+            empty = [value for value in tokens.values() if value < 1]
+            if empty:
+                raise LoginThrottled((1 - min(empty)) * self.refill)
+            for key, value in tokens.items():
+                self._buckets[key] = (value - 1, now)
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+
+    def reset(self, *keys):
+        """Remet à plein les seaux (après une connexion réussie)."""
+        with self._lock:
+            for key in keys:
+                self._buckets.pop(key, None)
+
+
+class SessionCache:
+    """Jetons de session signés -> utilisateur, en LRU borné avec expiration.
+
+    Un jeton émis pour un client (adresse IP) n'est repris que par ce client.
+    Chaque reprise repousse l'expiration de `ttl` secondes, sans dépasser
+    `max_age` après l'émission.
+    """
+
+    def __init__(self, secret=AUTH_SECRET, ttl=SESSION_TTL, max_age=SESSION_MAX_AGE,
+                 max_entries=SESSION_ENTRIES):
+        self.secret = secret
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _sign(self, payload):
+        return _b64(hmac.new(self.secret, payload.encode('utf-8'), hashlib.sha256).digest())
+
+    def issue(self, user, client=None):
+        """Nouveau jeton pour `user` (dict sérialisable ou non, gardé en mémoire), lié à `client`."""
+        now = time.time()
+        deadline = int(now + self.max_age)
+        payload = _b64(json.dumps({'n': secrets.token_hex(8), 'e': deadline}).encode('ascii'))
+        token = f"{payload}.{self._sign(payload)}"
+        with self._lock:
+            self._sessions[token] = (user, client, min(now + self.ttl, deadline), deadline)
+            while len(self._sessions) > self.max_entries:
+                self._sessions.popitem(last=False)
+        return token
+
+    def resume(self, token, client=None):
+        """Utilisateur d'un jeton valide, None sinon (signature, client, expiration, éviction)."""
+        if not token or '.' not in token:
+            return None
+        payload, signature = token.rsplit('.', 1)
+        # Un jeton forgé est rejeté sans consulter le LRU
+        if not hmac.compare_digest(signature.encode('utf-8'), self._sign(payload).encode('ascii')):
+            return None
+        with self._lock:
+            entry = self._sessions.get(token)
+            if entry is None:
+                return None
+            user, owner, expires, deadline = entry
+            now = time.time()
+            if expires < now:
+                del self._sessions[token]
+                return None
+            # Jeton copié depuis l'URL vers un autre client : refusé (la session d'origine reste valide)
+            if owner is not None and owner != client:
+                return None
+            self._sessions[token] = (user, owner, min(now + self.ttl, deadline), deadline)
+            self._sessions.move_to_end(token)
+            return user
+
+    def revoke(self, token):
+        with self._lock:
+            self._sessions.pop(token, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class Authenticator:
+    """Connexion des utilisateurs : limitation, vérification locale, sessions.
+
+    `connection()` rend une connexion DB-API à utiliser dans un bloc `with`
+    (par exemple `ConnectionPool.connection`).
+    """
+
+    def __init__(self, connection, limiter=None, sessions=None, user_cache_ttl=USER_CACHE_TTL,
+                 refresh_after=USER_REFRESH_AFTER, anonymous_limiter=None):
+        self.connection = connection
+        self.limiter = limiter or RateLimiter()
+        # Tentatives sans adresse IP : le seau par utilisateur seul se contourne en changeant de nom
+        self.anonymous_limiter = anonymous_limiter or RateLimiter(LOGIN_GLOBAL_BURST, LOGIN_GLOBAL_REFILL)
+        self.sessions = sessions or SessionCache()
+        self.user_cache_ttl = user_cache_ttl
+        self.refresh_after = refresh_after
+        self._users = OrderedDict()  # nom -> (ligne Users/Effectifs ou None si inconnu, instant de lecture)
+        # Empreinte vérifiée pour un utilisateur inconnu : même durée qu'un mauvais mot de passe
+        self._unknown_hash = hash_password(secrets.token_hex(8))
+        self._lock = threading.Lock()
+        self._metrics = {'logins': 0, 'failures': 0, 'throttled': 0, 'db_lookups': 0, 'rehashed': 0, 'resumed': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._metrics[name] += 1
+
+    def _fetch_user(self, username, max_age=None):
+        """(ligne, âge en secondes) ; relue en base si absente du cache ou plus vieille que `max_age`.
+
+        Un nom inconnu est gardé lui aussi (ligne None), pour `user_cache_ttl` secondes.
+        """
+        max_age = self.user_cache_ttl if max_age is None else min(max_age, self.user_cache_ttl)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(username)
+            if entry is not None and now - entry[1] < max_age:
+                return entry[0], now - entry[1]
+        self._count('db_lookups')
+        with self.connection() as conn, closing(conn.cursor()) as cursor:
+            cursor.execute(USER_QUERY, (username,))
+            row = cursor.fetchone()
+        row = tuple(row) if row else None
+        with self._lock:
+            self._users[username] = (row, now)
+            self._users.move_to_end(username)
+            while len(self._users) > SESSION_ENTRIES:
+                self._users.popitem(last=False)
+        return row, 0.0
+
+    def _rehash(self, username, password, stored):
+        new_hash = hash_password(password)
+        with self.connection() as conn, closing(conn.cursor()) as cursor:
+            cursor.execute(UPDATE_PASSWORD, (new_hash, username, stored))
+            conn.commit()
+        with self._lock:
+            self._users.pop(username, None)
+        self._count('rehashed')
+
+    def login(self, username, password, client=None):
+        """(utilisateur, jeton de session) si les identifiants sont corrects, None sinon.
+
+        L'utilisateur est un dict hyp / user_type / date_in / username ; lève
+        LoginThrottled au-delà de LOGIN_BURST tentatives rapprochées.
+        """
+        keys = (('user', username), ('ip', client) if client else None)
+        try:
+            if not client:
+                self.anonymous_limiter.acquire('anonymous')
+            self.limiter.acquire(*keys)
+        except LoginThrottled:
+            self._count('throttled')
+            raise
+
+        row, age = self._fetch_user(username)
+        ok, needs_rehash = verify_password(password, row[3] if row else self._unknown_hash)
+        if row is not None and not ok and age >= self.refresh_after:
+            # Mot de passe peut-être changé depuis la lecture en cache (ligne assez ancienne pour être relue)
+            cached = row[3]
+            row, _ = self._fetch_user(username, max_age=self.refresh_after)
+            if row is not None and row[3] != cached:
+                ok, needs_rehash = verify_password(password, row[3])
+        if not ok:
+            self._count('failures')
+            return None
+
+        if needs_rehash:
+            self._rehash(username, password, row[3])
+        self.limiter.reset(*[key for key in keys if key is not None])
+        self._count('logins')
+        user = {'hyp': row[0], 'user_type': row[1], 'date_in': row[2], 'username': username}
+        return user, self.sessions.issue(user, client)
+
+    def resume(self, token, client=None):
+        """Utilisateur d'un jeton de session encore valide pour `client`, sans interroger la base."""
+        user = self.sessions.resume(token, client)
+        if user is not None:
+            self._count('resumed')
+        return user
+
+    def logout(self, token):
+        """Révoque le jeton : il ne permet plus de reprendre la session."""
+        self.sessions.revoke(token)
+
+    def metrics(self):
+        """Compteurs de connexions, d'échecs, de limitations et de lectures en base."""
+        with self._lock:
+            return dict(self._metrics, sessions=len(self.sessions), cached_users=len(self._users))
+
+
+def migrate_passwords(conn, iterations=PBKDF2_ITERATIONS):
+    """Remplace les mots de passe encore en clair de Users par leur empreinte ; rend leur nombre."""
+    with closing(conn.cursor()) as cursor:
+        cursor.execute("SELECT UserName, PassWord FROM Users")
+        plain = [(username, stored) for username, stored in cursor.fetchall() if not is_hashed(stored)]
+        for username, stored in plain:
+            cursor.execute(UPDATE_PASSWORD, (hash_password(stored, iterations), username, stored))
+    conn.commit()
+    return len(plain)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mots de passe de la table Users")
+    commands = parser.add_subparsers(dest='command', required=True)
+    migrate = commands.add_parser('migrate', help="hache les mots de passe encore en clair")
+    migrate.add_argument('connection', help="chaîne de connexion ODBC (ou fichier SQLite avec --sqlite)")
+    migrate.add_argument('--sqlite', action='store_true', help="base SQLite de substitution")
+    commands.add_parser('hash', help="affiche l'empreinte d'un mot de passe saisi")
+
+    args = parser.parse_args(argv)
+    if args.command == 'hash':
+        print(hash_password(getpass.getpass("Mot de passe : ")))
+        return
+
+    if args.sqlite:
+        import sqlite3
+        conn = sqlite3.connect(args.connection)
+    else:
+        import pyodbc
+        conn = pyodbc.connect(args.connection)
+    with closing(conn):
+        print(f"{migrate_passwords(conn)} mots de passe hachés")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,486 @@
+"""Banc d'essai reproductible des chargements, filtres et agrégations.
+
+Génère des données synthétiques (Sales / Recolt / Effectif, graine fixe) à
+plusieurs tailles, les écrit comme le font les sources réelles, puis
+chronomètre sans Streamlit les étapes des deux consoles :
+- classeur (Console_Total) : lecture à froid (XML -> Parquet) et à chaud,
+  normalisation des types, index de filtrage, filtres, cubes journaliers,
+  agrégations du tableau de bord, tri du tableau détaillé, mailles de la carte ;
+- SQLite, au schéma de Database_Script_SQLite.sql (Console_Sql_Total) :
+  synchronisation complète et delta, options des filtres, KPI et
+  regroupements en base, résumé d'un agent.
+
+Le classeur est un .xlsm (contenu « macro-enabled », sans macro) écrit en
+flux ; une feuille Excel est limitée à 1 048 576 lignes, les tailles
+supérieures ne sont mesurées qu'en mémoire et en SQLite.
+
+    python benchmark.py --rows 10k 1M 10M --out bench.json
+    python benchmark.py --rows 10k --baseline bench.json   # code 1 si régression
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import time
+import zipfile
+from contextlib import closing
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+
+from daily_cube import DailyCube
+from dtype_schema import normalize_frames
+from filter_engine import FilterIndex
+from leaderboard import RANKINGS, Leaderboard, staff_index
+from reconciliation import Reconciliation
+from sales_analytics import (SOURCE_DTYPES, SOURCE_SHEETS, WORKBOOK_TABLES, Filters, SalesAnalytics,
+                             SqlSalesAnalytics)
+from snapshot_cache import load_snapshot
+from spatial_grid import SpatialGrid
+from sql_queries import GROUP_COLUMNS
+from sql_sync import SalesSync
+from table_viewer import TableViewer
+from trend_index import TrendIndex
+
+BENCH_DIR = os.path.join('.bench')
+SQLITE_SCHEMA = 'Database_Script_SQLite.sql'
+EXCEL_MAX_ROWS = 1_048_576
+WRITE_CHUNK = 50_000
+
+COUNTRIES = ['Autriche', 'France', 'Belgique', 'Allemagne', 'Espagne', 'Italie', 'Suisse', 'Portugal']
+BANKS = ['BNP', 'Erste', 'Bank Austria', 'Société Générale', 'Crédit Agricole', 'ING', 'Santander']
+MESSAGES = ['ACCEPTED', 'REFUSED', 'PENDING']
+
+
+# --- Données synthétiques ---------------------------------------------------
+
+def parse_rows(text):
+    """'10k' -> 10000, '1M' -> 1000000."""
+    text = text.strip()
+    factor = {'k': 1_000, 'm': 1_000_000}.get(text[-1].lower(), 1)
+    return int(float(text[:-1] if factor > 1 else text) * factor)
+
+
+def synthetic_tables(rows, seed=0):
+    """Tables Sales / Recolt / Effectif de `rows` ventes, et villes géocodées."""
+    rng = np.random.default_rng(seed)
+    staff_size = int(min(20_000, max(50, rows // 200)))
+    city_count = int(min(5_000, max(20, rows // 500)))
+
+    cities = pd.DataFrame({
+        'City': [f'Ville {i:05d}' for i in range(city_count)],
+        'Country': np.array(COUNTRIES)[rng.integers(0, len(COUNTRIES), city_count)],
+        'Latitude': rng.uniform(36.0, 55.0, city_count).round(5),
+        'Longitude': rng.uniform(-9.0, 17.0, city_count).round(5),
+    })
+    hyps = np.array([f'H{800000 + i}' for i in range(staff_size)])
+    staff = pd.DataFrame({
+        'ID': [f'DESC{i:05d}' for i in range(staff_size)],
+        'Hyp': hyps,
+        'ID_AGTSDA': [f'AGT{i:05d}' for i in range(staff_size)],
+        'UserName': [f'USER{i:05d}' for i in range(staff_size)],
+        'NOM': [f'NOM{i:05d}' for i in range(staff_size)],
+        'PRENOM': [f'Prenom{i:05d}' for i in range(staff_size)],
+        'Team': np.array([f'Equipe {i:02d}' for i in range(max(3, staff_size // 25))])[
+            rng.integers(0, max(3, staff_size // 25), staff_size)],
+        'Type': np.where(rng.random(staff_size) < 0.05, 'Manager', 'Agent'),
+        'Activité': np.array(['Vente', 'Recouvrement', 'Error PDL', 'Support'])[rng.integers(0, 4, staff_size)],
+        'Departement': np.array(['D1', 'D2', 'D3'])[rng.integers(0, 3, staff_size)],
+        'Date_In': pd.Timestamp('2010-01-01') + pd.to_timedelta(rng.integers(0, 5000, staff_size), unit='D'),
+    })
+
+    # Popularité des villes et des agents inégale, comme dans les données réelles
+    city_index = np.minimum(rng.zipf(1.3, rows) - 1, city_count - 1)
+    start = pd.Timestamp('2023-01-01')
+    sales = pd.DataFrame({
+        'Hyp': hyps[rng.integers(0, staff_size, rows)],
+        'ORDER_REFERENCE': 100_000_000 + rng.permutation(rows),
+        'ORDER_DATE': start + pd.to_timedelta(rng.integers(0, 730 * 24 * 60, rows), unit='m'),
+        'SHORT_MESSAGE': np.array(MESSAGES)[rng.integers(0, len(MESSAGES), rows)],
+        'Country': cities['Country'].to_numpy()[city_index],
+        'City': cities['City'].to_numpy()[city_index],
+        'Montant': rng.gamma(2.0, 80.0, rows).round(2),
+        'Rating': rng.integers(0, 101, rows) / 10,
+    })
+    # Recouvrements : 80 % des ventes, quelques jours après
+    paid = np.flatnonzero(rng.random(rows) < 0.8)
+    recolt = pd.DataFrame({
+        'Hyp': sales['Hyp'].to_numpy()[paid],
+        'Banques': np.array(BANKS)[rng.integers(0, len(BANKS), len(paid))],
+        'TRANSACTION': sales['Montant'].to_numpy()[paid],
+        'ORDER_REFERENCE': sales['ORDER_REFERENCE'].to_numpy()[paid],
+        'ORDER_DATE': sales['ORDER_DATE'].to_numpy()[paid] + pd.to_timedelta(rng.integers(0, 45, len(paid)), unit='D').to_numpy(),
+        'SHORT_MESSAGE': 'ACCEPTED',
+        'City': sales['City'].to_numpy()[paid],
+        'Country': sales['Country'].to_numpy()[paid],
+    })
+    return {'Sales': sales, 'Recolt': recolt, 'Effectif': staff}, cities
+
+
+# --- Écriture des sources ---------------------------------------------------
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.ms-excel.sheet.macroEnabled.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '{sheets}</Types>'
+)
+_SHEET_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml'
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/></Relationships>'
+)
+# Style 1 : date et heure (format intégré 22)
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+    '<borders count="1"><border/></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="22" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+_MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_EXCEL_EPOCH = np.datetime64('1899-12-30', 'ns')
+
+
+def _cells(series):
+    """Texte XML des cellules d'une colonne (valeurs manquantes : cellule vide)."""
+    missing = series.isna().to_numpy()
+    if pd.api.types.is_datetime64_any_dtype(series):
+        serial = (series.to_numpy(dtype='datetime64[ns]') - _EXCEL_EPOCH) / np.timedelta64(1, 'D')
+        cells = '<c s="1"><v>' + pd.Series(serial).astype(str) + '</v></c>'
+    elif pd.api.types.is_numeric_dtype(series):
+        cells = '<c><v>' + series.astype(str) + '</v></c>'
+    else:
+        text = series.astype(object).map(lambda v: escape(str(v)))
+        cells = '<c t="inlineStr"><is><t>' + text + '</t></is></c>'
+    return cells.where(~missing, '<c/>')
+
+
+def _sheet_rows(df):
+    header = ''.join(f'<c t="inlineStr"><is><t>{escape(str(c))}</t></is></c>' for c in df.columns)
+    yield f'<row r="1">{header}</row>'
+    for start in range(0, len(df), WRITE_CHUNK):
+        chunk = df.iloc[start:start + WRITE_CHUNK].reset_index(drop=True)
+        rows = _cells(chunk.iloc[:, 0])
+        for column in chunk.columns[1:]:
+            rows = rows + _cells(chunk[column])
+        numbers = pd.Series(np.arange(start + 2, start + 2 + len(chunk)).astype(str))
+        yield ''.join(('<row r="' + numbers + '">' + rows + '</row>').tolist())
+
+
+def write_workbook(path, frames):
+    """Écrit un classeur .xlsm (une feuille par table), en flux et sans openpyxl."""
+    names = list(frames)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        zf.writestr('[Content_Types].xml', _CONTENT_TYPES.format(sheets=''.join(
+            f'<Override PartName="/xl/worksheets/sheet{i}.xml" ContentType="{_SHEET_TYPE}"/>'
+            for i in range(1, len(names) + 1))))
+        zf.writestr('_rels/.rels', _ROOT_RELS)
+        zf.writestr('xl/styles.xml', _STYLES)
+        zf.writestr('xl/workbook.xml', (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><workbook xmlns="{_MAIN_NS}" '
+            f'xmlns:r="{_REL_NS}"><sheets>' + ''.join(
+                f'<sheet name="{escape(name)}" sheetId="{i}" r:id="rId{i}"/>'
+                for i, name in enumerate(names, 1)) + '</sheets></workbook>'))
+        zf.writestr('xl/_rels/workbook.xml.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">' + ''.join(
+                f'<Relationship Id="rId{i}" Target="worksheets/sheet{i}.xml" '
+                f'Type="{_REL_NS}/worksheet"/>' for i in range(1, len(names) + 1)) +
+            f'<Relationship Id="rId{len(names) + 1}" Target="styles.xml" Type="{_REL_NS}/styles"/>'
+            '</Relationships>'))
+        for i, name in enumerate(names, 1):
+            with zf.open(f'xl/worksheets/sheet{i}.xml', 'w', force_zip64=True) as f:
+                f.write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                        f'<worksheet xmlns="{_MAIN_NS}"><sheetData>'.encode())
+                for block in _sheet_rows(frames[name]):
+                    f.write(block.encode())
+                f.write(b'</sheetData></worksheet>')
+
+
+def connect_sqlite(path):
+    """Connexion SQLite qui échange les dates au format texte du schéma de substitution."""
+    sqlite3.register_adapter(datetime, lambda d: d.isoformat(' '))
+    sqlite3.register_adapter(pd.Timestamp, lambda d: d.isoformat(' '))
+    return sqlite3.connect(path, check_same_thread=False)
+
+
+def _records(df):
+    """Lignes (tuples Python) d'un DataFrame, dates en texte et NaN en NULL."""
+    columns = []
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            series = series.dt.strftime('%Y-%m-%d %H:%M:%S')
+        columns.append(series.astype(object).where(series.notna(), None).tolist())
+    return zip(*columns)
+
+
+def write_sqlite(path, frames, schema=SQLITE_SCHEMA):
+    """Base SQLite au schéma de Database_Script_SQLite.sql, remplie avec les tables synthétiques."""
+    sales, recolt, staff = frames['Sales'], frames['Recolt'], frames['Effectif']
+    with closing(connect_sqlite(path)) as conn:
+        with open(schema, encoding='utf-8') as f:
+            conn.executescript(f.read())
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        users = pd.DataFrame({'Hyp': staff['Hyp'], 'UserName': staff['UserName'], 'PassWord': staff['Hyp'],
+                              'Cnx': None, 'ID_User': np.arange(1, len(staff) + 1)})
+        effectifs = staff[['Hyp', 'ID', 'ID_AGTSDA', 'UserName', 'NOM', 'PRENOM', 'Team', 'Type', 'Activité', 'Date_In']]
+        conn.executemany('INSERT INTO Users VALUES (?, ?, ?, ?, ?)', _records(users))
+        conn.executemany('INSERT INTO Effectifs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', _records(effectifs))
+        for start in range(0, len(sales), WRITE_CHUNK * 4):
+            chunk = sales.iloc[start:start + WRITE_CHUNK * 4]
+            conn.executemany('INSERT INTO Sales VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', _records(pd.DataFrame({
+                'Id_Sale': np.arange(start + 1, start + 1 + len(chunk)),
+                'Hyp': chunk['Hyp'], 'ORDER_REFERENCE': chunk['ORDER_REFERENCE'].astype(str),
+                'ORDER_DATE': chunk['ORDER_DATE'], 'SHORT_MESSAGE': chunk['SHORT_MESSAGE'],
+                'Country': chunk['Country'], 'City': chunk['City'],
+                'Total_sale': chunk['Montant'], 'Rating': chunk['Rating']})))
+        for start in range(0, len(recolt), WRITE_CHUNK * 4):
+            chunk = recolt.iloc[start:start + WRITE_CHUNK * 4]
+            conn.executemany('INSERT INTO Recolt VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', _records(pd.DataFrame({
+                'Id_Recolt': np.arange(start + 1, start + 1 + len(chunk)),
+                'Hyp': chunk['Hyp'], 'POINT_OF_SELL_LABEL': chunk['Banques'],
+                'TRANSACTION_AMOUNT': chunk['TRANSACTION'], 'ORDER_REFERENCE': chunk['ORDER_REFERENCE'].astype(str),
+                'ORDER_DATE': chunk['ORDER_DATE'], 'SHORT_MESSAGE': chunk['SHORT_MESSAGE'],
+                'City': chunk['City'], 'Country': chunk['Country']})))
+        conn.commit()
+
+
+# --- Mesures ----------------------------------------------------------------
+
+class Bench:
+    """Durées minimale et médiane de chaque étape, sur `repeat` exécutions."""
+
+    def __init__(self, repeat=3):
+        self.repeat = repeat
+        self.results = []
+        self.skipped = []
+
+    def run(self, rows, source, stage, func, setup=None, repeat=None):
+        """Chronomètre `func(setup())` ; retourne le résultat de la dernière exécution."""
+        durations, result = [], None
+        for _ in range(repeat or self.repeat):
+            arg = setup() if setup else None
+            gc.collect()
+            start = time.perf_counter()
+            result = func(arg) if setup else func()
+            durations.append(time.perf_counter() - start)
+        self.results.append({
+            'rows': rows, 'source': source, 'stage': stage, 'runs': len(durations),
+            'min_s': round(min(durations), 6), 'median_s': round(statistics.median(durations), 6),
+        })
+        print(f"{rows:>10} {source:<7} {stage:<28} {min(durations):10.4f} s")
+        return result
+
+    def skip(self, rows, source, reason):
+        self.skipped.append({'rows': rows, 'source': source, 'reason': reason})
+        print(f"{rows:>10} {source:<7} ignoré : {reason}")
+
+
+def _filter_combos(sales, staff):
+    dates = sales['ORDER_DATE']
+    start, end = dates.min(), dates.max()
+    middle = start + (end - start) / 2
+    country = sales['Country'].mode().iloc[0]
+    team = staff['Team'].mode().iloc[0]
+    return [
+        {},
+        {'start_date': middle, 'end_date': end},
+        {'country': country},
+        {'country': country, 'Team': team},
+        {'country': country, 'start_date': middle, 'end_date': end, 'Activité': 'Vente'},
+    ]
+
+
+def bench_frames(bench, rows, source, frames, cities):
+    """Étapes communes une fois les tables chargées (normalisation, filtres, tableau de bord)."""
+    frames = bench.run(rows, source, 'normalize_frames', lambda: normalize_frames(frames)[0], repeat=1)
+    sales, recolt, staff = frames['Sales'], frames['Recolt'], frames['Effectif']
+
+    index = bench.run(rows, source, 'filter_index_build', lambda: FilterIndex(sales, staff))
+    combos = _filter_combos(sales, staff)
+    bench.run(rows, source, 'filter_positions',
+              lambda index: [index.positions(**combo) for combo in combos],
+              setup=lambda: FilterIndex(sales, staff))
+    bench.run(rows, source, 'filter_rows', lambda: index.filter(**combos[3]))
+
+    cubes = {
+        table: bench.run(rows, source, f'{table.lower()}_cube_build',
+                         lambda: DailyCube(frames[table], *WORKBOOK_TABLES[table]))
+        for table in WORKBOOK_TABLES
+    }
+    # Sans mémorisation : chaque répétition refait les agrégations
+    analytics = SalesAnalytics(frames, cubes=cubes, memo_entries=0)
+    filters = Filters(combos[1]['start_date'], combos[1]['end_date'], team=combos[3]['Team'])
+
+    def dashboard():
+        return (analytics.dashboard(filters), analytics.kpis(filters, 'Recolt'),
+                analytics.breakdown('City', filters, 'Recolt'), analytics.breakdown('Banques', filters, 'Recolt'))
+    bench.run(rows, source, 'dashboard_aggregates', dashboard)
+    bench.run(rows, source, 'time_series_weekly', lambda: analytics.time_series(filters, freq='W'))
+    trend = bench.run(rows, source, 'trend_build', lambda: TrendIndex(sales, 'Montant', 'Hyp'))
+    bench.run(rows, source, 'trend_rolling_deltas',
+              lambda: (trend.rolling(30, keys=trend.top_keys(10)), trend.period_deltas('W'), trend.period_deltas('MS')))
+
+    leaderboard = bench.run(rows, source, 'leaderboard_build', lambda: Leaderboard(sales, 'Montant'))
+    staff_rows = staff_index(staff)
+    bench.run(rows, source, 'leaderboard_top',
+              lambda: [leaderboard.top(20, filters.start_date, filters.end_date, by=by, staff=staff_rows)
+                       for by in RANKINGS])
+
+    bench.run(rows, source, 'reconcile_build', lambda: Reconciliation(sales, recolt))
+    # Dernier dixième des deux tables ajouté à un rapprochement existant
+    split_sales, split_recolt = len(sales) * 9 // 10, len(recolt) * 9 // 10
+    bench.run(rows, source, 'reconcile_delta',
+              lambda reconciliation: reconciliation.apply_delta(sales.iloc[split_sales:], recolt.iloc[split_recolt:]),
+              setup=lambda: Reconciliation(sales.iloc[:split_sales], recolt.iloc[:split_recolt]))
+
+    bench.run(rows, source, 'table_sort_page',
+              lambda viewer: viewer.page(index.positions(**combos[2]), 'Montant', False, 0, 50),
+              setup=lambda: TableViewer(sales))
+
+    geocoded = recolt.merge(cities.astype({'City': recolt['City'].dtype, 'Country': recolt['Country'].dtype}),
+                            on=['City', 'Country'], how='left')
+    grid = bench.run(rows, source, 'spatial_grid_build', lambda: SpatialGrid(geocoded, 'TRANSACTION'), repeat=1)
+    bench.run(rows, source, 'spatial_bins', lambda: [grid.bins(zoom) for zoom in grid.levels])
+
+
+def bench_workbook(bench, rows, frames, cities, workdir):
+    """Chaîne de Console_Total : classeur -> snapshot Parquet -> tables typées."""
+    source = 'xlsm'
+    if rows + 1 > EXCEL_MAX_ROWS:
+        bench.skip(rows, source, f"une feuille Excel est limitée à {EXCEL_MAX_ROWS} lignes")
+        bench_frames(bench, rows, 'memory', frames, cities)
+        return
+    path = os.path.join(workdir, f'Sources_{rows}.xlsm')
+    if not os.path.exists(path):
+        bench.run(rows, source, 'write_workbook', lambda: write_workbook(path, frames), repeat=1)
+    snapshot_dir = os.path.join(workdir, f'snapshots_{rows}')
+
+    def cold():
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+        return load_snapshot(path, SOURCE_SHEETS, SOURCE_DTYPES, snapshot_dir=snapshot_dir)
+    bench.run(rows, source, 'load_cold', cold, repeat=1)
+    loaded = bench.run(rows, source, 'load_warm',
+                       lambda: load_snapshot(path, SOURCE_SHEETS, SOURCE_DTYPES, snapshot_dir=snapshot_dir))
+    loaded['Effectif'] = loaded['Effectif'].drop_duplicates()
+    bench_frames(bench, rows, source, loaded, cities)
+
+
+def bench_sqlite(bench, rows, frames, workdir, seed):
+    """Chaîne de Console_Sql_Total sur la base de substitution SQLite."""
+    source = 'sqlite'
+    path = os.path.join(workdir, f'sales_{rows}.sqlite')
+    if not os.path.exists(path):
+        bench.run(rows, source, 'write_sqlite', lambda: write_sqlite(path, frames), repeat=1)
+    sync_dir = os.path.join(workdir, f'sync_{rows}')
+    with closing(connect_sqlite(path)) as conn:
+        def full():
+            shutil.rmtree(sync_dir, ignore_errors=True)
+            sync = SalesSync(sync_dir)
+            sync.refresh(conn, full=True)
+            return sync
+        sync = bench.run(rows, source, 'sync_full', full, repeat=1)
+        bench.run(rows, source, 'sync_delta', lambda: sync.refresh(conn))
+        # Sales et Effectifs lus en même temps, une connexion par table
+        bench.run(rows, source, 'sync_delta_parallel',
+                  lambda: sync.refresh_parallel(lambda: closing(connect_sqlite(path))))
+
+        analytics = SqlSalesAnalytics(conn)
+        options = bench.run(rows, source, 'sql_filter_options', analytics.filter_options)
+        filters = Filters(options['min_date'], options['max_date'],
+                          options['countries'][0] if options['countries'] else None,
+                          options['teams'][0] if options['teams'] else None)
+        bench.run(rows, source, 'sql_kpis', lambda: analytics.kpis(filters))
+        for dimension in GROUP_COLUMNS:
+            bench.run(rows, source, f'sql_group_by_{dimension}', lambda: analytics.breakdown(dimension, filters))
+        hyp = frames['Sales']['Hyp'].iloc[np.random.default_rng(seed).integers(0, rows)]
+        bench.run(rows, source, 'sql_agent_summary', lambda: analytics.agent_summary(hyp))
+
+
+def compare(results, baseline, tolerance):
+    """Étapes plus lentes que la référence au-delà de `tolerance` (rapport des durées minimales)."""
+    reference = {(r['rows'], r['source'], r['stage']): r['min_s'] for r in baseline['results']}
+    regressions = []
+    for result in results:
+        before = reference.get((result['rows'], result['source'], result['stage']))
+        if before and result['min_s'] > before * tolerance:
+            regressions.append(dict(result, baseline_s=before, ratio=round(result['min_s'] / before, 2)))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc d'essai des consoles sur données synthétiques")
+    parser.add_argument('--rows', nargs='+', default=['10k', '1M', '10M'], help="tailles (ex. 10k 1M 10M)")
+    parser.add_argument('--sources', nargs='+', default=['xlsm', 'sqlite'], choices=['xlsm', 'sqlite'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workdir', default=BENCH_DIR, help="classeurs et bases générés (réutilisés)")
+    parser.add_argument('--out', help="fichier JSON des résultats")
+    parser.add_argument('--baseline', help="résultats JSON de référence")
+    parser.add_argument('--tolerance', type=float, default=1.25, help="ralentissement toléré (rapport)")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.workdir, exist_ok=True)
+    bench = Bench(args.repeat)
+    for rows in map(parse_rows, args.rows):
+        frames, cities = bench.run(rows, 'memory', 'generate', lambda: synthetic_tables(rows, args.seed), repeat=1)
+        if 'xlsm' in args.sources:
+            bench_workbook(bench, rows, frames, cities, args.workdir)
+        if 'sqlite' in args.sources:
+            bench_sqlite(bench, rows, frames, args.workdir, args.seed)
+        del frames
+        gc.collect()
+
+    report = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+        },
+        'results': bench.results,
+        'skipped': bench.skipped,
+    }
+    status = 0
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            report['regressions'] = compare(bench.results, json.load(f), args.tolerance)
+        for r in report['regressions']:
+            print(f"régression : {r['rows']} {r['source']} {r['stage']} {r['baseline_s']:.4f} s -> {r['min_s']:.4f} s")
+        status = 1 if report['regressions'] else 0
+    text = json.dumps(report, indent=2, default=str)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    return status
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
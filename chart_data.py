@@ -0,0 +1,95 @@
+"""Préparation des données des graphiques Plotly, avec un budget par figure.
+
+Les figures envoient chaque point au navigateur : une ville, une équipe ou un
+jour de plus, c'est une barre, une part ou un point de plus dans le JSON.
+Avant de construire une figure :
+- `top_n` garde les N plus grandes catégories et regroupe le reste dans
+  « Autres » (barres, camemberts) ;
+- `downsample` réduit une série temporelle par LTTB (Largest-Triangle-Three-
+  Buckets), qui garde la forme de la courbe (pics et creux) ;
+- `largest` garde les points les plus importants d'un nuage (cartes).
+Le nombre de points est borné par CHART_MAX_POINTS et par CHART_MAX_BYTES
+(taille JSON estimée sur un échantillon de lignes).
+"""
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+CHART_TOP_N = int(os.environ.get('CHART_TOP_N', 20))
+CHART_MAX_POINTS = int(os.environ.get('CHART_MAX_POINTS', 2000))
+CHART_MAX_BYTES = int(os.environ.get('CHART_MAX_BYTES', 500_000))
+OTHERS_LABEL = 'Autres'
+
+
+def row_budget(df, max_points=None, max_bytes=None):
+    """Nombre maximal de lignes de `df` à tracer dans une figure."""
+    max_points = CHART_MAX_POINTS if max_points is None else max_points
+    max_bytes = CHART_MAX_BYTES if max_bytes is None else max_bytes
+    if df.empty:
+        return max_points
+    sample = df.head(50)
+    row_bytes = max(1, len(sample.to_json(orient='values', date_format='iso')) / len(sample))
+    return max(1, min(max_points, int(max_bytes // row_bytes)))
+
+
+def top_n(df, category, value, n=None, others=OTHERS_LABEL):
+    """Les `n` - 1 plus grandes catégories par `value`, plus une ligne `others` pour le reste."""
+    n = min(CHART_TOP_N if n is None else n, row_budget(df))
+    if len(df) <= n:
+        return df
+    ordered = df.sort_values(value, ascending=False, kind='stable')
+    head = ordered.head(n - 1)[[category, value]].astype({category: object})
+    rest = pd.DataFrame({category: [others], value: [ordered[value].iloc[n - 1:].sum()]})
+    return pd.concat([head, rest], ignore_index=True)
+
+
+def largest(df, value, max_points=None):
+    """Les lignes de plus grande `value`, dans la limite du budget de la figure."""
+    budget = row_budget(df, max_points)
+    if len(df) <= budget:
+        return df
+    return df.nlargest(budget, value)
+
+
+def lttb_indices(x, y, threshold):
+    """Positions des points retenus par Largest-Triangle-Three-Buckets."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    every = (n - 2) / (threshold - 2)
+
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        # Moyenne du seau suivant, troisième sommet du triangle
+        next_start = int(math.floor((i + 1) * every)) + 1
+        next_end = min(int(math.floor((i + 2) * every)) + 1, n)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        start = int(math.floor(i * every)) + 1
+        end = int(math.floor((i + 1) * every)) + 1
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    indices[-1] = n - 1
+    return indices
+
+
+def downsample(df, x, y, max_points=None):
+    """Série `x` / `y` triée par `x` réduite par LTTB au budget de la figure."""
+    budget = row_budget(df, max_points)
+    if len(df) <= budget:
+        return df
+    df = df.sort_values(x, kind='stable')
+    x_values = df[x]
+    if not pd.api.types.is_numeric_dtype(x_values):
+        x_values = pd.to_datetime(x_values)
+    x_values = x_values.to_numpy().astype('int64') if x_values.dtype.kind == 'M' else x_values.to_numpy()
+    y_values = df[y].fillna(0).to_numpy()
+    return df.iloc[lttb_indices(x_values, y_values, budget)]
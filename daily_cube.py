@@ -0,0 +1,95 @@
+"""Cube d'agrégats journaliers pour les KPI et graphiques du tableau de bord.
+
+Les transactions sont agrégées une fois par chargement au grain
+jour × dimensions (Country, City, Hyp, éventuellement Banques) avec somme et
+nombre de lignes. Chaque KPI ou graphique se calcule ensuite en agrégeant les
+cellules du cube retenues par les filtres : le coût dépend du nombre de
+groupes, pas du nombre de transactions.
+"""
+import numpy as np
+import pandas as pd
+
+
+class DailyCube:
+    """Cellules (jour, dimensions) -> somme / nombre d'une colonne de montants."""
+
+    def __init__(self, df, value_column, dims=('Country', 'City', 'Hyp'), date_column='ORDER_DATE'):
+        self.value_column = value_column
+        self.date_column = date_column
+        self.dims = [dim for dim in dims if dim in df.columns]
+        self._set_cells(self._aggregate(df))
+
+    def _keys(self):
+        return ['day', 'at_midnight'] + self.dims
+
+    def _aggregate(self, df):
+        dates = df[self.date_column]
+        frame = pd.DataFrame({
+            'day': dates.dt.normalize(),
+            # Une transaction pile à minuit appartient encore au jour de fin
+            # d'une période (ORDER_DATE <= date de fin), les autres non
+            'at_midnight': dates == dates.dt.normalize(),
+        })
+        for dim in self.dims:
+            frame[dim] = df[dim]
+        frame['sum'] = df[self.value_column]
+        return (
+            frame.dropna(subset=['day'])
+            .groupby(self._keys(), observed=True, dropna=False, sort=False)
+            .agg(sum=('sum', 'sum'), count=('sum', 'size'))
+            .reset_index()
+        )
+
+    def _set_cells(self, cells):
+        self.cells = cells.sort_values('day', kind='stable', ignore_index=True)
+        self._days = self.cells['day'].to_numpy(dtype='datetime64[ns]')
+
+    def apply_delta(self, delta_df):
+        """Intègre de nouvelles transactions : seuls les jours touchés sont ré-agrégés."""
+        delta = self._aggregate(delta_df)
+        if delta.empty:
+            return
+        first_day = np.datetime64(delta['day'].min(), 'ns')
+        split = np.searchsorted(self._days, first_day, 'left')
+        touched = pd.concat([self.cells.iloc[split:], delta], ignore_index=True)
+        touched = (
+            touched.groupby(self._keys(), observed=True, dropna=False, sort=False)
+            .agg(sum=('sum', 'sum'), count=('count', 'sum'))
+            .reset_index()
+        )
+        self._set_cells(pd.concat([self.cells.iloc[:split], touched], ignore_index=True))
+
+    def select(self, start_date=None, end_date=None, country=None, hyps=None):
+        """Cellules de la période [start_date, end_date] pour un pays et un ensemble de Hyp.
+
+        Même sémantique que `filter_data` : ORDER_DATE >= début et <= fin
+        (les dates de fin sont à minuit).
+        """
+        cells = self.cells
+        if start_date is not None and end_date is not None:
+            start = np.datetime64(pd.to_datetime(start_date), 'ns')
+            end = np.datetime64(pd.to_datetime(end_date), 'ns')
+            lo = np.searchsorted(self._days, start, 'left')
+            hi = np.searchsorted(self._days, end, 'right')
+            cells = cells.iloc[lo:hi]
+            cells = cells[(cells['day'] < end) | cells['at_midnight']]
+        if country is not None and 'Country' in self.dims:
+            cells = cells[cells['Country'] == country]
+        if hyps is not None and 'Hyp' in self.dims:
+            cells = cells[cells['Hyp'].isin(hyps)]
+        return cells
+
+    @staticmethod
+    def totals(cells):
+        """(somme, nombre de transactions, moyenne) des cellules retenues."""
+        total = cells['sum'].sum()
+        count = int(cells['count'].sum())
+        return total, count, total / count if count else float('nan')
+
+    def rollup(self, cells, by):
+        """Somme par dimension(s) `by`, au format attendu par les graphiques."""
+        return (
+            cells.groupby(by, observed=True)['sum'].sum()
+            .rename(self.value_column)
+            .reset_index()
+        )
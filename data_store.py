@@ -0,0 +1,157 @@
+"""Magasin de données partagé par toutes les sessions Streamlit d'un processus.
+
+`st.cache_data` renvoie une copie (dé-picklée) des DataFrames à chaque appel :
+chaque session ouverte finit par tenir ses propres copies de Sales, Recolt et
+Effectif. `DataStore`, gardé dans `st.cache_resource`, publie au contraire un
+seul `Snapshot` en lecture seule que toutes les sessions consultent.
+
+Un rafraîchissement construit un nouveau snapshot (tables et structures
+dérivées) à côté de l'ancien puis remplace la référence en une affectation :
+une session qui a déjà récupéré l'ancien snapshot le garde cohérent jusqu'à
+la fin de son exécution. Un thread de fond (`start_refresher`) fait ces
+rechargements hors des requêtes.
+
+Les tables d'un snapshot ne doivent pas être modifiées en place : les pages
+travaillent sur des sous-ensembles (`take`, `merge`, filtres) qui sont de
+nouveaux objets.
+"""
+import threading
+import time
+
+
+class Snapshot:
+    """Version figée des tables, avec ses structures dérivées (index, cubes)."""
+
+    def __init__(self, version, frames, meta=None):
+        self.version = version
+        self.frames = dict(frames)
+        self.meta = dict(meta or {})
+        self.loaded_at = time.time()
+        self._derived = {}
+        self._lock = threading.RLock()  # une structure dérivée peut en utiliser une autre
+
+    def __getitem__(self, name):
+        return self.frames[name]
+
+    def age(self):
+        """Secondes écoulées depuis le chargement."""
+        return time.time() - self.loaded_at
+
+    def derived(self, key, build):
+        """Structure dérivée de ce snapshot, construite une seule fois par `build()`."""
+        with self._lock:
+            if key not in self._derived:
+                self._derived[key] = build()
+            return self._derived[key]
+
+
+class DataStore:
+    """Snapshot courant des données, remplacé atomiquement à chaque rafraîchissement.
+
+    `loader()` retourne (tables, méta-données), tables étant un dict
+    nom -> DataFrame déjà prétraité. `warmup(snapshot)` construit les
+    structures dérivées (index, cubes) avant publication, hors du chemin des
+    requêtes.
+
+    Au-delà de `max_age` secondes, le snapshot est périmé : il reste servi
+    pendant qu'un rechargement tourne en arrière-plan (stale-while-revalidate).
+    Seul le tout premier chargement est fait pendant une requête.
+    """
+
+    def __init__(self, loader, max_age=None, warmup=None):
+        self.loader = loader
+        self.max_age = max_age
+        self.warmup = warmup
+        self.last_error = None
+        self._snapshot = None
+        self._version = 0
+        self._attempted_at = 0.0
+        self._refresh_lock = threading.Lock()
+        self._refresher = None
+        self._stop = threading.Event()
+
+    def current(self):
+        """Snapshot à servir ; seul le premier appel attend le chargement."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self.refresh(if_older_than=self.max_age)
+        if self._stale() and self._refresher is None:
+            self.refresh_async()
+        return snapshot
+
+    def _stale(self, max_age=None):
+        max_age = self.max_age if max_age is None else max_age
+        return max_age is not None and time.time() - self._attempted_at > max_age
+
+    def refresh(self, if_older_than=None):
+        """Recharge les tables et publie un nouveau snapshot.
+
+        Un seul rechargement à la fois : les appels concurrents attendent puis
+        reçoivent le snapshot qu'il a publié. En cas d'erreur, le snapshot
+        précédent reste servi (l'erreur est levée s'il n'y en a pas).
+        """
+        with self._refresh_lock:
+            snapshot = self._snapshot
+            if snapshot is not None and if_older_than is not None and not self._stale(if_older_than):
+                return snapshot  # rechargé par un autre appel pendant l'attente
+            self._attempted_at = time.time()
+            try:
+                frames, meta = self.loader()
+                new_snapshot = Snapshot(self._version + 1, frames, meta)
+                if self.warmup is not None:
+                    self.warmup(new_snapshot)
+            except Exception as e:
+                self.last_error = e
+                if snapshot is None:
+                    raise
+                return snapshot
+            self.last_error = None
+            self._version = new_snapshot.version
+            self._snapshot = new_snapshot
+            return new_snapshot
+
+    def refresh_async(self):
+        """Lance un rechargement en arrière-plan, sauf s'il y en a déjà un en cours."""
+        if self._refresh_lock.locked():
+            return
+        threading.Thread(target=self._refresh_quietly, name='data-store-refresh', daemon=True).start()
+
+    def _refresh_quietly(self, if_older_than=None):
+        try:
+            self.refresh(if_older_than)
+        except Exception:
+            pass  # erreur conservée dans last_error
+
+    def start_refresher(self, poll=5, signature=None):
+        """Thread qui recharge les données quand elles sont périmées ou que la source change.
+
+        `signature()` résume l'état de la source (par exemple date et taille
+        du fichier) ; un changement déclenche un rechargement immédiat.
+        """
+        if self._refresher is not None:
+            return
+
+        def run():
+            last = signature() if signature else None
+            while not self._stop.wait(poll):
+                current = signature() if signature else None
+                if current != last or self._stale():
+                    self._refresh_quietly()
+                    if self.last_error is None:
+                        last = current  # sinon nouvel essai au prochain tour
+
+        self._refresher = threading.Thread(target=run, name='data-store-refresher', daemon=True)
+        self._refresher.start()
+
+    def stats(self):
+        """Version, âge du snapshot courant et dernière erreur de rechargement."""
+        snapshot = self._snapshot
+        return {
+            'version': snapshot.version if snapshot is not None else None,
+            'age_s': round(snapshot.age(), 1) if snapshot is not None else None,
+            'last_error': str(self.last_error) if self.last_error is not None else None,
+        }
+
+    def stop(self):
+        """Arrête le thread de rechargement."""
+        self._stop.set()
@@ -0,0 +1,190 @@
+"""Pool de connexions à la base, partagé par tout le processus Streamlit.
+
+Les connexions sont ouvertes à la demande jusqu'à `max_size`, rendues au pool
+après usage, vérifiées (`SELECT 1`) si elles sont restées inactives et
+fermées au-delà de `max_idle` secondes. L'ouverture est retentée avec un
+délai exponentiel. Les temps d'attente et d'emprunt sont suivis dans
+`metrics()`.
+"""
+import threading
+import time
+from contextlib import closing, contextmanager
+
+
+class PoolTimeout(Exception):
+    """Aucune connexion libérée dans le délai imparti."""
+
+
+class ConnectionPool:
+    """Pool borné de connexions DB-API."""
+
+    def __init__(self, connect, max_size=5, max_idle=300, health_check_after=30,
+                 checkout_timeout=10, retries=3, backoff=0.5, health_query="SELECT 1"):
+        self._connect = connect
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.health_check_after = health_check_after
+        self.checkout_timeout = checkout_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.health_query = health_query
+
+        self._idle = []  # (connexion, dernier usage) ; la plus récente en fin de liste
+        self._size = 0
+        self._cond = threading.Condition()
+        self._metrics = {
+            'checkouts': 0, 'waits': 0, 'timeouts': 0,
+            'created': 0, 'closed': 0, 'connect_failures': 0, 'health_failures': 0,
+            'wait_seconds_total': 0.0, 'wait_seconds_max': 0.0,
+            'checkout_seconds_total': 0.0, 'checkout_seconds_max': 0.0,
+        }
+
+    # --- Cycle de vie des connexions ---------------------------------------
+
+    def _open(self):
+        """Nouvelle connexion, avec nouvelles tentatives et délai exponentiel."""
+        for attempt in range(self.retries):
+            try:
+                conn = self._connect()
+                with self._cond:
+                    self._metrics['created'] += 1
+                return conn
+            except Exception:
+                with self._cond:
+                    self._metrics['connect_failures'] += 1
+                if attempt == self.retries - 1:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._metrics['closed'] += 1
+            self._cond.notify()
+
+    def _healthy(self, conn):
+        try:
+            with closing(conn.cursor()) as cursor:
+                cursor.execute(self.health_query)
+                cursor.fetchone()
+            return True
+        except Exception:
+            with self._cond:
+                self._metrics['health_failures'] += 1
+            return False
+
+    def _evict_idle(self, now):
+        """Ferme les connexions inactives depuis plus de `max_idle` (sous verrou)."""
+        expired = [conn for conn, last_used in self._idle if now - last_used > self.max_idle]
+        self._idle = [(conn, last_used) for conn, last_used in self._idle
+                      if now - last_used <= self.max_idle]
+        return expired
+
+    # --- Emprunt / restitution ---------------------------------------------
+
+    def _checkout(self):
+        started = time.monotonic()
+        deadline = started + self.checkout_timeout
+        waited = False
+        with self._cond:
+            while True:
+                expired = self._evict_idle(time.monotonic())
+                if expired:
+                    self._size -= len(expired)
+                    self._metrics['closed'] += len(expired)
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._metrics['timeouts'] += 1
+                    raise PoolTimeout(f"Aucune connexion disponible après {self.checkout_timeout}s")
+                waited = True
+                self._cond.wait(remaining)
+
+            wait = time.monotonic() - started
+            self._metrics['checkouts'] += 1
+            self._metrics['waits'] += int(waited)
+            self._metrics['wait_seconds_total'] += wait
+            self._metrics['wait_seconds_max'] = max(self._metrics['wait_seconds_max'], wait)
+
+        for old in expired:
+            try:
+                old.close()
+            except Exception:
+                pass
+
+        if conn is not None and time.monotonic() - last_used > self.health_check_after:
+            if not self._healthy(conn):
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+                conn = None
+        if conn is None:
+            try:
+                conn = self._open()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+        return conn
+
+    def _checkin(self, conn, broken):
+        if not broken:
+            try:
+                conn.rollback()  # pas de transaction ouverte laissée au suivant
+            except Exception:
+                broken = True
+        if broken:
+            self._close(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Emprunte une connexion pour la durée du bloc `with`."""
+        conn = self._checkout()
+        started = time.monotonic()
+        broken = False
+        try:
+            yield conn
+        except Exception:
+            # Une erreur pendant l'usage peut venir d'une connexion coupée
+            broken = not self._healthy(conn)
+            raise
+        finally:
+            held = time.monotonic() - started
+            with self._cond:
+                self._metrics['checkout_seconds_total'] += held
+                self._metrics['checkout_seconds_max'] = max(self._metrics['checkout_seconds_max'], held)
+            self._checkin(conn, broken)
+
+    def metrics(self):
+        """Compteurs et temps d'attente / d'emprunt du pool."""
+        with self._cond:
+            metrics = dict(self._metrics)
+            metrics.update(size=self._size, idle=len(self._idle), in_use=self._size - len(self._idle),
+                           max_size=self.max_size)
+        checkouts = metrics['checkouts'] or 1
+        metrics['wait_seconds_avg'] = metrics['wait_seconds_total'] / checkouts
+        metrics['checkout_seconds_avg'] = metrics['checkout_seconds_total'] / checkouts
+        return metrics
+
+    def close(self):
+        """Ferme les connexions inactives (celles empruntées le seront à leur retour)."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close(conn)
@@ -0,0 +1,109 @@
+"""Types compacts des colonnes Sales / Recolt / Effectif.
+
+`normalize_frames` applique un schéma commun aux tables chargées :
+- les libellés répétitifs (Hyp, Country, City, Team...) deviennent des
+  catégories dont le dictionnaire est partagé entre les tables, pour que
+  les jointures et comparaisons entre tables restent sur les codes ;
+- les textes libres deviennent des chaînes Arrow (ou `string` sans pyarrow) ;
+- les entiers sont réduits au plus petit type suffisant, les notes en float32.
+Les montants restent en float64 pour que les totaux ne perdent pas de précision.
+"""
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    STRING_DTYPE = pd.StringDtype('pyarrow')
+except ImportError:
+    STRING_DTYPE = pd.StringDtype()
+
+SCHEMA = {
+    'Hyp': 'category',
+    'Country': 'category',
+    'City': 'category',
+    'Team': 'category',
+    'Activité': 'category',
+    'Departement': 'category',
+    'Banques': 'category',
+    'SHORT_MESSAGE': 'category',
+    'Type': 'category',
+    'ORDER_REFERENCE': 'string',
+    'UserName': 'string',
+    'NOM': 'string',
+    'PRENOM': 'string',
+    'ID': 'string',
+    'ID_AGTSDA': 'string',
+    'ORDER_DATE': 'datetime',
+    'Date_In': 'datetime',
+    'Montant': 'amount',
+    'TRANSACTION': 'amount',
+    'Total_sale': 'amount',
+    'Rating': 'float32',
+}
+
+# Au-delà de cette proportion de valeurs distinctes, une catégorie ne fait pas gagner de place
+MAX_CATEGORY_RATIO = 0.5
+
+
+def memory_usage(df):
+    """Taille en mémoire (octets, chaînes comprises) d'un DataFrame."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def _shared_categories(frames, column):
+    """Dictionnaire commun d'une colonne catégorielle, ou None s'il y a trop de valeurs."""
+    values = [df[column] for df in frames.values() if column in df.columns]
+    rows = sum(len(v) for v in values)
+    uniques = pd.Index(pd.concat([pd.Series(v.dropna().unique()) for v in values], ignore_index=True)).unique() \
+        if values else pd.Index([])
+    if rows and len(uniques) > max(1, rows * MAX_CATEGORY_RATIO):
+        return None
+    try:
+        return uniques.sort_values()
+    except TypeError:  # valeurs de types mélangés : ordre d'apparition
+        return uniques
+
+
+def _convert(series, kind, categories):
+    if kind == 'category':
+        if categories is None:
+            return _convert(series, 'string', None)
+        return series.astype(pd.CategoricalDtype(categories))
+    if kind == 'string':
+        return series.astype(STRING_DTYPE) if series.dtype == object else series
+    if kind == 'datetime':
+        return pd.to_datetime(series, errors='coerce')
+    if kind == 'amount':
+        return pd.to_numeric(series, errors='coerce').fillna(0).astype('float64')
+    if kind == 'float32':
+        return pd.to_numeric(series, errors='coerce').astype('float32')
+    return series
+
+
+def _downcast(series):
+    if pd.api.types.is_integer_dtype(series.dtype) and series.dtype.kind in 'iu':
+        return pd.to_numeric(series, downcast='integer')
+    return series
+
+
+def normalize_frames(frames, schema=SCHEMA):
+    """Applique le schéma à un dict nom -> DataFrame ; retourne (tables, rapport mémoire).
+
+    Le rapport indique, par table, la taille avant / après en Mo.
+    """
+    categories = {
+        column: _shared_categories(frames, column)
+        for column, kind in schema.items() if kind == 'category'
+    }
+    result, report = {}, []
+    for name, df in frames.items():
+        before = memory_usage(df)
+        df = df.copy()
+        for column in df.columns:
+            kind = schema.get(column)
+            df[column] = _convert(df[column], kind, categories.get(column)) if kind else _downcast(df[column])
+        result[name] = df
+        report.append({'Table': name, 'Lignes': len(df),
+                       'Avant (Mo)': before / 2**20, 'Après (Mo)': memory_usage(df) / 2**20})
+    report = pd.DataFrame(report, columns=['Table', 'Lignes', 'Avant (Mo)', 'Après (Mo)'])
+    report['Gain'] = report['Avant (Mo)'] / report['Après (Mo)'].where(report['Après (Mo)'] > 0)
+    return result, report
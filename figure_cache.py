@@ -0,0 +1,118 @@
+"""Cache des figures Plotly partagé par les sessions.
+
+Chaque ré-exécution Streamlit reconstruisait toutes les figures de la page
+(agrégation, validation Plotly Express), même quand seul un widget sans
+rapport avait changé. `FigureCache` garde les figures construites, par clé
+(version du snapshot, page, graphique, filtres) : une figure dont la clé n'a
+pas changé est réutilisée telle quelle.
+
+Le cache est LRU, borné en nombre d'entrées et en mémoire. La taille d'une
+figure est estimée à l'insertion par les octets de ses tableaux de données,
+sans la sérialiser : `st.plotly_chart` la sérialise déjà à chaque affichage
+(il n'accepte pas de JSON préparé). Les figures mises en cache ne doivent
+pas être modifiées par les pages.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import streamlit as st
+
+from profiling import stage
+
+FIGURE_CACHE_ENTRIES = int(os.environ.get('FIGURE_CACHE_ENTRIES', 256))
+FIGURE_CACHE_MB = float(os.environ.get('FIGURE_CACHE_MB', 64))
+# Octets comptés par valeur d'un tableau d'objets ou d'une liste (texte, dates)
+OBJECT_ITEM_BYTES = 16
+
+
+def _data_bytes(props):
+    total = 0
+    for value in props.values():
+        if isinstance(value, dict):
+            total += _data_bytes(value)
+        elif isinstance(value, np.ndarray):
+            total += value.size * OBJECT_ITEM_BYTES if value.dtype == object else value.nbytes
+        elif isinstance(value, (list, tuple)):
+            total += len(value) * OBJECT_ITEM_BYTES
+    return total
+
+
+def figure_bytes(figure):
+    """Taille estimée d'une figure : octets des tableaux de ses traces, sans sérialisation."""
+    # `_props` : propriétés de la trace sans copie (`to_plotly_json` en fait une copie profonde)
+    return sum(_data_bytes(getattr(trace, '_props', None) or trace.to_plotly_json())
+               for trace in figure.data)
+
+
+class FigureCache:
+    """Figures construites, par clé, avec éviction LRU."""
+
+    def __init__(self, max_entries=FIGURE_CACHE_ENTRIES, max_bytes=int(FIGURE_CACHE_MB * 2**20)):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, build):
+        """Figure de `key`, construite par `build()` si elle n'est pas en cache."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # Construction hors du verrou : les autres sessions ne sont pas bloquées
+        with stage('figure_build'):
+            figure = build()
+        size = figure_bytes(figure)
+        with self._lock:
+            if size <= self.max_bytes:
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self._bytes -= old[1]
+                self._entries[key] = (figure, size)
+                self._bytes += size
+                self._evict()
+        return figure
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        """Vide le cache (les compteurs sont conservés)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Compteurs du cache et taux de succès."""
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'size_mb': round(self._bytes / 2**20, 2),
+                'max_size_mb': round(self.max_bytes / 2**20, 2),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / requests, 3) if requests else None,
+            }
+
+
+def cached_chart(cache, key, build, **kwargs):
+    """Affiche la figure de `key` (construite par `build()` au premier appel)."""
+    figure = cache.get(key, build)
+    with stage('plotly_chart'):
+        st.plotly_chart(figure, **kwargs)
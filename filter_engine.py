@@ -0,0 +1,152 @@
+"""Index de filtrage construits une fois par chargement de données.
+
+`FilterIndex` remplace la chaîne copie + masques de `filter_data` :
+- les dates ORDER_DATE sont triées une fois, une période se résout par
+  recherche dichotomique ;
+- chaque valeur de Country et des attributs du personnel (Team, Departement,
+  Activité, via Hyp) a son bitmap de lignes (bits compactés avec numpy).
+
+Une combinaison de filtres est l'intersection de ces bitmaps ; seules les
+lignes retenues sont extraites du DataFrame de base, jamais copié en entier.
+"""
+import numpy as np
+import pandas as pd
+
+
+def _pack(mask):
+    return np.packbits(mask)
+
+
+def staff_hyps(staff_df, hyp_column='Hyp', **staff_filters):
+    """Hyp du personnel correspondant aux filtres (None pour « tous »)."""
+    staff = staff_df
+    for column, value in staff_filters.items():
+        if value is not None:
+            staff = staff[staff[column] == value]
+    return staff[hyp_column]
+
+
+class FilterIndex:
+    """Index d'un DataFrame de transactions (et de son personnel associé)."""
+
+    def __init__(self, df, staff_df=None, staff_columns=('Team', 'Departement', 'Activité'),
+                 date_column='ORDER_DATE', country_column='Country', hyp_column='Hyp'):
+        self.df = df
+        self.size = len(df)
+        self.date_column = date_column if date_column in df.columns else None
+        self.country_column = country_column if country_column in df.columns else None
+
+        # Dates triées une fois (les NaT finissent en fin de tableau)
+        if self.date_column:
+            dates = df[date_column].to_numpy(dtype='datetime64[ns]')
+            self._date_order = np.argsort(dates, kind='stable')
+            self._sorted_dates = dates[self._date_order]
+
+        self._country_bitmaps = {}
+        if self.country_column:
+            codes, uniques = pd.factorize(df[country_column])
+            self._country_bitmaps = self._bitmaps(codes, uniques)
+
+        # Hyp -> lignes : positions groupées par code Hyp
+        self._hyp_uniques = None
+        self._staff_bitmaps = {}
+        self._staff_known = None
+        if hyp_column in df.columns:
+            self._hyp_codes, self._hyp_uniques = pd.factorize(df[hyp_column])
+            self._hyp_order = np.argsort(self._hyp_codes, kind='stable')
+            self._hyp_bounds = np.searchsorted(
+                self._hyp_codes[self._hyp_order], np.arange(len(self._hyp_uniques) + 1))
+            if staff_df is not None and not staff_df.empty:
+                self._index_staff(staff_df, [c for c in staff_columns if c in staff_df.columns], hyp_column)
+
+        self._combo_cache = {}
+
+    def _bitmaps(self, codes, uniques):
+        """Bitmap compacté des lignes pour chaque valeur distincte d'une colonne."""
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        bitmaps = {}
+        for code, value in enumerate(uniques):
+            mask = np.zeros(self.size, dtype=bool)
+            mask[order[bounds[code]:bounds[code + 1]]] = True
+            bitmaps[value] = _pack(mask)
+        return bitmaps
+
+    def _hyp_mask(self, hyps):
+        """Masque des lignes dont le Hyp appartient à `hyps`."""
+        selected = np.zeros(len(self._hyp_uniques) + 1, dtype=bool)
+        codes = self._hyp_uniques.get_indexer(pd.Index(hyps).dropna().unique())
+        selected[codes[codes >= 0]] = True
+        # Le code -1 (Hyp manquant) pointe sur la dernière case, toujours False
+        return selected[self._hyp_codes]
+
+    def _index_staff(self, staff_df, staff_columns, hyp_column):
+        self._staff = staff_df[[hyp_column] + staff_columns].drop_duplicates()
+        self._staff_hyp = hyp_column
+        self._staff_known = _pack(self._hyp_mask(self._staff[hyp_column]))
+        for column in staff_columns:
+            groups = self._staff.groupby(column, sort=False)[hyp_column]
+            self._staff_bitmaps[column] = {
+                value: _pack(self._hyp_mask(hyps)) for value, hyps in groups
+            }
+        # Si un Hyp a plusieurs lignes d'attributs différentes, l'intersection des
+        # bitmaps par attribut n'est plus exacte : on passe par la combinaison
+        self._staff_functional = not self._staff[hyp_column].duplicated().any()
+
+    def _staff_bitmap(self, staff_filters):
+        active = {column: value for column, value in staff_filters.items() if value is not None}
+        if not active:
+            return self._staff_known
+        if self._staff_functional:
+            return self._intersect([
+                self._staff_bitmaps.get(column, {}).get(value, _pack(np.zeros(self.size, dtype=bool)))
+                for column, value in active.items()
+            ])
+        key = tuple(sorted(active.items()))
+        if key not in self._combo_cache:
+            hyps = staff_hyps(self._staff, self._staff_hyp, **active)
+            self._combo_cache[key] = _pack(self._hyp_mask(hyps))
+        return self._combo_cache[key]
+
+    @staticmethod
+    def _intersect(bitmaps):
+        result = bitmaps[0]
+        for bitmap in bitmaps[1:]:
+            result = np.bitwise_and(result, bitmap)
+        return result
+
+    def _date_positions(self, start_date, end_date):
+        lo = np.searchsorted(self._sorted_dates, np.datetime64(pd.to_datetime(start_date), 'ns'), 'left')
+        hi = np.searchsorted(self._sorted_dates, np.datetime64(pd.to_datetime(end_date), 'ns'), 'right')
+        return np.sort(self._date_order[lo:hi])
+
+    def positions(self, country=None, start_date=None, end_date=None, **staff_filters):
+        """Positions des lignes retenues ; None pour un filtre signifie « tous »."""
+        bitmaps = []
+        if country is not None and self.country_column:
+            bitmaps.append(self._country_bitmaps.get(country, _pack(np.zeros(self.size, dtype=bool))))
+        if self._staff_known is not None:
+            bitmaps.append(self._staff_bitmap(staff_filters))
+
+        mask = None
+        if bitmaps:
+            mask = np.unpackbits(self._intersect(bitmaps), count=self.size).view(bool)
+
+        if self.date_column and start_date is not None and end_date is not None:
+            positions = self._date_positions(start_date, end_date)
+            return positions if mask is None else positions[mask[positions]]
+        return np.arange(self.size) if mask is None else np.flatnonzero(mask)
+
+    def filter(self, country=None, start_date=None, end_date=None, **staff_filters):
+        """Sous-ensemble filtré du DataFrame (index d'origine conservé)."""
+        return self.df.take(self.positions(country, start_date, end_date, **staff_filters))
+
+    def rows_for_hyp(self, hyp):
+        """Lignes d'un seul Hyp, sans balayer le DataFrame."""
+        if self._hyp_uniques is None:
+            return self.df.iloc[0:0]
+        code = self._hyp_uniques.get_indexer([hyp])[0]
+        if code < 0:
+            return self.df.iloc[0:0]
+        positions = np.sort(self._hyp_order[self._hyp_bounds[code]:self._hyp_bounds[code + 1]])
+        return self.df.take(positions)
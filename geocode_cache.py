@@ -0,0 +1,274 @@
+"""Cache persistant des coordonnées des villes (SQLite).
+
+Les couples (City, Country) sont normalisés puis stockés avec leur latitude /
+longitude. Le tableau de bord ne consulte que ce cache et le gazetteer local :
+les appels à Nominatim sont réservés au pré-remplissage hors ligne.
+
+Une ville que Nominatim ne connaît pas est mémorisée comme échec (`failed_at`)
+et n'est redemandée au réseau qu'après FAILURE_RETRY_DAYS jours ; le
+gazetteer local la cherche toujours. Une erreur du service (réseau, délai,
+HTTP 429) n'est jamais mémorisée : la ville reste à géocoder.
+
+    python geocode_cache.py prefill              # villes de Sources.xlsm
+    python geocode_cache.py prefill --offline    # gazetteer local uniquement
+    python geocode_cache.py stats
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import unicodedata
+from contextlib import closing
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+GEOCODE_DB = os.environ.get('GEOCODE_DB', 'geocode_cache.sqlite')
+GAZETTEER_FILE = os.environ.get('GEOCODE_GAZETTEER', 'gazetteer.csv')
+# Délai avant de redemander au réseau une ville introuvable (jours)
+FAILURE_RETRY_DAYS = int(os.environ.get('GEOCODE_RETRY_DAYS', 30))
+# Erreurs de service consécutives au-delà desquelles un backend est abandonné pour ce passage
+BACKEND_MAX_ERRORS = 5
+
+# Réponse d'un backend indisponible (erreur réseau, délai, HTTP 429) : ni un
+# résultat ni un échec, jamais mémorisée
+UNAVAILABLE = object()
+
+
+def normalize_key(city, country):
+    """Clé normalisée 'ville|pays' : sans accents, en minuscules, espaces réduits."""
+    def norm(value):
+        text = unicodedata.normalize('NFKD', str(value))
+        text = ''.join(c for c in text if not unicodedata.combining(c))
+        return ' '.join(text.lower().split())
+    return f"{norm(city)}|{norm(country)}"
+
+
+class GeocodeStore:
+    """Table SQLite clé normalisée -> (latitude, longitude).
+
+    Une ligne sans coordonnées mémorise un échec (date dans `failed_at`),
+    pour ne pas redemander la même ville au réseau à chaque pré-remplissage.
+    """
+
+    def __init__(self, path=GEOCODE_DB, retry_days=FAILURE_RETRY_DAYS):
+        self.path = path
+        self.retry_days = retry_days
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS geocodes ("
+                " key TEXT PRIMARY KEY, City TEXT, Country TEXT,"
+                " Latitude REAL, Longitude REAL, source TEXT, updated_at TEXT, failed_at TEXT)"
+            )
+            # Cache créé avant `failed_at` : les échecs existants datent de leur mise à jour
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(geocodes)")}
+            if 'failed_at' not in columns:
+                conn.execute("ALTER TABLE geocodes ADD COLUMN failed_at TEXT")
+                conn.execute("UPDATE geocodes SET failed_at = updated_at WHERE Latitude IS NULL")
+            conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _count(self, conn, name, value):
+        if value:
+            conn.execute(
+                "INSERT INTO stats (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                (name, value))
+
+    def get_many(self, pairs):
+        """Coordonnées connues pour une liste de (City, Country).
+
+        Retourne ({clé: (lat, lon)}, {clés en échec récent}) : les échecs
+        mémorisés depuis moins de `retry_days` jours sont à part, les plus
+        anciens et les clés jamais vues sont absents des deux. Seules les
+        coordonnées comptent comme hits.
+        """
+        keys = {normalize_key(city, country) for city, country in pairs}
+        retry_before = (datetime.now() - timedelta(days=self.retry_days)).isoformat(timespec='seconds')
+        found, failed = {}, set()
+        with closing(self._connect()) as conn, conn:
+            ordered = list(keys)
+            for start in range(0, len(ordered), 500):
+                chunk = ordered[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT key, Latitude, Longitude, failed_at FROM geocodes "
+                    f"WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+                for key, lat, lon, failed_at in rows:
+                    if lat is not None and lon is not None:
+                        found[key] = (lat, lon)
+                    elif failed_at is not None and failed_at >= retry_before:
+                        failed.add(key)
+            self._count(conn, 'hits', len(found))
+            self._count(conn, 'misses', len(keys) - len(found))
+        return found, failed
+
+    def put_many(self, records, source):
+        """Enregistre des (City, Country, lat, lon) ; lat/lon à None pour un échec."""
+        now = datetime.now().isoformat(timespec='seconds')
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(normalize_key(city, country), city, country, lat, lon, source, now,
+                  now if lat is None else None)
+                 for city, country, lat, lon in records])
+
+    def stats(self):
+        """Compteurs hits / misses cumulés et nombre d'entrées du cache."""
+        with closing(self._connect()) as conn:
+            stats = dict(conn.execute("SELECT name, value FROM stats"))
+            stats['entries'] = conn.execute("SELECT COUNT(*) FROM geocodes").fetchone()[0]
+            stats['failures'] = conn.execute(
+                "SELECT COUNT(*) FROM geocodes WHERE Latitude IS NULL").fetchone()[0]
+        stats.setdefault('hits', 0)
+        stats.setdefault('misses', 0)
+        return stats
+
+
+class GazetteerBackend:
+    """Géocodeur local sans réseau, lu depuis un CSV City,Country,Latitude,Longitude."""
+
+    name = 'gazetteer'
+    # Local et sans coût : cherche aussi les villes en échec récent
+    remote = False
+
+    def __init__(self, path=GAZETTEER_FILE):
+        self.places = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8', newline='') as f:
+                for row in csv.DictReader(f):
+                    self.places[normalize_key(row['City'], row['Country'])] = (
+                        float(row['Latitude']), float(row['Longitude']))
+
+    def geocode(self, city, country):
+        return self.places.get(normalize_key(city, country))
+
+
+class NominatimBackend:
+    """Géocodeur distant (OpenStreetMap), limité à une requête par seconde."""
+
+    name = 'nominatim'
+    remote = True
+
+    def __init__(self, user_agent="sales_dashboard", min_delay_seconds=1):
+        from geopy.geocoders import Nominatim
+        from geopy.extra.rate_limiter import RateLimiter
+
+        geolocator = Nominatim(user_agent=user_agent)
+        self._geocode = RateLimiter(geolocator.geocode, min_delay_seconds=min_delay_seconds)
+
+    def geocode(self, city, country):
+        """(lat, lon), None si la ville est introuvable, UNAVAILABLE si le service ne répond pas."""
+        from geopy.exc import GeocoderServiceError
+
+        try:
+            location = self._geocode(f"{city}, {country}")
+        except GeocoderServiceError:
+            # Délai, HTTP 429, service indisponible : ce n'est pas « introuvable »
+            return UNAVAILABLE
+        return (location.latitude, location.longitude) if location else None
+
+
+def resolve(pairs, store, backends, remember_failures=False):
+    """Coordonnées de chaque (City, Country) : cache d'abord, puis les backends dans l'ordre.
+
+    Retourne {clé: (lat, lon)} des seules villes géocodées. Avec
+    `remember_failures`, les villes qu'aucun backend n'a trouvées sont
+    mémorisées comme échecs ; pas celles qu'un backend n'a pas pu chercher.
+    """
+    pairs = list(dict.fromkeys(pairs))
+    known, failed = store.get_many(pairs)
+    unresolved = set()
+    for backend in backends:
+        missing = [(city, country) for city, country in pairs
+                   if normalize_key(city, country) not in known
+                   and not (backend.remote and normalize_key(city, country) in failed)]
+        if not missing:
+            continue
+        records, errors = [], 0
+        for position, (city, country) in enumerate(missing):
+            coords = backend.geocode(city, country)
+            if coords is UNAVAILABLE:
+                unresolved.add(normalize_key(city, country))
+                errors += 1
+                if errors >= BACKEND_MAX_ERRORS:
+                    # Service en panne : les villes restantes seront cherchées au prochain passage
+                    unresolved.update(normalize_key(*pair) for pair in missing[position + 1:])
+                    break
+                continue
+            errors = 0
+            if coords:
+                known[normalize_key(city, country)] = coords
+                records.append((city, country, coords[0], coords[1]))
+        store.put_many(records, backend.name)
+
+    if remember_failures:
+        failures = [(city, country, None, None) for city, country in pairs
+                    if normalize_key(city, country) not in known
+                    and normalize_key(city, country) not in unresolved
+                    and normalize_key(city, country) not in failed]
+        store.put_many(failures, 'none')
+    return known
+
+
+def geocode_frame(df, store=None, backends=None):
+    """Ajoute Latitude / Longitude à un DataFrame City / Country, sans appel réseau.
+
+    Les villes absentes du cache et du gazetteer restent à NaN jusqu'au
+    prochain `python geocode_cache.py prefill`.
+    """
+    store = store or GeocodeStore()
+    backends = [GazetteerBackend()] if backends is None else backends
+    cities = df[['City', 'Country']].drop_duplicates().dropna()
+    pairs = list(cities.itertuples(index=False, name=None))
+    known = resolve(pairs, store, backends)
+
+    locations = []
+    for city, country in pairs:
+        lat, lon = known.get(normalize_key(city, country), (None, None))
+        locations.append({'City': city, 'Country': country, 'Latitude': lat, 'Longitude': lon})
+    locations_df = pd.DataFrame(locations, columns=['City', 'Country', 'Latitude', 'Longitude'])
+    locations_df[['Latitude', 'Longitude']] = locations_df[['Latitude', 'Longitude']].astype(float)
+    # Mêmes types de clés que `df` (catégories comprises) pour la jointure
+    locations_df = locations_df.astype({'City': df['City'].dtype, 'Country': df['Country'].dtype})
+    return pd.merge(df, locations_df, on=['City', 'Country'], how='left')
+
+
+def _source_pairs(excel_file, sheets):
+    from xlsx_reader import read_sheets
+
+    frames = read_sheets(excel_file, {sheet: ['City', 'Country'] for sheet in sheets})
+    cities = pd.concat(df[['City', 'Country']] for df in frames.values()).drop_duplicates().dropna()
+    return list(cities.itertuples(index=False, name=None))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cache de géocodage des villes")
+    parser.add_argument('--db', default=GEOCODE_DB, help="fichier SQLite du cache")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    prefill = commands.add_parser('prefill', help="géocode les villes absentes du cache")
+    prefill.add_argument('--excel', default='Sources.xlsm')
+    prefill.add_argument('--sheets', nargs='+', default=['Sales', 'Recolt'])
+    prefill.add_argument('--gazetteer', default=GAZETTEER_FILE)
+    prefill.add_argument('--offline', action='store_true', help="sans Nominatim")
+    commands.add_parser('stats', help="affiche les compteurs du cache")
+
+    args = parser.parse_args(argv)
+    store = GeocodeStore(args.db)
+
+    if args.command == 'prefill':
+        pairs = _source_pairs(args.excel, args.sheets)
+        backends = [GazetteerBackend(args.gazetteer)]
+        if not args.offline:
+            backends.append(NominatimBackend())
+        known = resolve(pairs, store, backends, remember_failures=not args.offline)
+        print(f"{len(known)}/{len(pairs)} villes géocodées")
+
+    for name, value in store.stats().items():
+        print(f"{name}: {value}")
+
+
+if __name__ == '__main__':
+    main()
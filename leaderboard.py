@@ -0,0 +1,130 @@
+"""Classement des agents (Hyp) sur une période.
+
+Les meilleurs vendeurs se lisaient sur le camembert par équipe ou en triant
+toute la table des ventes à chaque exécution. `Leaderboard` agrège une fois
+les ventes en cellules jour x Hyp (montant, nombre de ventes, somme et
+nombre des notes), triées par jour : les totaux d'une période sont une
+somme par Hyp (`np.bincount`) des cellules de la plage de jours, trouvée
+par recherche dichotomique. Les K premiers sont choisis par sélection
+partielle (`np.argpartition`) ; seuls ces K sont triés puis complétés par
+le personnel (NOM, PRENOM, Team) via un index Hyp -> ligne construit une
+fois.
+
+Contrairement aux cumuls denses de `TrendIndex`, la mémoire reste
+proportionnelle aux cellules non vides, même avec des milliers d'agents.
+Les nouvelles ventes (`apply_delta`) sont ajoutées en fin de tableau.
+"""
+import numpy as np
+import pandas as pd
+
+# Mesures de chaque cellule jour x Hyp (colonnes de `_values`)
+MEASURES = ('total', 'count', 'rating_sum', 'rating_count')
+# Colonnes du personnel ajoutées au classement
+LEADERBOARD_STAFF = ('NOM', 'PRENOM', 'Team')
+# Critères de classement -> libellé
+RANKINGS = {'total': "Ventes totales", 'count': "Nombre de ventes", 'mean': "Vente moyenne",
+            'rating': "Note moyenne"}
+
+
+def staff_index(staff, columns=LEADERBOARD_STAFF):
+    """Personnel indexé par Hyp (une ligne par Hyp), limité aux colonnes présentes."""
+    if staff is None or staff.empty or 'Hyp' not in staff.columns:
+        return pd.DataFrame(columns=list(columns), index=pd.Index([], name='Hyp'))
+    columns = [column for column in columns if column in staff.columns]
+    return staff.drop_duplicates('Hyp').set_index('Hyp')[columns]
+
+
+class Leaderboard:
+    """Mesures par jour et par Hyp (montant, ventes, notes) et sélection des K premiers."""
+
+    def __init__(self, df, value_column, rating_column='Rating', date_column='ORDER_DATE'):
+        self.value_column = value_column
+        self.rating_column = rating_column
+        self.date_column = date_column
+        self.keys = pd.Index([], name='Hyp')
+        self._days = np.array([], dtype='datetime64[ns]')
+        self._codes = np.array([], dtype='int64')
+        self._values = np.zeros((0, len(MEASURES)))
+        self.apply_delta(df)
+
+    def _aggregate(self, df):
+        if self.rating_column in df.columns:
+            rating = pd.to_numeric(df[self.rating_column], errors='coerce')
+        else:
+            rating = pd.Series(np.nan, index=df.index)
+        frame = pd.DataFrame({
+            'day': pd.to_datetime(df[self.date_column], errors='coerce').dt.normalize(),
+            'Hyp': df['Hyp'],
+            'total': pd.to_numeric(df[self.value_column], errors='coerce').fillna(0),
+            'count': 1,
+            'rating_sum': rating.fillna(0),
+            'rating_count': rating.notna().astype('int64'),
+        })
+        return (frame.dropna(subset=['day', 'Hyp'])
+                .groupby(['day', 'Hyp'], observed=True)[list(MEASURES)].sum()
+                .reset_index())
+
+    def apply_delta(self, delta_df):
+        """Ajoute des ventes : leurs cellules jour x Hyp sont ajoutées en fin de tableau."""
+        delta = self._aggregate(delta_df)
+        if delta.empty:
+            return
+        new_keys = pd.Index(delta['Hyp'].unique()).difference(self.keys)
+        if len(new_keys):
+            self.keys = self.keys.append(new_keys).rename('Hyp')
+        days = delta['day'].to_numpy(dtype='datetime64[ns]')
+        # Ventes en retard (jours antérieurs aux derniers connus) : nouveau tri stable par jour
+        resort = len(self._days) and days[0] < self._days[-1]
+        self._days = np.concatenate([self._days, days])
+        self._codes = np.concatenate([self._codes, self.keys.get_indexer(delta['Hyp'])])
+        self._values = np.concatenate([self._values, delta[list(MEASURES)].to_numpy(dtype='float64')])
+        if resort:
+            order = np.argsort(self._days, kind='stable')
+            self._days, self._codes, self._values = self._days[order], self._codes[order], self._values[order]
+
+    def window(self, start_date=None, end_date=None):
+        """Mesures par Hyp sur la période : tableau (agents x MEASURES)."""
+        lo = 0 if start_date is None else self._days.searchsorted(
+            np.datetime64(pd.Timestamp(start_date).normalize(), 'ns'), 'left')
+        hi = len(self._days) if end_date is None else self._days.searchsorted(
+            np.datetime64(pd.Timestamp(end_date).normalize(), 'ns'), 'right')
+        codes, values = self._codes[lo:hi], self._values[lo:hi]
+        return np.column_stack([np.bincount(codes, weights=values[:, i], minlength=len(self.keys))
+                                for i in range(len(MEASURES))])
+
+    def top(self, k, start_date=None, end_date=None, by='total', hyps=None, min_count=1,
+            ascending=False, staff=None):
+        """Les `k` premiers Hyp de la période selon `by` (voir RANKINGS).
+
+        `hyps` limite le classement à ces agents (filtres du personnel) ;
+        seuls les agents avec au moins `min_count` ventes sur la période
+        (et au moins une note pour `by='rating'`) sont classés. `staff` :
+        personnel indexé par Hyp (`staff_index`), joint aux seuls K retenus.
+        Retourne (classement, nombre d'agents classés).
+        """
+        total, count, rating_sum, rating_count = self.window(start_date, end_date).T
+        with np.errstate(divide='ignore', invalid='ignore'):
+            metrics = {'total': total, 'count': count, 'mean': total / count,
+                       'rating': rating_sum / rating_count}
+        eligible = count >= max(min_count, 1)
+        if by == 'rating':
+            eligible &= rating_count > 0
+        if hyps is not None:
+            eligible &= self.keys.isin(hyps)
+        candidates = np.flatnonzero(eligible)
+
+        # Sélection partielle : O(agents) pour isoler les K premiers, tri de ces K seulement
+        scores = metrics[by][candidates] * (1 if ascending else -1)
+        k = min(k, len(candidates))
+        chosen = np.argpartition(scores, k - 1)[:k] if 0 < k < len(candidates) else np.arange(k)
+        chosen = candidates[chosen[np.argsort(scores[chosen], kind='stable')]]
+
+        result = pd.DataFrame({'Rang': np.arange(1, k + 1), 'Hyp': self.keys[chosen]})
+        if staff is not None:
+            details = staff.reindex(result['Hyp'])
+            for column in details.columns:
+                result[column] = details[column].to_numpy()
+        for name in RANKINGS:
+            result[name] = metrics[name][chosen]
+        result['count'] = result['count'].astype('int64')
+        return result, len(candidates)
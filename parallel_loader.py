@@ -0,0 +1,109 @@
+"""Chargement concurrent de sources indépendantes, avec délai par source.
+
+Les feuilles du classeur, la vue Planning et les requêtes Sales / Effectifs
+étaient lues l'une après l'autre : un démarrage à froid durait la somme des
+sources. `load_parallel` lance chaque source dans un pool de threads (accès
+base, fichiers Parquet) ou de processus (analyse XML du classeur, limitée
+par le CPU) et attend au plus `timeout` secondes par source. Le démarrage
+dure alors à peu près le temps de la source la plus lente.
+
+Le rapport indique pour chaque source son statut (ok, error, timeout) et sa
+durée. Une source facultative en échec est seulement signalée ; l'échec
+d'une source obligatoire lève `PartialLoadError`, qui porte aussi les
+résultats des autres sources.
+
+Une source en dépassement n'est pas interrompue (ni thread ni processus ne
+peuvent l'être proprement) : son résultat est abandonné et le pool est
+libéré sans l'attendre.
+"""
+import multiprocessing
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+# Nombre maximal de processus d'analyse (les threads, limités par les E/S, ne sont pas bornés)
+LOAD_WORKERS = int(os.environ.get('LOAD_WORKERS', min(4, os.cpu_count() or 1)))
+# Délai maximal (secondes) d'une source, compté depuis le lancement du chargement
+LOAD_TIMEOUT = float(os.environ.get('LOAD_TIMEOUT', 600))
+# Démarrage des processus : 'spawn' n'hérite pas des threads du serveur Streamlit
+LOAD_START_METHOD = os.environ.get('LOAD_START_METHOD', 'spawn')
+
+# `func(*args)` doit être picklable (fonction de module) pour un pool de processus
+Source = namedtuple('Source', ['func', 'args', 'timeout', 'required'], defaults=((), None, True))
+
+
+class PartialLoadError(Exception):
+    """Au moins une source obligatoire n'a pas pu être chargée."""
+
+    def __init__(self, failed, results, report):
+        errors = '; '.join(f"{name} : {report[name]['error']}" for name in failed)
+        super().__init__(f"Sources en échec : {errors}")
+        self.failed = failed
+        self.results = results
+        self.report = report
+
+
+def _executor(kind, workers):
+    if kind == 'process':
+        return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(LOAD_START_METHOD))
+    return ThreadPoolExecutor(workers, thread_name_prefix='loader')
+
+
+def load_parallel(sources, kind='thread', max_workers=None, timeout=LOAD_TIMEOUT):
+    """Charge les sources (nom -> Source) en parallèle ; retourne (résultats, rapport).
+
+    `kind` : 'thread' (un thread par source par défaut) ou 'process' (au plus
+    LOAD_WORKERS processus). Avec un seul worker, les sources sont chargées
+    directement l'une après l'autre, sans pool ni délai.
+    """
+    results, report = {}, {}
+    started = time.perf_counter()
+    if max_workers is None:
+        max_workers = LOAD_WORKERS if kind == 'process' else len(sources)
+    workers = max(1, min(max_workers, len(sources)))
+
+    if workers == 1:
+        for name, source in sources.items():
+            start = time.perf_counter()
+            try:
+                results[name] = source.func(*source.args)
+                report[name] = {'status': 'ok', 'seconds': round(time.perf_counter() - start, 3)}
+            except Exception as e:
+                report[name] = {'status': 'error', 'seconds': round(time.perf_counter() - start, 3),
+                                'error': f"{type(e).__name__}: {e}"}
+    else:
+        executor = _executor(kind, workers)
+        try:
+            futures = {name: executor.submit(source.func, *source.args) for name, source in sources.items()}
+            finished = {}
+            for name, future in futures.items():
+                future.add_done_callback(lambda _, name=name: finished.setdefault(name, time.perf_counter()))
+            for name, future in futures.items():
+                limit = sources[name].timeout or timeout
+                remaining = max(0.0, started + limit - time.perf_counter())
+                try:
+                    results[name] = future.result(timeout=remaining)
+                    report[name] = {'status': 'ok'}
+                except FutureTimeout:
+                    future.cancel()
+                    report[name] = {'status': 'timeout', 'error': f"plus de {limit:g} s"}
+                except Exception as e:
+                    report[name] = {'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+                # Durée depuis le lancement commun (les sources tournent en même temps)
+                report[name]['seconds'] = round(finished.get(name, time.perf_counter()) - started, 3)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    failed = [name for name, source in sources.items()
+              if source.required and report[name]['status'] != 'ok']
+    if failed:
+        raise PartialLoadError(failed, results, report)
+    return results, report
+
+
+def failures(report):
+    """Sources en échec d'un rapport : nom -> message."""
+    return {name: entry.get('error', entry['status']) for name, entry in report.items()
+            if entry['status'] != 'ok'}
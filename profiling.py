@@ -0,0 +1,264 @@
+"""Mesures de temps et de mémoire des étapes d'une exécution du tableau de bord.
+
+Activé par DASHBOARD_PROFILING=1. Désactivé, `stage` renvoie un contexte vide
+partagé et `timed` / `cache_stats` rendent la fonction d'origine : le coût
+est nul sur le chemin des requêtes.
+
+Activé, chaque étape (chargement, prétraitement, filtres, agrégations,
+construction et envoi des figures) cumule son nombre d'appels, sa durée
+totale / maximale et la variation de mémoire du processus ; chaque
+ré-exécution est chronométrée par page et les fonctions `st.cache_data`
+comptent leurs appels et leurs calculs (les appels restants sont des hits).
+La page de diagnostic (`?diagnostics=1`) affiche ces compteurs et les exporte
+en JSON ou au format texte Prometheus.
+"""
+import functools
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+import pandas as pd
+import streamlit as st
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+PROFILING = os.environ.get('DASHBOARD_PROFILING', '').lower() in ('1', 'true', 'yes', 'on')
+METRIC_PREFIX = 'dashboard'
+
+_NO_STAGE = nullcontext()
+
+
+def process_memory():
+    """Mémoire résidente du processus (octets), None si elle n'est pas mesurable."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Profiler:
+    """Compteurs cumulés par étape, par page et par cache, partagés par les sessions."""
+
+    def __init__(self, enabled=PROFILING):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self._stages = {}
+            self._pages = {}
+            self._caches = {}
+
+    @staticmethod
+    def _add(table, name, seconds, memory=None):
+        entry = table.get(name)
+        if entry is None:
+            entry = table[name] = {'count': 0, 'total_s': 0.0, 'max_s': 0.0, 'last_s': 0.0, 'memory_mb': 0.0}
+        entry['count'] += 1
+        entry['total_s'] += seconds
+        entry['max_s'] = max(entry['max_s'], seconds)
+        entry['last_s'] = seconds
+        if memory is not None:
+            entry['memory_mb'] += memory / 2**20
+
+    @contextmanager
+    def _measure(self, name):
+        memory = process_memory()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            after = process_memory()
+            delta = after - memory if memory is not None and after is not None else None
+            with self._lock:
+                self._add(self._stages, name, seconds, delta)
+
+    def stage(self, name):
+        """Contexte qui chronomètre l'étape `name` (vide si le profilage est désactivé)."""
+        return self._measure(name) if self.enabled else _NO_STAGE
+
+    def timed(self, name=None):
+        """Décorateur : chronomètre chaque appel de la fonction comme une étape."""
+        def decorate(func):
+            if not self.enabled:
+                return func
+            stage_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self._measure(stage_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def cache_stats(self, cache):
+        """Applique le décorateur de cache `cache` en comptant appels et calculs.
+
+        `@profiler.cache_stats(st.cache_data(ttl=60))` remplace
+        `@st.cache_data(ttl=60)` ; seuls les appels manqués exécutent la
+        fonction d'origine.
+        """
+        def decorate(func):
+            if not self.enabled:
+                return cache(func)
+            name = func.__name__
+
+            @functools.wraps(func)
+            def compute(*args, **kwargs):
+                self._count(name, 'misses')
+                return func(*args, **kwargs)
+            cached = cache(compute)
+
+            @functools.wraps(func)
+            def call(*args, **kwargs):
+                self._count(name, 'calls')
+                with self._measure(name):
+                    return cached(*args, **kwargs)
+            call.clear = cached.clear
+            return call
+        return decorate
+
+    def _count(self, name, event):
+        with self._lock:
+            counters = self._caches.setdefault(name, {'calls': 0, 'misses': 0})
+            counters[event] += 1
+
+    def start_rerun(self):
+        """Début d'une exécution du script (None si le profilage est désactivé)."""
+        return time.perf_counter() if self.enabled else None
+
+    def end_rerun(self, started, page):
+        """Fin d'une exécution de la page `page` commencée à `started`."""
+        if started is None:
+            return
+        seconds = time.perf_counter() - started
+        with self._lock:
+            self._add(self._pages, page, seconds)
+
+    def report(self):
+        """Compteurs courants (dict sérialisable en JSON)."""
+        with self._lock:
+            caches = {
+                name: dict(counters, hits=counters['calls'] - counters['misses'],
+                           hit_rate=round(1 - counters['misses'] / counters['calls'], 3) if counters['calls'] else None)
+                for name, counters in self._caches.items()
+            }
+            memory = process_memory()
+            return {
+                'enabled': self.enabled,
+                'uptime_s': round(time.time() - self.started_at, 1),
+                'memory_mb': round(memory / 2**20, 1) if memory is not None else None,
+                'stages': {name: dict(entry) for name, entry in self._stages.items()},
+                'pages': {name: dict(entry) for name, entry in self._pages.items()},
+                'caches': caches,
+            }
+
+    def prometheus(self, extra=None):
+        """Compteurs au format texte d'exposition Prometheus."""
+        report = self.report()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                lines.append(f"{METRIC_PREFIX}_{name}{{{label_text}}} {value}" if label_text
+                             else f"{METRIC_PREFIX}_{name} {value}")
+
+        if report['memory_mb'] is not None:
+            metric('memory_bytes', 'gauge', "Mémoire résidente du processus",
+                   [({}, int(report['memory_mb'] * 2**20))])
+        for table, label in (('stages', 'stage'), ('pages', 'page')):
+            entries = report[table].items()
+            metric(f'{label}_calls_total', 'counter', f"Nombre d'exécutions par {label}",
+                   [({label: name}, entry['count']) for name, entry in entries])
+            metric(f'{label}_seconds_total', 'counter', f"Durée cumulée par {label}",
+                   [({label: name}, round(entry['total_s'], 6)) for name, entry in entries])
+            metric(f'{label}_seconds_max', 'gauge', f"Durée maximale par {label}",
+                   [({label: name}, round(entry['max_s'], 6)) for name, entry in entries])
+        metric('cache_calls_total', 'counter', "Appels des fonctions en cache",
+               [({'cache': name}, c['calls']) for name, c in report['caches'].items()])
+        metric('cache_misses_total', 'counter', "Appels calculés (absents du cache)",
+               [({'cache': name}, c['misses']) for name, c in report['caches'].items()])
+        for group, values in (extra or {}).items():
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    metric(_metric_name(f'{group}_{key}'), 'gauge', f"{group} {key}", [({}, value)])
+        return '\n'.join(lines) + '\n'
+
+
+def _metric_name(name):
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+profiler = Profiler()
+stage = profiler.stage
+timed = profiler.timed
+cache_stats = profiler.cache_stats
+
+
+def show_diagnostics():
+    """Vrai si la page de diagnostic est demandée (`?diagnostics=1`) et le profilage actif."""
+    return profiler.enabled and st.query_params.get('diagnostics') not in (None, '', '0')
+
+
+def _table(entries, label):
+    if not entries:
+        return pd.DataFrame()
+    df = pd.DataFrame.from_dict(entries, orient='index').rename_axis(label).reset_index()
+    if 'total_s' in df.columns:
+        df['mean_s'] = df['total_s'] / df['count']
+        df = df.sort_values('total_s', ascending=False)
+    return df
+
+
+def diagnostics_page(extra=None):
+    """Page de diagnostic : étapes, pages, caches et exports JSON / Prometheus.
+
+    `extra` ajoute des groupes de compteurs (cache des figures, pool SQL...).
+    """
+    extra = extra or {}
+    report = profiler.report()
+    st.header("Diagnostic")
+    col1, col2 = st.columns(2)
+    col1.metric("Mémoire du processus", f"{report['memory_mb']} Mo" if report['memory_mb'] is not None else "n/d")
+    col2.metric("Mesures depuis", f"{report['uptime_s']:.0f} s")
+
+    st.subheader("Étapes")
+    st.dataframe(_table(report['stages'], 'Étape'), hide_index=True)
+    st.subheader("Exécutions par page")
+    st.dataframe(_table(report['pages'], 'Page'), hide_index=True)
+    st.subheader("Caches st.cache_data")
+    st.dataframe(_table(report['caches'], 'Fonction'), hide_index=True)
+    for group, values in extra.items():
+        st.subheader(group)
+        st.json(values)
+
+    export = dict(report, **extra)
+    col1, col2, col3 = st.columns(3)
+    col1.download_button("Export JSON", json.dumps(export, indent=2, default=str),
+                         file_name='diagnostics.json', mime='application/json')
+    col2.download_button("Export Prometheus", profiler.prometheus(extra),
+                         file_name='metrics.prom', mime='text/plain')
+    if col3.button("Remettre à zéro"):
+        profiler.reset()
+        st.rerun()
+    with st.expander("Format Prometheus"):
+        st.code(profiler.prometheus(extra), language='text')
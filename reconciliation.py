@@ -0,0 +1,175 @@
+"""Rapprochement des ventes (Sales) et des encaissements (Recolt).
+
+`Recolt.ORDER_REFERENCE` référence `Sales.ORDER_REFERENCE`, mais les deux
+tables étaient analysées séparément et le rapprochement se faisait à la
+main (RECHERCHEV dans Excel). `Reconciliation` construit une table de
+hachage des références de vente (`pd.Index`, références uniques) et y
+cherche toutes les références d'encaissement en un seul passage vectorisé
+(`get_indexer`). Pour chaque vente sont tenus le montant encaissé, le
+nombre d'encaissements et la date du premier encaissement.
+
+Le rapport distingue :
+- les ventes payées (au moins un encaissement) et impayées ;
+- les encaissements rapprochés et orphelins (référence inconnue des ventes) ;
+- le délai vente -> encaissement (jours), par Hyp (vendeur) ou par banque.
+
+`apply_delta` ajoute de nouvelles ventes et de nouveaux encaissements : seuls
+les nouveaux encaissements et les orphelins déjà connus (qui peuvent
+correspondre aux nouvelles ventes) sont recherchés. Une référence de vente
+déjà connue est ignorée (comptée dans `duplicate_references`).
+"""
+import numpy as np
+import pandas as pd
+
+# Date « pas encore encaissé » du premier encaissement (en nanosecondes)
+NOT_COLLECTED = np.iinfo('int64').max
+# Référence numérique écrite avec une décimale nulle ('123.0')
+WHOLE_NUMBER = r'^(\d+)\.0+$'
+
+
+def _references(series):
+    """Références comparables des deux côtés (texte, sans espaces autour).
+
+    Une colonne numérique avec une valeur manquante est lue en float : ses
+    références entières sont remises en entiers (123.0 -> '123'), comme
+    celles d'une colonne texte ou mixte qui s'écrivent '123.0'.
+    """
+    if pd.api.types.is_float_dtype(series):
+        values = series.dropna()
+        if (values == np.floor(values)).all():
+            return series.astype('Int64').astype('string')
+    return series.astype('string').str.strip().str.replace(WHOLE_NUMBER, r'\1', regex=True)
+
+
+class Reconciliation:
+    """Ventes et encaissements rapprochés par référence de commande."""
+
+    def __init__(self, sales, collections, sale_amount='Montant', collected_amount='TRANSACTION',
+                 key='ORDER_REFERENCE', date_column='ORDER_DATE', bank_column='Banques'):
+        self.sale_amount = sale_amount
+        self.collected_amount = collected_amount
+        self.key = key
+        self.date_column = date_column
+        self.bank_column = bank_column
+        self.refs = pd.Index([], dtype='string')
+        self.sales = pd.DataFrame(columns=[key, 'Hyp', date_column, sale_amount])
+        self.matched = pd.DataFrame()
+        self.orphans = pd.DataFrame()
+        self.duplicate_references = 0
+        self.version = 0
+        self._collected = np.zeros(0)
+        self._count = np.zeros(0, dtype='int64')
+        self._first = np.zeros(0, dtype='int64')
+        self.apply_delta(sales, collections)
+
+    def _collection_columns(self, df):
+        columns = [c for c in (self.key, self.bank_column, self.date_column, self.collected_amount)
+                   if c in df.columns]
+        return df[columns]
+
+    def apply_delta(self, sales=None, collections=None):
+        """Ajoute des ventes et / ou des encaissements et les rapproche."""
+        pending = []
+        if sales is not None and not sales.empty:
+            new = sales[[self.key, 'Hyp', self.date_column, self.sale_amount]].dropna(subset=[self.key])
+            new = new.assign(**{self.key: _references(new[self.key])})
+            known = (self.refs.get_indexer(new[self.key]) >= 0) | new[self.key].duplicated().to_numpy()
+            self.duplicate_references += int(known.sum())
+            new = new[~known]
+            if len(new):
+                self.refs = self.refs.append(pd.Index(new[self.key]))
+                self.sales = pd.concat([self.sales, new], ignore_index=True) if len(self.sales) else new.reset_index(drop=True)
+                self._collected = np.concatenate([self._collected, np.zeros(len(new))])
+                self._count = np.concatenate([self._count, np.zeros(len(new), dtype='int64')])
+                self._first = np.concatenate([self._first, np.full(len(new), NOT_COLLECTED)])
+                # Les orphelins peuvent désormais correspondre à une vente
+                if len(self.orphans):
+                    pending.append(self.orphans)
+                    self.orphans = self.orphans.iloc[:0]
+        if collections is not None and not collections.empty:
+            new = self._collection_columns(collections).dropna(subset=[self.key])
+            pending.append(new.assign(**{self.key: _references(new[self.key])}))
+        if pending:
+            self._match(pd.concat(pending, ignore_index=True))
+        self.version += 1
+
+    def _match(self, collections):
+        # Jointure par hachage : position de la vente de chaque encaissement (-1 : inconnue)
+        positions = self.refs.get_indexer(collections[self.key])
+        hit = positions >= 0
+        orphans = collections[~hit]
+        self.orphans = pd.concat([self.orphans, orphans], ignore_index=True) if len(self.orphans) else orphans.reset_index(drop=True)
+        if not hit.any():
+            return
+
+        matched = collections[hit].reset_index(drop=True)
+        sale = positions[hit]
+        amounts = pd.to_numeric(matched[self.collected_amount], errors='coerce').fillna(0).to_numpy(dtype='float64')
+        collected_at = pd.to_datetime(matched[self.date_column], errors='coerce')
+        sold_at = pd.to_datetime(self.sales[self.date_column].iloc[sale], errors='coerce').to_numpy()
+        np.add.at(self._collected, sale, amounts)
+        np.add.at(self._count, sale, 1)
+        dated = collected_at.notna().to_numpy()
+        np.minimum.at(self._first, sale[dated], collected_at.to_numpy(dtype='datetime64[ns]')[dated].view('int64'))
+
+        matched['sale'] = sale
+        matched['Hyp'] = self.sales['Hyp'].to_numpy()[sale]
+        matched['lag_days'] = (collected_at.to_numpy() - sold_at) / np.timedelta64(1, 'D')
+        self.matched = pd.concat([self.matched, matched], ignore_index=True) if len(self.matched) else matched
+
+    # Rapports
+
+    def summary(self):
+        """Comptes et montants : ventes payées / impayées, encaissements rapprochés / orphelins."""
+        amounts = pd.to_numeric(self.sales[self.sale_amount], errors='coerce').fillna(0).to_numpy(dtype='float64')
+        unpaid = self._count == 0
+        orphan_amounts = (pd.to_numeric(self.orphans[self.collected_amount], errors='coerce').sum()
+                          if len(self.orphans) else 0.0)
+        lags = self.matched['lag_days'] if len(self.matched) else pd.Series(dtype='float64')
+        return {
+            'sales': len(self.sales),
+            'paid_sales': int((~unpaid).sum()),
+            'unpaid_sales': int(unpaid.sum()),
+            'unpaid_amount': float(amounts[unpaid].sum()),
+            'matched_collections': len(self.matched),
+            'collected_amount': float(self._collected.sum()),
+            'outstanding_amount': float(np.clip(amounts - self._collected, 0, None).sum()),
+            'orphan_collections': len(self.orphans),
+            'orphan_amount': float(orphan_amounts),
+            'median_lag_days': float(lags.median()) if lags.notna().any() else None,
+            'duplicate_references': self.duplicate_references,
+        }
+
+    def sales_status(self):
+        """Ventes avec montant encaissé, nombre d'encaissements, premier encaissement et reste dû."""
+        first = np.where(self._first == NOT_COLLECTED, np.iinfo('int64').min, self._first)
+        status = self.sales.copy()
+        status['collected'] = self._collected
+        status['collections'] = self._count
+        status['first_collection'] = pd.to_datetime(first.view('datetime64[ns]'))
+        status['outstanding'] = np.clip(
+            pd.to_numeric(status[self.sale_amount], errors='coerce').fillna(0).to_numpy() - self._collected, 0, None)
+        return status
+
+    def unpaid(self):
+        """Ventes sans aucun encaissement."""
+        return self.sales[self._count == 0].reset_index(drop=True)
+
+    def lag(self, by):
+        """Délai vente -> encaissement (jours) par `by` ('Hyp' du vendeur, ou la banque).
+
+        Une ligne par valeur : encaissements, montant encaissé, délai moyen,
+        médian et maximal.
+        """
+        columns = [by, 'collections', 'collected', 'lag_mean', 'lag_median', 'lag_max']
+        if not len(self.matched) or by not in self.matched.columns:
+            return pd.DataFrame(columns=columns)
+        grouped = self.matched.groupby(by, observed=True)
+        result = pd.DataFrame({
+            'collections': grouped.size(),
+            'collected': grouped[self.collected_amount].sum(),
+            'lag_mean': grouped['lag_days'].mean(),
+            'lag_median': grouped['lag_days'].median(),
+            'lag_max': grouped['lag_days'].max(),
+        }).reset_index()
+        return result.sort_values('lag_mean', ascending=False, ignore_index=True)
@@ -0,0 +1,345 @@
+"""Calculs du tableau de bord, indépendants de Streamlit.
+
+Les pages mélangeaient lecture des filtres, agrégations et affichage : les
+KPI, répartitions et séries ne pouvaient être ni testés, ni mesurés, ni
+réutilisés hors d'une exécution Streamlit. `SalesAnalytics` regroupe ces
+calculs sur un jeu de tables figé (un snapshot) : index de filtrage et cubes
+journaliers construits une fois, résultats mémorisés par jeu de filtres.
+Les tendances (sommes glissantes, semaines / mois, variations d'une période
+à l'autre par Hyp, City ou Team) viennent des cumuls de `TrendIndex`, le
+classement des agents des cellules jour x Hyp de `Leaderboard`, le
+rapprochement Sales / Recolt de `Reconciliation`.
+`SqlSalesAnalytics` fournit les mêmes méthodes calculées par la base.
+
+Les deux consoles, le benchmark et les scripts hors ligne appellent ces
+classes ; seules les pages Streamlit font l'affichage. Les DataFrames
+renvoyés sont partagés (mémorisés) et ne doivent pas être modifiés.
+"""
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+import pandas as pd
+
+from daily_cube import DailyCube
+from filter_engine import FilterIndex, staff_hyps
+from leaderboard import Leaderboard, staff_index
+from reconciliation import Reconciliation
+from sql_queries import (SalesFilters, agent_summary, filter_options, run_group_by, run_kpis,
+                         summarize_agent_sales)
+from trend_index import TrendIndex
+
+# Feuilles du classeur source et colonnes utilisées
+SOURCE_SHEETS = {
+    'Sales': ['Hyp', 'ORDER_REFERENCE', 'ORDER_DATE', 'SHORT_MESSAGE', 'Country', 'City', 'Montant', 'Rating'],
+    'Recolt': ['Hyp', 'Banques', 'TRANSACTION', 'ORDER_REFERENCE', 'ORDER_DATE', 'SHORT_MESSAGE', 'City', 'Country'],
+    'Effectif': ['ID', 'Hyp', 'ID_AGTSDA', 'UserName', 'NOM', 'PRENOM', 'Team', 'Type', 'Activité', 'Departement', 'Date_In'],
+}
+# Types appliqués pendant la lecture du classeur
+SOURCE_DTYPES = {
+    'Sales': {'ORDER_DATE': 'datetime', 'Montant': 'float', 'Rating': 'float'},
+    'Recolt': {'ORDER_DATE': 'datetime', 'TRANSACTION': 'float'},
+    'Effectif': {'Date_In': 'datetime'},
+}
+
+# Tables du classeur : table -> (colonne de montants, dimensions du cube journalier)
+WORKBOOK_TABLES = {
+    'Sales': ('Montant', ('Country', 'City', 'Hyp')),
+    'Recolt': ('TRANSACTION', ('Country', 'City', 'Hyp', 'Banques')),
+}
+
+# Filtres -> colonne du personnel
+STAFF_FILTERS = {'team': 'Team', 'department': 'Departement', 'activity': 'Activité'}
+
+# Nombre de séries affichées par le panneau de tendances
+TREND_TOP = int(os.environ.get('TREND_TOP', 10))
+
+# Nombre de résultats mémorisés par instance (KPI, répartitions, séries)
+ANALYTICS_MEMO_ENTRIES = int(os.environ.get('ANALYTICS_MEMO_ENTRIES', 512))
+
+Filters = namedtuple('Filters', ['start_date', 'end_date', 'country', 'team', 'department', 'activity'],
+                     defaults=(None,) * 6)
+
+
+def preprocess_data(df):
+    """Prétraitement des données."""
+    if 'ORDER_DATE' in df.columns:
+        df['ORDER_DATE'] = pd.to_datetime(df['ORDER_DATE'], errors='coerce')
+    if 'Montant' in df.columns:
+        df['Montant'] = pd.to_numeric(df['Montant'], errors='coerce').fillna(0)
+    if 'TRANSACTION' in df.columns:
+        df['TRANSACTION'] = pd.to_numeric(df['TRANSACTION'], errors='coerce').fillna(0)
+    if 'Date_In' in df.columns:
+        df['Date_In'] = pd.to_datetime(df['Date_In'], errors='coerce')
+    return df
+
+
+class SalesAnalytics:
+    """KPI, répartitions et séries temporelles d'un jeu de tables figé.
+
+    `tables` : table -> (colonne de montants, dimensions du cube) ;
+    `cubes` / `trends` / `leaderboards` : cubes, séries (table, by) ->
+    TrendIndex et classements déjà construits (par exemple tenus à jour par
+    la synchronisation SQL), utilisés à la place de nouvelles structures.
+    """
+
+    def __init__(self, frames, tables=WORKBOOK_TABLES, staff_table='Effectif',
+                 staff_columns=('Team', 'Departement', 'Activité'), cubes=None, trends=None,
+                 leaderboards=None, memo_entries=ANALYTICS_MEMO_ENTRIES):
+        self.frames = frames
+        self.tables = tables
+        self.staff = frames.get(staff_table, pd.DataFrame())
+        self.staff_columns = tuple(c for c in staff_columns if c in self.staff.columns)
+        self.memo_entries = memo_entries
+        self._cubes = dict(cubes or {})
+        self._trends = dict(trends or {})
+        self._leaderboards = dict(leaderboards or {})
+        self._staff_index = None
+        self._reconciliation = None
+        self._indexes = {}
+        self._memo = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    # Structures construites une fois
+
+    def index(self, table='Sales'):
+        """Index de filtrage (dates triées, bitmaps par valeur) de `table`."""
+        with self._lock:
+            if table not in self._indexes:
+                self._indexes[table] = FilterIndex(self.frames[table], self.staff, staff_columns=self.staff_columns)
+            return self._indexes[table]
+
+    def cube(self, table='Sales'):
+        """Cube jour x dimensions (somme / nombre) de `table`."""
+        with self._lock:
+            if table not in self._cubes:
+                value_column, dims = self.tables[table]
+                self._cubes[table] = DailyCube(self.frames[table], value_column, dims)
+            return self._cubes[table]
+
+    def trends(self, by, table='Sales'):
+        """Séries journalières cumulées de `table` par `by`.
+
+        Une colonne du personnel (Team...) est obtenue en regroupant la série
+        par Hyp, sans relire les transactions.
+        """
+        with self._lock:
+            key = (table, by)
+            if key not in self._trends:
+                value_column = self.tables[table][0]
+                df = self.frames[table]
+                if by not in df.columns and by in self.staff.columns:
+                    mapping = self.staff.drop_duplicates('Hyp').set_index('Hyp')[by]
+                    self._trends[key] = self.trends('Hyp', table).grouped(mapping, by)
+                else:
+                    self._trends[key] = TrendIndex(df, value_column, by)
+            return self._trends[key]
+
+    def leaderboard(self, table='Sales'):
+        """Mesures par jour et par Hyp (montant, ventes, notes) de `table`."""
+        with self._lock:
+            if table not in self._leaderboards:
+                self._leaderboards[table] = Leaderboard(self.frames[table], self.tables[table][0])
+            return self._leaderboards[table]
+
+    def staff_index(self):
+        """Personnel indexé par Hyp (NOM, PRENOM, Team), pour compléter le classement."""
+        with self._lock:
+            if self._staff_index is None:
+                self._staff_index = staff_index(self.staff)
+            return self._staff_index
+
+    def reconciliation(self, sales_table='Sales', collections_table='Recolt'):
+        """Ventes et encaissements rapprochés par ORDER_REFERENCE (None sans table d'encaissements)."""
+        with self._lock:
+            if self._reconciliation is None and collections_table in self.frames:
+                self._reconciliation = Reconciliation(
+                    self.frames[sales_table], self.frames[collections_table],
+                    sale_amount=self.tables[sales_table][0], collected_amount=self.tables[collections_table][0])
+            return self._reconciliation
+
+    def warm(self):
+        """Construit index et cubes des tables non vides (avant publication du snapshot)."""
+        for table in self.tables:
+            if not self.frames[table].empty:
+                self.index(table)
+                self.cube(table)
+
+    # Résultats mémorisés
+
+    def _memoized(self, key, compute):
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                self.hits += 1
+                return self._memo[key]
+            self.misses += 1
+        result = compute()
+        if self.memo_entries > 0:
+            with self._lock:
+                self._memo[key] = result
+                while len(self._memo) > self.memo_entries:
+                    self._memo.popitem(last=False)
+        return result
+
+    def stats(self):
+        """Compteurs des résultats mémorisés."""
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'entries': len(self._memo),
+                'max_entries': self.memo_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / requests, 3) if requests else None,
+            }
+
+    def _staff_filters(self, filters):
+        return {STAFF_FILTERS[name]: getattr(filters, name) for name in STAFF_FILTERS
+                if STAFF_FILTERS[name] in self.staff_columns}
+
+    def hyps(self, filters):
+        """Hyp retenus par les filtres du personnel (None : pas de filtrage par Hyp)."""
+        if self.staff.empty:
+            return None
+        return staff_hyps(self.staff, **self._staff_filters(filters))
+
+    def _cells(self, table, filters):
+        return self.cube(table).select(filters.start_date, filters.end_date, filters.country, self.hyps(filters))
+
+    def filter_options(self, table='Sales'):
+        """Valeurs des listes déroulantes et bornes de la période de `table`."""
+        def compute():
+            df = self.frames[table]
+            options = {'countries': sorted(df['Country'].dropna().unique()) if 'Country' in df.columns else []}
+            for name, column in (('teams', 'Team'), ('departments', 'Departement'), ('activities', 'Activité')):
+                options[name] = sorted(self.staff[column].dropna().unique()) if column in self.staff.columns else []
+            dates = df['ORDER_DATE'] if not df.empty else None
+            options['min_date'] = dates.min() if dates is not None else None
+            options['max_date'] = dates.max() if dates is not None else None
+            return options
+        return self._memoized(('filter_options', table), compute)
+
+    def positions(self, filters, table='Sales'):
+        """Positions des lignes de `table` retenues par les filtres (Hyp comme clé)."""
+        return self.index(table).positions(
+            country=filters.country,
+            start_date=filters.start_date,
+            end_date=filters.end_date,
+            **self._staff_filters(filters)
+        )
+
+    def kpis(self, filters, table='Sales'):
+        """(somme, nombre de transactions, moyenne) de `table` pour les filtres."""
+        return self._memoized(('kpis', table, filters),
+                              lambda: DailyCube.totals(self._cells(table, filters)))
+
+    def breakdown(self, by, filters, table='Sales'):
+        """Somme des montants par `by` : une dimension du cube, ou Team (via Hyp -> personnel)."""
+        def compute():
+            cube = self.cube(table)
+            cells = self._cells(table, filters)
+            if by in cube.dims:
+                return cube.rollup(cells, by)
+            if by not in self.staff.columns or 'Hyp' not in cube.dims:
+                return pd.DataFrame(columns=[by, cube.value_column])
+            # Une ligne du personnel par Hyp : la feuille Effectifs du classeur n'a pas de clé,
+            # un Hyp en double n'y compte pas ses ventes deux fois
+            staff = self.staff[['Hyp', by]].drop_duplicates('Hyp')
+            with_staff = cube.rollup(cells, 'Hyp').merge(staff, on='Hyp', how='left')
+            return with_staff.groupby(by, observed=True)[cube.value_column].sum().reset_index()
+        return self._memoized(('breakdown', table, by, filters), compute)
+
+    def time_series(self, filters, table='Sales', freq='D'):
+        """Série ORDER_DATE / montant au pas `freq` ('D', 'W', 'MS'...)."""
+        def compute():
+            cube = self.cube(table)
+            daily = self._cells(table, filters).groupby('day')['sum'].sum()
+            if freq != 'D' and not daily.empty:
+                daily = daily.resample(freq).sum()
+            return daily.rename_axis('ORDER_DATE').rename(cube.value_column).reset_index()
+        return self._memoized(('time_series', table, freq, filters), compute)
+
+    def trend_panel(self, by, window=7, freq='W', top=TREND_TOP, table='Sales'):
+        """Tendances par `by` : (sommes glissantes sur `window` jours des `top`
+        premiers, en lignes day / by / valeur ; variations entre les deux
+        dernières périodes `freq` complètes, pour toutes les valeurs de `by`).
+        """
+        def compute():
+            trend = self.trends(by, table)
+            rolling = trend.rolling(window, keys=trend.top_keys(top, window))
+            lines = (rolling.rename_axis(index='day', columns=by)
+                     .stack().rename(trend.value_column).reset_index())
+            return lines, trend.period_deltas(freq)
+        return self._memoized(('trend_panel', table, by, window, freq, top), compute)
+
+    def ranking(self, filters, by='total', top=20, min_count=1, table='Sales'):
+        """Les `top` premiers agents de la période selon `by` (voir `leaderboard.RANKINGS`).
+
+        Seuls la période et les filtres du personnel s'appliquent (pas le
+        pays). Retourne (classement, nombre d'agents classés).
+        """
+        def compute():
+            return self.leaderboard(table).top(top, filters.start_date, filters.end_date, by=by,
+                                               hyps=self.hyps(filters), min_count=min_count,
+                                               staff=self.staff_index())
+        return self._memoized(('ranking', table, by, top, min_count, filters), compute)
+
+    def reconciliation_report(self):
+        """Synthèse du rapprochement, délais par Hyp (avec NOM, PRENOM, Team) et par banque."""
+        def compute():
+            reconciliation = self.reconciliation()
+            by_hyp = reconciliation.lag('Hyp')
+            details = self.staff_index().reindex(by_hyp['Hyp'])
+            for position, column in enumerate(details.columns, start=1):
+                by_hyp.insert(position, column, details[column].to_numpy())
+            return reconciliation.summary(), by_hyp, reconciliation.lag(reconciliation.bank_column)
+        return self._memoized(('reconciliation',), compute)
+
+    def dashboard(self, filters, table='Sales'):
+        """KPI, ventes par ville et par équipe : les agrégats du tableau de bord."""
+        return self.kpis(filters, table), self.breakdown('City', filters, table), self.breakdown('Team', filters, table)
+
+    def agent_summary(self, hyp, table='Sales'):
+        """KPI et série journalière (ORDER_DATE / Total_sale) d'un seul Hyp."""
+        def compute():
+            value_column = self.tables[table][0]
+            rows = self.index(table).rows_for_hyp(hyp)
+            return summarize_agent_sales(rows[['ORDER_DATE', value_column]].rename(columns={value_column: 'Total_sale'}))
+        return self._memoized(('agent_summary', table, hyp), compute)
+
+
+class SqlSalesAnalytics:
+    """Mêmes calculs que `SalesAnalytics` sur la table Sales, faits par la base.
+
+    Le schéma SQL n'a pas de département : le filtre `department` est ignoré.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    @staticmethod
+    def _sql_filters(filters):
+        return SalesFilters(filters.start_date, filters.end_date, filters.country, filters.team, filters.activity)
+
+    def filter_options(self):
+        """Valeurs des listes déroulantes et bornes de la période, lues en base."""
+        return filter_options(self.conn)
+
+    def kpis(self, filters):
+        """(somme, nombre de transactions, moyenne) pour les filtres."""
+        return run_kpis(self.conn, self._sql_filters(filters))
+
+    def breakdown(self, by, filters):
+        """Somme des ventes par `by` (voir `sql_queries.GROUP_COLUMNS`)."""
+        return run_group_by(self.conn, by, self._sql_filters(filters))
+
+    def dashboard(self, filters):
+        """KPI, ventes par ville et par équipe : les agrégats du tableau de bord."""
+        return self.kpis(filters), self.breakdown('City', filters), self.breakdown('Team', filters)
+
+    def agent_summary(self, hyp):
+        """KPI et série journalière d'un Hyp, lus par une requête indexée sur ce seul Hyp."""
+        return agent_summary(self.conn, hyp)
@@ -0,0 +1,195 @@
+"""Cache de snapshots colonnaires (Parquet) pour le classeur Sources.xlsm.
+
+Chaque feuille demandée est convertie une seule fois en fichier Parquet typé,
+identifié par l'empreinte (mtime, taille, sha256) du classeur. Les démarrages
+suivants relisent ces fichiers en mémoire mappée au lieu de re-parser le XML.
+Les feuilles manquantes d'un petit classeur sont lues ensemble, en une seule
+passe sur le zip (voir `xlsx_reader`) ; au-delà de PARALLEL_MIN_BYTES, chaque
+feuille est analysée dans son propre processus, qui écrit directement son
+fichier Parquet.
+"""
+import hashlib
+import json
+import os
+import threading
+
+import pandas as pd
+
+from parallel_loader import LOAD_WORKERS, Source, load_parallel
+from xlsx_reader import read_sheets
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow est optionnel : sans lui on relit l'Excel à chaque fois
+    pa = None
+    pq = None
+
+SNAPSHOT_DIR = '.snapshots'
+MANIFEST_NAME = 'manifest.json'
+# Taille du classeur à partir de laquelle les feuilles sont analysées en parallèle
+PARALLEL_MIN_BYTES = int(os.environ.get('PARALLEL_MIN_BYTES', 8 * 2**20))
+
+# Plusieurs chargements du même répertoire peuvent tourner en même temps (threads)
+_MANIFEST_LOCK = threading.Lock()
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """Empreinte sha256 du contenu d'un fichier."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _manifest_path(snapshot_dir):
+    return os.path.join(snapshot_dir, MANIFEST_NAME)
+
+
+def _read_manifest(snapshot_dir):
+    try:
+        with open(_manifest_path(snapshot_dir), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_atomic(path, write):
+    """Écrit via un fichier temporaire puis le renomme (jamais de fichier à moitié écrit)."""
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _write_manifest(snapshot_dir, manifest):
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+    _write_atomic(_manifest_path(snapshot_dir), write)
+
+
+def _to_arrow(df):
+    """Conversion en table Arrow ; les colonnes objet hétérogènes passent en texte."""
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        df = df.copy()
+        for col in df.columns[df.dtypes == object]:
+            df[col] = df[col].map(lambda v: v if pd.isna(v) else str(v))
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _spec_key(sheet_name, usecols, dtypes):
+    """Clé d'une feuille + projection + types (plusieurs vues d'une même feuille coexistent)."""
+    spec = json.dumps([sheet_name, usecols, dtypes], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(spec.encode('utf-8')).hexdigest()[:12]
+
+
+def _snapshot_file(snapshot_dir, sheet_name, spec, digest):
+    return os.path.join(snapshot_dir, f"{sheet_name}-{spec}-{digest[:16]}.parquet")
+
+
+def _missing_specs(manifest, specs, snapshot_dir):
+    known = manifest.get('sheets', {})
+    return [
+        name for name, spec in specs.items()
+        if spec not in known or not os.path.exists(os.path.join(snapshot_dir, known[spec]['file']))
+    ]
+
+
+def _read_sheets(manifest, specs, snapshot_dir):
+    frames = {}
+    for name, spec in specs.items():
+        path = os.path.join(snapshot_dir, manifest['sheets'][spec]['file'])
+        frames[name] = pq.read_table(path, memory_map=True).to_pandas()
+    return frames
+
+
+def _build_snapshot(excel_file, name, usecols, dtypes, path):
+    """Analyse une feuille et écrit son fichier Parquet (éventuellement dans un processus du pool)."""
+    df = read_sheets(excel_file, {name: usecols}, {name: dtypes or {}})[name]
+    table = _to_arrow(df)
+    _write_atomic(path, lambda tmp_path: pq.write_table(table, tmp_path))
+    return len(df)
+
+
+def _remove_stale(snapshot_dir, keep, digest):
+    # Les fichiers de la version courante du classeur sont gardés : un autre
+    # chargement peut les avoir écrits sans encore les inscrire au manifeste
+    current = f"-{digest[:16]}.parquet"
+    for entry in os.listdir(snapshot_dir):
+        if entry.endswith('.parquet') and entry not in keep and not entry.endswith(current):
+            try:
+                os.remove(os.path.join(snapshot_dir, entry))
+            except OSError:
+                pass
+
+
+def load_snapshot(excel_file, sheets, dtypes=None, snapshot_dir=SNAPSHOT_DIR):
+    """Charge les feuilles demandées depuis le snapshot Parquet, en le reconstruisant si besoin.
+
+    `sheets` associe chaque nom de feuille à ses colonnes (`usecols`) et
+    `dtypes` aux types imposés, comme pour `xlsx_reader.read_sheets`. Le
+    snapshot est reconstruit uniquement si le contenu du classeur a changé (un
+    simple `touch` ne déclenche qu'une mise à jour du manifeste).
+    """
+    dtypes = dtypes or {}
+    if pq is None:
+        return read_sheets(excel_file, sheets, dtypes)
+
+    specs = {name: _spec_key(name, usecols, dtypes.get(name)) for name, usecols in sheets.items()}
+    os.makedirs(snapshot_dir, exist_ok=True)
+    stat = os.stat(excel_file)
+    manifest = _read_manifest(snapshot_dir)
+
+    fresh = manifest.get('mtime_ns') == stat.st_mtime_ns and manifest.get('size') == stat.st_size
+    if not fresh:
+        digest = file_hash(excel_file)
+        if manifest.get('sha256') == digest:
+            # Fichier modifié sur le disque mais contenu identique
+            manifest.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        else:
+            manifest = {
+                'source': os.path.basename(excel_file),
+                'mtime_ns': stat.st_mtime_ns,
+                'size': stat.st_size,
+                'sha256': digest,
+                'sheets': {},
+            }
+
+    missing = _missing_specs(manifest, specs, snapshot_dir)
+    if missing:
+        paths = {name: _snapshot_file(snapshot_dir, name, specs[name], manifest['sha256']) for name in missing}
+        if len(missing) > 1 and LOAD_WORKERS > 1 and stat.st_size >= PARALLEL_MIN_BYTES:
+            # Une feuille par processus : l'analyse XML est limitée par le CPU
+            load_parallel({
+                name: Source(_build_snapshot, (excel_file, name, sheets[name], dtypes.get(name), paths[name]))
+                for name in missing
+            }, kind='process')
+        else:
+            # Toutes les feuilles manquantes en une seule passe sur le classeur
+            frames = read_sheets(excel_file, {name: sheets[name] for name in missing}, dtypes)
+            for name, df in frames.items():
+                table = _to_arrow(df)
+                _write_atomic(paths[name], lambda tmp_path, table=table: pq.write_table(table, tmp_path))
+        for name in missing:
+            manifest['sheets'][specs[name]] = {
+                'file': os.path.basename(paths[name]),
+                'sheet': name,
+                'usecols': sheets[name],
+            }
+    if missing or not fresh:
+        with _MANIFEST_LOCK:
+            # Feuilles ajoutées entre-temps par un autre chargement du même classeur
+            latest = _read_manifest(snapshot_dir)
+            if latest.get('sha256') == manifest['sha256']:
+                manifest['sheets'] = dict(latest.get('sheets', {}), **manifest['sheets'])
+            _write_manifest(snapshot_dir, manifest)
+            _remove_stale(snapshot_dir, {entry['file'] for entry in manifest['sheets'].values()},
+                          manifest['sha256'])
+    return _read_sheets(manifest, specs, snapshot_dir)
@@ -0,0 +1,114 @@
+"""Agrégation spatiale des ventes géocodées, par niveau de zoom.
+
+La carte de la page Planning traçait un marqueur par ville d'un seul pays ;
+avec tous les pays (ou des points par magasin), le nombre de marqueurs et le
+`groupby` fait à chaque affichage deviennent trop lourds. `SpatialGrid`
+découpe le globe en grilles carrées, une par niveau de zoom (la maille est
+divisée par deux à chaque niveau), et précalcule une fois par chargement,
+pour chaque maille et chaque pays, la somme, le nombre de transactions, le
+barycentre et le nombre de villes. La carte ne lit que les mailles du niveau
+affiché.
+"""
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+MAP_MIN_ZOOM = 1
+MAP_MAX_ZOOM = int(os.environ.get('MAP_MAX_ZOOM', 10))
+# Maille (degrés) au zoom 0 : une quarantaine de mailles sur la largeur de la carte
+BASE_CELL_DEGREES = 36.0
+
+
+def cell_size(zoom):
+    """Côté (degrés) d'une maille au niveau `zoom`."""
+    return BASE_CELL_DEGREES / 2 ** zoom
+
+
+def fit_zoom(lat_min, lat_max, lon_min, lon_max):
+    """Niveau de zoom qui fait tenir l'étendue dans la carte."""
+    span = max(lon_max - lon_min, (lat_max - lat_min) * 2, 1e-3)
+    zoom = int(math.floor(math.log2(360.0 / span)))
+    return min(MAP_MAX_ZOOM, max(MAP_MIN_ZOOM, zoom))
+
+
+class SpatialGrid:
+    """Mailles (niveau, pays, maille) -> total / nombre / barycentre des points géocodés."""
+
+    def __init__(self, df, value_column, group_column='Country', label_column='City',
+                 lat_column='Latitude', lon_column='Longitude', zooms=None):
+        self.label_column = label_column
+        points = df[[group_column, label_column, lat_column, lon_column, value_column]]
+        points = points.dropna(subset=[lat_column, lon_column])
+        # Pays et villes remplacés par des codes entiers pour les regroupements
+        group_codes, groups = pd.factorize(points[group_column])
+        label_codes, labels = pd.factorize(points[label_column])
+        self._groups = pd.Index(np.asarray(groups, dtype=object))
+        self._labels = np.asarray(labels, dtype=object)
+        self._points = pd.DataFrame({
+            'group': group_codes,
+            'label': label_codes,
+            'lat': points[lat_column].to_numpy(dtype='float64'),
+            'lon': points[lon_column].to_numpy(dtype='float64'),
+            'value': points[value_column].fillna(0).to_numpy(dtype='float64'),
+        })
+        self.extents = self._points.groupby('group').agg(
+            lat_min=('lat', 'min'), lat_max=('lat', 'max'),
+            lon_min=('lon', 'min'), lon_max=('lon', 'max'))
+        self.extents.index = self._groups[self.extents.index]
+        zooms = range(MAP_MIN_ZOOM, MAP_MAX_ZOOM + 1) if zooms is None else zooms
+        self.levels = {zoom: self._aggregate(zoom) for zoom in zooms}
+
+    def _aggregate(self, zoom):
+        size = cell_size(zoom)
+        columns = int(math.ceil(360.0 / size))
+        x = np.floor((self._points['lon'].to_numpy() + 180.0) / size).astype('int64')
+        y = np.floor((self._points['lat'].to_numpy() + 90.0) / size).astype('int64')
+        return (
+            self._points.assign(cell=y * columns + x)
+            .groupby(['group', 'cell'], sort=False)
+            .agg(total=('value', 'sum'), count=('value', 'size'),
+                 lat_sum=('lat', 'sum'), lon_sum=('lon', 'sum'),
+                 cities=('label', 'nunique'), label=('label', 'first'))
+            .reset_index()
+        )
+
+    def extent(self, groups=None):
+        """(lat_min, lat_max, lon_min, lon_max) des points des groupes (tous si None)."""
+        extents = self.extents if groups is None else self.extents[self.extents.index.isin(groups)]
+        if extents.empty:
+            return None
+        return (extents['lat_min'].min(), extents['lat_max'].max(),
+                extents['lon_min'].min(), extents['lon_max'].max())
+
+    def level_for(self, zoom):
+        """Niveau précalculé le plus proche de `zoom` (sans dépasser)."""
+        available = [level for level in self.levels if level <= zoom]
+        return max(available) if available else min(self.levels)
+
+    def bins(self, zoom, groups=None):
+        """Mailles du niveau `zoom` pour les groupes demandés (tous si None).
+
+        Colonnes : City (nom de la ville, ou « N villes »), Latitude, Longitude
+        (barycentre des transactions), TOTAL_SALES, TRANSACTION_COUNT, CITY_COUNT.
+        """
+        cells = self.levels[self.level_for(zoom)]
+        if groups is not None:
+            cells = cells[cells['group'].isin(self._groups.get_indexer(list(groups)))]
+        if cells['group'].nunique() > 1:
+            # Une maille peut couvrir plusieurs pays : leurs agrégats s'additionnent
+            cells = cells.groupby('cell', sort=False).agg(
+                total=('total', 'sum'), count=('count', 'sum'),
+                lat_sum=('lat_sum', 'sum'), lon_sum=('lon_sum', 'sum'),
+                cities=('cities', 'sum'), label=('label', 'first')).reset_index()
+        labels = pd.Series(self._labels[cells['label'].to_numpy()], index=cells.index)
+        labels = labels.where(cells['cities'] == 1, cells['cities'].astype(str) + ' villes')
+        return pd.DataFrame({
+            self.label_column: labels.to_numpy(),
+            'Latitude': (cells['lat_sum'] / cells['count']).to_numpy(),
+            'Longitude': (cells['lon_sum'] / cells['count']).to_numpy(),
+            'TOTAL_SALES': cells['total'].to_numpy(),
+            'TRANSACTION_COUNT': cells['count'].to_numpy(),
+            'CITY_COUNT': cells['cities'].to_numpy(),
+        })
@@ -0,0 +1,92 @@
+"""Lecture par lots de résultats SQL dans des colonnes typées.
+
+Au lieu de `pd.DataFrame.from_records(cursor.fetchall())` (un tuple Python par
+ligne pour toute la table, puis des colonnes `object`), `fetch_typed` lit le
+curseur par `fetchmany` et convertit chaque lot directement dans des tampons
+numpy typés : datetime64 pour les dates, float64 pour les montants (Decimal
+compris), catégories (dictionnaire partagé entre lots) pour les libellés
+répétitifs. Seul un lot de tuples existe à la fois en mémoire.
+"""
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+BATCH_SIZE = 50_000
+
+
+class _TypedColumn:
+    """Tampon d'une colonne : liste de morceaux typés, concaténés à la fin."""
+
+    def __init__(self, dtype):
+        self.dtype = dtype
+        self.chunks = []
+        self.categories = {}
+
+    def append(self, values):
+        if self.dtype == 'datetime':
+            chunk = pd.to_datetime(pd.Series(values, dtype=object), errors='coerce')
+            self.chunks.append(chunk.to_numpy(dtype='datetime64[ns]'))
+        elif self.dtype == 'float':
+            try:
+                self.chunks.append(np.array(values, dtype='float64'))
+            except (TypeError, ValueError):
+                chunk = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce')
+                self.chunks.append(chunk.to_numpy(dtype='float64'))
+        elif self.dtype == 'int':
+            self.chunks.append(pd.array(values, dtype='Int64'))
+        elif self.dtype == 'category':
+            lookup = self.categories
+            self.chunks.append(np.fromiter(
+                (-1 if v is None else lookup.setdefault(v, len(lookup)) for v in values),
+                dtype='int32', count=len(values)))
+        else:
+            self.chunks.append(np.array(values, dtype=object))
+
+    def to_series(self, name):
+        if self.dtype == 'category':
+            codes = np.concatenate(self.chunks) if self.chunks else np.array([], dtype='int32')
+            categories = pd.Index(list(self.categories), dtype=object)
+            return pd.Series(pd.Categorical.from_codes(codes, categories), name=name)
+        if self.dtype == 'int':
+            values = pd.array([], dtype='Int64') if not self.chunks else pd.concat(
+                [pd.Series(chunk) for chunk in self.chunks], ignore_index=True).array
+            return pd.Series(values, name=name)
+        empty = {'datetime': 'datetime64[ns]', 'float': 'float64'}.get(self.dtype, object)
+        values = np.concatenate(self.chunks) if self.chunks else np.array([], dtype=empty)
+        return pd.Series(values, name=name)
+
+
+def fetch_typed(cursor, query, params=(), dtypes=None, batch_size=BATCH_SIZE):
+    """Exécute une requête et lit le résultat par lots dans un DataFrame typé.
+
+    `dtypes` associe des colonnes à 'datetime', 'float', 'int' ou 'category' ;
+    les autres restent en `object`.
+    """
+    dtypes = dtypes or {}
+    cursor.execute(query, params)
+    names = [column[0] for column in cursor.description]
+    columns = [_TypedColumn(dtypes.get(name)) for name in names]
+
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for column, values in zip(columns, zip(*rows)):
+            column.append(values)
+        del rows
+
+    return pd.DataFrame({name: column.to_series(name) for name, column in zip(names, columns)})
+
+
+def concat_frames(frames):
+    """pd.concat qui garde les colonnes catégorielles (union des dictionnaires)."""
+    frames = [df for df in frames if len(df.columns)]
+    if not frames:
+        return pd.DataFrame()
+    result = pd.concat(frames, ignore_index=True)
+    for column in frames[0].columns:
+        parts = [df[column] for df in frames if column in df.columns]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts) \
+                and not isinstance(result[column].dtype, pd.CategoricalDtype):
+            result[column] = pd.Series(union_categoricals(parts, ignore_order=True), index=result.index)
+    return result
@@ -0,0 +1,127 @@
+"""Requêtes paramétrées du tableau de bord, agrégées côté base.
+
+Les filtres du tableau de bord (période, pays, équipe, activité) sont
+traduits en clause WHERE paramétrée sur Sales joint à Effectifs par Hyp ; la
+base calcule les KPI et les regroupements (index IX_Sales_ORDER_DATE,
+IX_Sales_Country, IX_Effectifs_Team) et ne renvoie que les lignes agrégées.
+Hyp est la clé primaire d'Effectifs (PK_Effectifs_Hyp) : la jointure garde
+une ligne par vente.
+
+Mêmes règles que `filter_data` : ORDER_DATE >= début et <= fin (dates à
+minuit), seules les ventes d'un Hyp présent dans Effectifs sont comptées.
+"""
+from collections import namedtuple
+from contextlib import closing
+
+import pandas as pd
+
+from sql_fetch import fetch_typed
+
+SalesFilters = namedtuple('SalesFilters', ['start_date', 'end_date', 'country', 'team', 'activity'],
+                          defaults=(None,) * 5)
+
+# Dimensions de regroupement autorisées -> expression SQL
+GROUP_COLUMNS = {
+    'City': 's.City',
+    'Country': 's.Country',
+    'Hyp': 's.Hyp',
+    'Team': 'e.Team',
+    'Activité': 'e.Activité',
+}
+
+FROM_CLAUSE = "FROM Sales s JOIN Effectifs e ON e.Hyp = s.Hyp"
+
+# Ventes d'un seul agent (index IX_Sales_Hyp_ORDER_DATE)
+AGENT_SALES_QUERY = "SELECT ORDER_DATE, Total_sale FROM Sales WHERE Hyp = ?"
+
+
+def _param_date(value):
+    return pd.to_datetime(value).to_pydatetime()
+
+
+def where_clause(filters):
+    """Clause WHERE et paramètres correspondant aux filtres (None = « tous »)."""
+    conditions, params = [], []
+    if filters.start_date is not None and filters.end_date is not None:
+        conditions.append("s.ORDER_DATE >= ? AND s.ORDER_DATE <= ?")
+        params += [_param_date(filters.start_date), _param_date(filters.end_date)]
+    for expression, value in (('s.Country', filters.country), ('e.Team', filters.team),
+                              ('e.Activité', filters.activity)):
+        if value is not None:
+            conditions.append(f"{expression} = ?")
+            params.append(value)
+    sql = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return sql, params
+
+
+def kpi_query(filters):
+    """Somme et nombre de ventes pour les filtres."""
+    where, params = where_clause(filters)
+    return f"SELECT SUM(s.Total_sale), COUNT(*) {FROM_CLAUSE} {where}", params
+
+
+def group_by_query(dimension, filters):
+    """Somme des ventes par `dimension` (voir GROUP_COLUMNS) pour les filtres."""
+    expression = GROUP_COLUMNS[dimension]
+    where, params = where_clause(filters)
+    sql = (f"SELECT {expression} AS {dimension}, SUM(s.Total_sale) AS Total_sale "
+           f"{FROM_CLAUSE} {where} GROUP BY {expression}")
+    return sql, params
+
+
+def run_kpis(conn, filters):
+    """(somme, nombre de transactions, moyenne), comme `DailyCube.totals`."""
+    sql, params = kpi_query(filters)
+    with closing(conn.cursor()) as cursor:
+        cursor.execute(sql, params)
+        total, count = cursor.fetchone()
+    total = float(total or 0)
+    count = int(count or 0)
+    return total, count, total / count if count else float('nan')
+
+
+def run_group_by(conn, dimension, filters):
+    """DataFrame `dimension` / Total_sale, sans la valeur manquante."""
+    sql, params = group_by_query(dimension, filters)
+    with closing(conn.cursor()) as cursor:
+        result = fetch_typed(cursor, sql, params, {'Total_sale': 'float'})
+    result['Total_sale'] = result['Total_sale'].fillna(0)
+    return result.dropna(subset=[dimension]).reset_index(drop=True)
+
+
+def filter_options(conn):
+    """Valeurs proposées par les listes déroulantes et bornes de la période."""
+    options = {}
+    with closing(conn.cursor()) as cursor:
+        for key, sql in (('countries', "SELECT DISTINCT Country FROM Sales WHERE Country IS NOT NULL"),
+                         ('teams', "SELECT DISTINCT Team FROM Effectifs WHERE Team IS NOT NULL"),
+                         ('activities', "SELECT DISTINCT Activité FROM Effectifs WHERE Activité IS NOT NULL")):
+            cursor.execute(sql)
+            options[key] = sorted(row[0] for row in cursor.fetchall())
+        cursor.execute("SELECT MIN(ORDER_DATE), MAX(ORDER_DATE) FROM Sales")
+        min_date, max_date = cursor.fetchone()
+    options['min_date'] = None if min_date is None else pd.to_datetime(min_date)
+    options['max_date'] = None if max_date is None else pd.to_datetime(max_date)
+    return options
+
+
+def summarize_agent_sales(sales):
+    """KPI et série journalière (ORDER_DATE / Total_sale) des ventes d'un agent."""
+    amounts = pd.to_numeric(sales['Total_sale'], errors='coerce').fillna(0)
+    dates = pd.to_datetime(sales['ORDER_DATE'], errors='coerce')
+    total = float(amounts.sum())
+    count = len(sales)
+    daily = amounts.groupby(dates.dt.date).sum().rename_axis('ORDER_DATE').reset_index()
+    return {
+        'total': total,
+        'count': count,
+        'mean': total / count if count else float('nan'),
+        'daily': daily,
+    }
+
+
+def agent_summary(conn, hyp):
+    """Résumé des ventes d'un Hyp, lu par une requête indexée sur ce seul Hyp."""
+    with closing(conn.cursor()) as cursor:
+        sales = fetch_typed(cursor, AGENT_SALES_QUERY, (hyp,), {'ORDER_DATE': 'datetime', 'Total_sale': 'float'})
+    return summarize_agent_sales(sales)
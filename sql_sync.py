@@ -0,0 +1,273 @@
+"""Synchronisation incrémentale des tables Sales / Effectifs de SQL Server.
+
+`SalesSync` garde une copie locale colonnaire des ventes (fichiers Parquet
+dans `.snapshots/sql`) et un point de reprise (ORDER_DATE, Id_Sale) : chaque
+rafraîchissement ne lit que les ventes postérieures, les ajoute aux données
+en mémoire et met à jour les cubes journaliers, les séries de tendances et
+le classement des agents sur les seules ventes nouvelles.
+
+Les ventes modifiées ou supprimées a posteriori ne sont pas vues par le
+delta : `refresh(conn, full=True)` recharge alors toute la table.
+
+Les cubes, séries et classements tenus à jour ne sont jamais modifiés une
+fois remis à l'appelant : chaque delta est appliqué à des copies, qui
+remplacent les précédentes. Un snapshot publié garde ainsi des agrégats
+cohérents avec ses lignes, et les lectures concurrentes ne voient jamais
+une structure à moitié mise à jour. `state()` renvoie ensemble les tables
+et les structures d'une même version.
+
+`refresh_parallel(connect)` lit Sales et Effectifs en même temps, chacune sur
+sa propre connexion, avec un délai par source ; si seule la lecture
+d'Effectifs échoue, le personnel précédent est conservé et l'échec est
+signalé dans le rapport.
+"""
+import copy
+import json
+import os
+import threading
+from collections import namedtuple
+from contextlib import closing
+
+import pandas as pd
+
+from daily_cube import DailyCube
+from leaderboard import Leaderboard
+from parallel_loader import Source, load_parallel
+from sql_fetch import concat_frames, fetch_typed
+from trend_index import TrendIndex
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # sans pyarrow, la copie locale reste en mémoire seulement
+    pa = None
+    pq = None
+
+SALES_COLUMNS = ['Hyp', 'ORDER_REFERENCE', 'ORDER_DATE', 'SHORT_MESSAGE', 'Country', 'City',
+                 'Total_sale', 'Rating', 'Id_Sale']
+STAFF_COLUMNS = ['Hyp', 'NOM', 'PRENOM', 'Team', 'Activité', 'Date_In']
+
+SALES_QUERY = f"SELECT {', '.join(SALES_COLUMNS)} FROM Sales"
+SALES_DELTA_QUERY = (
+    f"{SALES_QUERY} WHERE ORDER_DATE > ? OR (ORDER_DATE = ? AND Id_Sale > ?)"
+)
+# Tri par la clé primaire (Hyp) : même ordre du personnel à chaque lecture
+STAFF_QUERY = f"SELECT {', '.join(STAFF_COLUMNS)} FROM Effectifs ORDER BY Hyp"
+
+# Types appliqués pendant la lecture par lots (voir sql_fetch)
+SALES_DTYPES = {
+    'ORDER_DATE': 'datetime', 'Total_sale': 'float', 'Rating': 'float', 'Id_Sale': 'int',
+    'Country': 'category', 'City': 'category', 'SHORT_MESSAGE': 'category',
+}
+STAFF_DTYPES = {'Date_In': 'datetime', 'Team': 'category', 'Activité': 'category'}
+
+# Tables et structures d'une même version de la copie locale (voir `SalesSync.state`)
+SyncState = namedtuple('SyncState', ['version', 'sales_df', 'staff_df', 'cubes', 'trends', 'leaderboards'])
+
+# Au-delà de ce nombre de fichiers delta, la copie locale est réécrite en un seul fichier
+MAX_PARTS = 20
+
+
+def coerce_sales(df):
+    """Types des colonnes utilisées pour le point de reprise et les agrégats."""
+    df['ORDER_DATE'] = pd.to_datetime(df['ORDER_DATE'], errors='coerce')
+    df['Total_sale'] = pd.to_numeric(df['Total_sale'], errors='coerce').fillna(0)
+    return df
+
+
+def with_delta(structure, delta):
+    """Copie de `structure` (cube, série, classement) complétée par `delta` ; l'original ne change pas.
+
+    Les `apply_delta` remplacent leurs tableaux au lieu de les modifier : une
+    copie superficielle suffit.
+    """
+    updated = copy.copy(structure)
+    updated.apply_delta(delta)
+    return updated
+
+
+def restore_categories(df, dtypes=SALES_DTYPES):
+    """Colonnes catégorielles relues depuis Parquet, remises au type produit par `fetch_typed`.
+
+    Relues, leurs catégories sont du texte pandas (et une colonne vide n'est
+    plus catégorielle) : `concat_frames` ne pourrait pas les unir au delta
+    suivant, dont les catégories sont des objets.
+    """
+    for column, kind in dtypes.items():
+        if kind != 'category' or column not in df.columns:
+            continue
+        values = df[column].astype('category')
+        categories = pd.Index(values.cat.categories.to_numpy(dtype=object), dtype=object)
+        df[column] = pd.Categorical.from_codes(values.cat.codes.to_numpy(), categories)
+    return df
+
+
+class SalesSync:
+    """Copie locale des ventes, complétée par delta à chaque rafraîchissement."""
+
+    def __init__(self, store_dir, fetch=fetch_typed):
+        self.store_dir = store_dir
+        self.fetch = fetch
+        self.sales_df = coerce_sales(pd.DataFrame(columns=SALES_COLUMNS))
+        self.staff_df = pd.DataFrame(columns=STAFF_COLUMNS)
+        self.version = 0
+        self.last_delta_rows = 0
+        self._state = {'parts': []}
+        self._cubes = {}
+        self._trends = {}
+        self._leaderboards = {}
+        # Réentrant : `state` construit les structures demandées sous le même verrou
+        self._lock = threading.RLock()
+        self._load_local()
+
+    # --- Copie locale -------------------------------------------------------
+
+    def _state_path(self):
+        return os.path.join(self.store_dir, 'state.json')
+
+    def _load_local(self):
+        if pq is None or not os.path.exists(self._state_path()):
+            return
+        with open(self._state_path(), encoding='utf-8') as f:
+            self._state = json.load(f)
+        parts = [os.path.join(self.store_dir, part) for part in self._state['parts']]
+        if parts and all(os.path.exists(part) for part in parts):
+            self.sales_df = restore_categories(pd.concat(
+                [pq.read_table(part, memory_map=True).to_pandas() for part in parts],
+                ignore_index=True))
+            self.version = self._state.get('version', 0)
+        else:
+            self._state = {'parts': []}
+
+    def _save_part(self, df, rewrite=False):
+        if pq is None:
+            return
+        os.makedirs(self.store_dir, exist_ok=True)
+        if rewrite or len(self._state['parts']) >= MAX_PARTS:
+            old_parts = self._state['parts']
+            df = self.sales_df
+            self._state['parts'] = []
+        else:
+            old_parts = []
+        name = f"sales-{self.version:06d}.parquet"
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), os.path.join(self.store_dir, name))
+        self._state['parts'].append(name)
+        self._state['version'] = self.version
+        self._state['high_water_mark'] = self.high_water_mark()
+        with open(self._state_path() + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self._state, f, indent=2, default=str)
+        os.replace(self._state_path() + '.tmp', self._state_path())
+        for part in old_parts:
+            if part != name:
+                os.remove(os.path.join(self.store_dir, part))
+
+    # --- Synchronisation ----------------------------------------------------
+
+    def high_water_mark(self):
+        """(ORDER_DATE, Id_Sale) de la dernière vente connue, ou None."""
+        dated = self.sales_df.dropna(subset=['ORDER_DATE'])
+        if dated.empty:
+            return None
+        last_date = dated['ORDER_DATE'].max()
+        last_id = dated.loc[dated['ORDER_DATE'] == last_date, 'Id_Sale'].max()
+        return last_date, last_id
+
+    def _read_sales(self, conn, mark):
+        with closing(conn.cursor()) as cursor:
+            if mark is None:
+                return coerce_sales(self.fetch(cursor, SALES_QUERY, (), SALES_DTYPES))
+            last_date, last_id = mark
+            last_date = last_date.to_pydatetime()
+            last_id = -1 if pd.isna(last_id) else int(last_id)
+            return coerce_sales(self.fetch(
+                cursor, SALES_DELTA_QUERY, (last_date, last_date, last_id), SALES_DTYPES))
+
+    def _read_staff(self, conn):
+        with closing(conn.cursor()) as cursor:
+            return self.fetch(cursor, STAFF_QUERY, (), STAFF_DTYPES)
+
+    @staticmethod
+    def _on_connection(connect, read, *args):
+        with connect() as conn:
+            return read(conn, *args)
+
+    def refresh(self, conn, full=False):
+        """Lit les nouvelles ventes (ou toute la table) et le personnel ; retourne le delta."""
+        with self._lock:
+            mark = None if full else self.high_water_mark()
+            delta = self._read_sales(conn, mark)
+            self.staff_df = self._read_staff(conn)
+            return self._apply(mark, delta)
+
+    def refresh_parallel(self, connect, full=False, timeout=None):
+        """Comme `refresh`, Sales et Effectifs lus en même temps ; retourne (delta, rapport).
+
+        `connect()` rend une connexion à utiliser dans un bloc `with` (une par
+        source, par exemple `ConnectionPool.connection`). Lève
+        `PartialLoadError` si les ventes n'ont pas pu être lues.
+        """
+        with self._lock:
+            mark = None if full else self.high_water_mark()
+            results, report = load_parallel({
+                'Sales': Source(self._on_connection, (connect, self._read_sales, mark), timeout),
+                'Effectifs': Source(self._on_connection, (connect, self._read_staff), timeout, required=False),
+            })
+            if 'Effectifs' in results:
+                self.staff_df = results['Effectifs']
+            return self._apply(mark, results['Sales']), report
+
+    def _apply(self, mark, delta):
+        self.last_delta_rows = len(delta)
+        if mark is None:
+            self.sales_df = delta
+            self.version += 1
+            self._cubes = {}
+            self._trends = {}
+            self._leaderboards = {}
+            self._save_part(delta, rewrite=True)
+        elif not delta.empty:
+            self.sales_df = concat_frames([self.sales_df, delta])
+            self.version += 1
+            # Copies mises à jour : les structures déjà remises (snapshots publiés) restent intactes
+            self._cubes = {key: with_delta(cube, delta) for key, cube in self._cubes.items()}
+            self._trends = {key: with_delta(trend, delta) for key, trend in self._trends.items()}
+            self._leaderboards = {key: with_delta(board, delta) for key, board in self._leaderboards.items()}
+            self._save_part(delta)
+        return delta
+
+    def cube(self, value_column, dims):
+        """Cube journalier des ventes, tenu à jour au fil des deltas."""
+        key = (value_column, tuple(dims))
+        with self._lock:
+            if key not in self._cubes:
+                self._cubes[key] = DailyCube(self.sales_df, value_column, dims)
+            return self._cubes[key]
+
+    def trends(self, value_column, by):
+        """Séries journalières des ventes par `by` (Hyp, City...), tenues à jour au fil des deltas."""
+        key = (value_column, by)
+        with self._lock:
+            if key not in self._trends:
+                self._trends[key] = TrendIndex(self.sales_df, value_column, by)
+            return self._trends[key]
+
+    def leaderboard(self, value_column):
+        """Mesures par jour et par Hyp pour le classement, tenues à jour au fil des deltas."""
+        with self._lock:
+            if value_column not in self._leaderboards:
+                self._leaderboards[value_column] = Leaderboard(self.sales_df, value_column)
+            return self._leaderboards[value_column]
+
+    def state(self, cubes=(), trends=(), leaderboards=()):
+        """Tables et structures demandées, d'une même version (lues sous le verrou).
+
+        `cubes` : (colonne, dimensions) ; `trends` : (colonne, by) ;
+        `leaderboards` : colonnes de montants.
+        """
+        with self._lock:
+            return SyncState(
+                self.version, self.sales_df, self.staff_df,
+                {spec: self.cube(*spec) for spec in cubes},
+                {spec: self.trends(*spec) for spec in trends},
+                {column: self.leaderboard(column) for column in leaderboards},
+            )
@@ -0,0 +1,89 @@
+"""Affichage paginé des tableaux détaillés.
+
+`st.dataframe` sur un DataFrame filtré envoie toutes ses lignes au navigateur
+(et le tableau détaillé était trié à chaque exécution). `TableViewer` garde,
+par colonne triable, la permutation triée de la table complète ; un
+sous-ensemble filtré se trie en parcourant cette permutation et seule la page
+visible est extraite et envoyée.
+"""
+import math
+import threading
+
+import numpy as np
+import streamlit as st
+
+from profiling import stage
+
+PAGE_SIZES = (25, 50, 100, 500)
+NO_SORT = "(aucun)"
+
+
+class TableViewer:
+    """Pages triées d'un DataFrame en lecture seule."""
+
+    def __init__(self, df):
+        self.df = df
+        self.size = len(df)
+        self._orders = {}
+        self._lock = threading.Lock()
+
+    def sort_order(self, column, ascending=True):
+        """Positions de toutes les lignes triées par `column` (valeurs manquantes en fin)."""
+        key = (column, ascending)
+        with self._lock:
+            if key not in self._orders:
+                values = self.df[column].reset_index(drop=True)
+                ordered = values.sort_values(ascending=ascending, kind='stable', na_position='last')
+                self._orders[key] = ordered.index.to_numpy()
+            return self._orders[key]
+
+    def ordered_positions(self, positions=None, sort_column=None, ascending=True):
+        """Positions retenues (toutes si None), dans l'ordre du tri demandé."""
+        if sort_column is None:
+            return np.arange(self.size) if positions is None else np.sort(positions)
+        order = self.sort_order(sort_column, ascending)
+        if positions is None:
+            return order
+        selected = np.zeros(self.size, dtype=bool)
+        selected[positions] = True
+        return order[selected[order]]
+
+    def page(self, positions=None, sort_column=None, ascending=True, page=0, page_size=PAGE_SIZES[1]):
+        """Lignes de la page `page` (à partir de 0) et nombre total de lignes retenues."""
+        ordered = self.ordered_positions(positions, sort_column, ascending)
+        start = page * page_size
+        return self.df.take(ordered[start:start + page_size]), len(ordered)
+
+
+def paginated_table(viewer, positions=None, key='table', sort_column=None, ascending=True, height=None):
+    """Contrôles de tri / pagination et page visible du tableau."""
+    columns = list(viewer.df.columns)
+    total = viewer.size if positions is None else len(positions)
+
+    col1, col2, col3, col4 = st.columns([3, 2, 2, 2])
+    with col1:
+        options = [NO_SORT] + columns
+        default = options.index(sort_column) if sort_column in columns else 0
+        sort_column = st.selectbox("Trier par", options, index=default, key=f"{key}_sort")
+    with col2:
+        order = st.selectbox("Ordre", ["Croissant", "Décroissant"], index=0 if ascending else 1, key=f"{key}_order")
+    with col3:
+        page_size = st.selectbox("Lignes par page", PAGE_SIZES, index=1, key=f"{key}_page_size")
+    pages = max(1, math.ceil(total / page_size))
+    with col4:
+        # Pas de maximum sur le widget : le nombre de pages change avec les filtres
+        page = min(int(st.number_input(f"Page (sur {pages})", min_value=1, value=1, step=1, key=f"{key}_page")), pages)
+
+    with stage('table_page'):
+        rows, total = viewer.page(
+            positions,
+            None if sort_column == NO_SORT else sort_column,
+            order == "Croissant",
+            page - 1,
+            page_size,
+        )
+    options = {} if height is None else {'height': height}
+    with stage('st_dataframe'):
+        st.dataframe(rows, use_container_width=True, **options)
+    first = (page - 1) * page_size
+    st.caption(f"Lignes {min(first + 1, total)}–{first + len(rows)} sur {total}")
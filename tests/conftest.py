@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Modules de l'application à la racine du dépôt
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Empreintes rapides pour les tests (la valeur par défaut coûte ~0,5 s par mot de passe)
+os.environ.setdefault('AUTH_PBKDF2_ITERATIONS', '1000')
@@ -0,0 +1,154 @@
+import sqlite3
+from contextlib import contextmanager
+
+import pytest
+
+import auth
+from auth import Authenticator, LoginThrottled, RateLimiter, SessionCache, hash_password, verify_password
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(auth.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def users_db():
+    conn = sqlite3.connect(':memory:', check_same_thread=False)
+    conn.executescript(
+        "CREATE TABLE Users (UserName TEXT PRIMARY KEY, Hyp TEXT, PassWord TEXT);"
+        "CREATE TABLE Effectifs (Hyp TEXT PRIMARY KEY, Type TEXT, Date_In TEXT);"
+        "INSERT INTO Effectifs VALUES ('H1', 'Agent', '2023-01-01');"
+    )
+    conn.execute("INSERT INTO Users VALUES ('alice', 'H1', ?)", (hash_password('secret'),))
+    conn.commit()
+    return conn
+
+
+@pytest.fixture
+def authenticator(users_db):
+    @contextmanager
+    def connection():
+        yield users_db
+    return Authenticator(connection, limiter=RateLimiter(burst=100))
+
+
+# --- Mots de passe ----------------------------------------------------------
+
+def test_verify_password_accepts_hash_and_rejects_wrong_password():
+    stored = hash_password('secret')
+    assert verify_password('secret', stored) == (True, False)
+    assert verify_password('wrong', stored)[0] is False
+
+
+def test_plaintext_password_is_accepted_once_then_hashed(authenticator, users_db):
+    users_db.execute("UPDATE Users SET PassWord = 'plain' WHERE UserName = 'alice'")
+    assert verify_password('plain', 'plain') == (True, True)
+
+    user, _ = authenticator.login('alice', 'plain', client='10.0.0.1')
+    assert user['hyp'] == 'H1'
+    stored = users_db.execute("SELECT PassWord FROM Users WHERE UserName = 'alice'").fetchone()[0]
+    assert auth.is_hashed(stored)
+    assert verify_password('plain', stored)[0]
+
+
+# --- Jetons de session ------------------------------------------------------
+
+def test_tampered_or_foreign_tokens_are_rejected(clock):
+    sessions = SessionCache(secret=b'k' * 32)
+    token = sessions.issue({'hyp': 'H1'}, client='10.0.0.1')
+    payload, signature = token.rsplit('.', 1)
+
+    assert sessions.resume(token, '10.0.0.1') == {'hyp': 'H1'}
+    assert sessions.resume(f"{payload}.{signature[:-2]}AA", '10.0.0.1') is None
+    assert sessions.resume(f"{payload[:-2]}AA.{signature}", '10.0.0.1') is None
+    assert sessions.resume(payload, '10.0.0.1') is None
+    assert SessionCache(secret=b'x' * 32).resume(token, '10.0.0.1') is None
+
+
+def test_token_is_bound_to_its_client(clock):
+    sessions = SessionCache()
+    token = sessions.issue({'hyp': 'H1'}, client='10.0.0.1')
+
+    assert sessions.resume(token, '10.0.0.2') is None
+    assert sessions.resume(token, None) is None
+    # Le refus d'un autre client ne révoque pas la session d'origine
+    assert sessions.resume(token, '10.0.0.1') == {'hyp': 'H1'}
+
+
+def test_token_expires_after_inactivity(clock):
+    sessions = SessionCache(ttl=60, max_age=3600)
+    token = sessions.issue({'hyp': 'H1'}, client='ip')
+
+    clock.now += 59
+    assert sessions.resume(token, 'ip') is not None
+    clock.now += 59  # l'expiration a été repoussée par la reprise précédente
+    assert sessions.resume(token, 'ip') is not None
+    clock.now += 61
+    assert sessions.resume(token, 'ip') is None
+    assert len(sessions) == 0
+
+
+def test_token_expires_at_max_age_despite_activity(clock):
+    sessions = SessionCache(ttl=60, max_age=150)
+    token = sessions.issue({'hyp': 'H1'}, client='ip')
+
+    for _ in range(2):
+        clock.now += 50
+        assert sessions.resume(token, 'ip') is not None
+    clock.now += 51
+    assert sessions.resume(token, 'ip') is None
+
+
+def test_logout_revokes_token(authenticator):
+    _, token = authenticator.login('alice', 'secret', client='ip')
+    assert authenticator.resume(token, 'ip')['hyp'] == 'H1'
+    authenticator.logout(token)
+    assert authenticator.resume(token, 'ip') is None
+
+
+# --- Limitation et cache des utilisateurs -----------------------------------
+
+def test_login_is_throttled_after_burst(users_db):
+    @contextmanager
+    def connection():
+        yield users_db
+    authenticator = Authenticator(connection, limiter=RateLimiter(burst=2, refill=60))
+
+    assert authenticator.login('alice', 'wrong', client='ip') is None
+    assert authenticator.login('alice', 'wrong', client='ip') is None
+    with pytest.raises(LoginThrottled):
+        authenticator.login('alice', 'secret', client='ip')
+    assert authenticator.metrics()['throttled'] == 1
+
+
+def test_logins_without_client_share_a_global_bucket(users_db):
+    @contextmanager
+    def connection():
+        yield users_db
+    authenticator = Authenticator(connection, limiter=RateLimiter(burst=100),
+                                  anonymous_limiter=RateLimiter(burst=3, refill=60))
+
+    for i in range(3):
+        assert authenticator.login(f'user{i}', 'x', client=None) is None
+    with pytest.raises(LoginThrottled):
+        authenticator.login('user9', 'x', client=None)
+    # Avec une adresse connue, le seau commun ne s'applique pas
+    assert authenticator.login('user9', 'x', client='ip') is None
+
+
+def test_unknown_users_and_wrong_passwords_do_not_requery(authenticator):
+    for _ in range(3):
+        assert authenticator.login('ghost', 'x', client='ip') is None
+        assert authenticator.login('alice', 'wrong', client='ip') is None
+    assert authenticator.metrics()['db_lookups'] == 2
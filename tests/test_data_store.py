@@ -0,0 +1,101 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from data_store import DataStore
+
+
+class Loader:
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+
+    def __call__(self):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("source indisponible")
+        return {'Sales': pd.DataFrame({'n': [self.calls]})}, {'call': self.calls}
+
+
+def test_each_refresh_publishes_a_new_version():
+    loader = Loader()
+    store = DataStore(loader)
+    first = store.current()
+    second = store.refresh()
+
+    assert (first.version, second.version) == (1, 2)
+    assert store.current() is second
+    # L'ancien snapshot garde ses tables
+    assert first['Sales']['n'].tolist() == [1]
+    assert second.meta['call'] == 2
+
+
+def test_failed_refresh_keeps_previous_snapshot():
+    loader = Loader()
+    store = DataStore(loader)
+    snapshot = store.current()
+    loader.fail = True
+
+    assert store.refresh() is snapshot
+    assert 'indisponible' in store.stats()['last_error']
+    loader.fail = False
+    assert store.refresh().version == 2
+    assert store.stats()['last_error'] is None
+
+
+def test_first_load_failure_is_raised():
+    loader = Loader()
+    loader.fail = True
+    with pytest.raises(RuntimeError):
+        DataStore(loader).current()
+
+
+def test_warmup_runs_before_publication():
+    published = []
+
+    def warmup(snapshot):
+        published.append(store._snapshot)
+        snapshot.derived('total', lambda: snapshot['Sales']['n'].sum())
+
+    store = DataStore(Loader(), warmup=warmup)
+    snapshot = store.current()
+    assert published == [None]
+    assert snapshot.derived('total', lambda: pytest.fail("déjà construit")) == 1
+
+
+def test_failed_warmup_does_not_publish():
+    store = DataStore(Loader())
+    snapshot = store.current()
+    store.warmup = lambda snapshot: 1 / 0
+
+    assert store.refresh() is snapshot
+    assert store.stats()['version'] == 1
+
+
+def test_fresh_snapshot_is_not_reloaded():
+    loader = Loader()
+    store = DataStore(loader, max_age=3600)
+    snapshot = store.current()
+    assert store.refresh(if_older_than=3600) is snapshot
+    assert loader.calls == 1
+
+
+def test_derived_is_built_once_under_concurrency():
+    store = DataStore(Loader())
+    snapshot = store.current()
+    builds = []
+
+    def build():
+        builds.append(1)
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(snapshot.derived('k', build)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(builds) == 1
+    assert len({id(result) for result in results}) == 1
@@ -0,0 +1,137 @@
+import pytest
+
+from db_pool import ConnectionPool, PoolTimeout
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=()):
+        if self.conn.dead:
+            raise RuntimeError("connexion coupée")
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.rollbacks = 0
+        self.closed = False
+        self.dead = False
+        self.fail_rollback = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        if self.fail_rollback:
+            raise RuntimeError("rollback impossible")
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def opened():
+    return []
+
+
+@pytest.fixture
+def pool(opened):
+    def connect():
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+    return ConnectionPool(connect, max_size=2, checkout_timeout=0.05, backoff=0)
+
+
+def test_checkin_rolls_back_and_reuses_connection(pool, opened):
+    with pool.connection() as conn:
+        pass
+    assert conn.rollbacks == 1
+    with pool.connection() as again:
+        pass
+    assert again is conn
+    assert len(opened) == 1
+    assert pool.metrics()['idle'] == 1
+
+
+def test_failed_rollback_closes_connection(pool):
+    with pool.connection() as conn:
+        conn.fail_rollback = True
+    assert conn.closed
+    metrics = pool.metrics()
+    assert (metrics['size'], metrics['idle']) == (0, 0)
+
+
+def test_broken_connection_is_not_returned(pool):
+    with pytest.raises(RuntimeError):
+        with pool.connection() as conn:
+            conn.dead = True
+            raise RuntimeError("requête en échec")
+    assert conn.closed
+    assert pool.metrics()['size'] == 0
+
+
+def test_error_on_healthy_connection_keeps_it(pool):
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            raise ValueError("erreur applicative")
+    assert not conn.closed
+    assert conn.rollbacks == 1
+    assert pool.metrics()['idle'] == 1
+
+
+def test_exhausted_pool_times_out(pool):
+    with pool.connection(), pool.connection():
+        with pytest.raises(PoolTimeout):
+            with pool.connection():
+                pass
+    metrics = pool.metrics()
+    assert metrics['timeouts'] == 1
+    assert metrics['in_use'] == 0
+    # Les connexions rendues sont de nouveau disponibles
+    with pool.connection():
+        pass
+
+
+def test_connect_is_retried_then_gives_up():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise OSError("serveur injoignable")
+        return FakeConnection()
+
+    pool = ConnectionPool(flaky, retries=3, backoff=0)
+    with pool.connection():
+        pass
+    assert pool.metrics()['connect_failures'] == 2
+
+    def down():
+        raise OSError("serveur injoignable")
+
+    pool = ConnectionPool(down, max_size=1, retries=2, backoff=0, checkout_timeout=0.05)
+    with pytest.raises(OSError):
+        with pool.connection():
+            pass
+    # L'échec libère la place réservée
+    assert pool.metrics()['size'] == 0
+
+
+def test_idle_connections_are_evicted(pool, opened):
+    pool.max_idle = -1  # toute connexion rendue est déjà trop ancienne
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    assert first.closed
+    assert second is not first
+    assert pool.metrics()['closed'] == 1
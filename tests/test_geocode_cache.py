@@ -0,0 +1,77 @@
+import sqlite3
+
+import geocode_cache
+from geocode_cache import UNAVAILABLE, GeocodeStore, resolve
+
+
+class Backend:
+    def __init__(self, answers, remote=True, name='fake'):
+        self.answers = answers
+        self.remote = remote
+        self.name = name
+        self.calls = []
+
+    def geocode(self, city, country):
+        self.calls.append(city)
+        return self.answers.get(city)
+
+
+def pairs(*cities):
+    return [(city, 'FR') for city in cities]
+
+
+def test_outage_is_not_remembered_as_failure(tmp_path):
+    store = GeocodeStore(str(tmp_path / 'cache.sqlite'))
+    outage = Backend({'Paris': (48.85, 2.35), 'Lyon': UNAVAILABLE})
+    resolve(pairs('Paris', 'Lyon', 'Nowhere'), store, [outage], remember_failures=True)
+
+    known, failed = store.get_many(pairs('Paris', 'Lyon', 'Nowhere'))
+    assert known == {'paris|fr': (48.85, 2.35)}
+    assert failed == {'nowhere|fr'}
+
+    # Lyon est retentée au passage suivant, Nowhere (échec récent) seulement par le gazetteer
+    remote = Backend({'Lyon': (45.76, 4.83), 'Nowhere': (1.0, 1.0)})
+    local = Backend({}, remote=False, name='gazetteer')
+    known = resolve(pairs('Paris', 'Lyon', 'Nowhere'), store, [local, remote], remember_failures=True)
+    assert remote.calls == ['Lyon']
+    assert local.calls == ['Lyon', 'Nowhere']
+    assert set(known) == {'paris|fr', 'lyon|fr'}
+
+
+def test_failures_are_retried_after_window(tmp_path):
+    store = GeocodeStore(str(tmp_path / 'cache.sqlite'))
+    resolve(pairs('Nowhere'), store, [Backend({})], remember_failures=True)
+    with sqlite3.connect(store.path) as conn:
+        conn.execute("UPDATE geocodes SET failed_at = '2000-01-01T00:00:00'")
+
+    remote = Backend({'Nowhere': (1.0, 2.0)})
+    assert resolve(pairs('Nowhere'), store, [remote]) == {'nowhere|fr': (1.0, 2.0)}
+    assert store.stats()['failures'] == 0
+
+
+def test_backend_is_abandoned_after_repeated_errors(tmp_path):
+    store = GeocodeStore(str(tmp_path / 'cache.sqlite'))
+    cities = [f"C{i}" for i in range(geocode_cache.BACKEND_MAX_ERRORS + 3)]
+    down = Backend({city: UNAVAILABLE for city in cities})
+    assert resolve(pairs(*cities), store, [down], remember_failures=True) == {}
+    assert len(down.calls) == geocode_cache.BACKEND_MAX_ERRORS
+    assert store.stats()['entries'] == 0
+
+
+def test_stored_failures_are_not_hits(tmp_path):
+    store = GeocodeStore(str(tmp_path / 'cache.sqlite'))
+    store.put_many([('Paris', 'FR', 48.85, 2.35), ('Nowhere', 'FR', None, None)], 'test')
+    store.get_many(pairs('Paris', 'Nowhere'))
+    stats = store.stats()
+    assert (stats['hits'], stats['misses'], stats['failures']) == (1, 1, 1)
+
+
+def test_old_cache_gains_failed_at(tmp_path):
+    path = str(tmp_path / 'old.sqlite')
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE geocodes (key TEXT PRIMARY KEY, City TEXT, Country TEXT,"
+                     " Latitude REAL, Longitude REAL, source TEXT, updated_at TEXT)")
+        conn.execute("INSERT INTO geocodes VALUES ('x|fr', 'X', 'FR', NULL, NULL, 'none', '2000-01-01T00:00:00')")
+    store = GeocodeStore(path)
+    # Échec ancien : hors de la fenêtre, redevient à géocoder
+    assert store.get_many(pairs('X')) == ({}, set())
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from reconciliation import Reconciliation, _references
+
+
+def sales(refs, amounts=None, day='2024-01-01'):
+    return pd.DataFrame({
+        'ORDER_REFERENCE': refs,
+        'Hyp': [f"H{i}" for i in range(len(refs))],
+        'ORDER_DATE': pd.Timestamp(day),
+        'Montant': amounts if amounts is not None else [100.0] * len(refs),
+    })
+
+
+def collections(refs, amounts, day='2024-01-04', bank='BNP'):
+    return pd.DataFrame({
+        'ORDER_REFERENCE': refs,
+        'Banques': bank,
+        'ORDER_DATE': pd.Timestamp(day),
+        'TRANSACTION': amounts,
+    })
+
+
+@pytest.mark.parametrize('values, expected', [
+    (pd.Series([101.0, np.nan, 103.0]), ['101', None, '103']),
+    (pd.Series([101, 103]), ['101', '103']),
+    (pd.Series(['101.0', ' 102 ', 104.0, 'A.0', '12.5'], dtype=object), ['101', '102', '104', 'A.0', '12.5']),
+    (pd.Series([1.5, 2.0]), ['1.5', '2']),
+])
+def test_references_normalise_whole_numbers(values, expected):
+    result = _references(values)
+    assert [None if pd.isna(value) else value for value in result] == expected
+
+
+def test_float_references_with_missing_value_still_match():
+    # Une référence manquante rend la colonne Recolt flottante (101.0)
+    reconciliation = Reconciliation(sales([101, 102, 103]),
+                                    collections([101.0, np.nan, 103.0, 999.0], [100.0, 5.0, 40.0, 1.0]))
+    summary = reconciliation.summary()
+
+    assert summary['paid_sales'] == 2
+    assert summary['unpaid_sales'] == 1
+    assert summary['orphan_collections'] == 1
+    assert summary['collected_amount'] == 140.0
+    assert summary['outstanding_amount'] == 160.0
+    assert reconciliation.unpaid()['ORDER_REFERENCE'].tolist() == ['102']
+
+
+def test_orphans_match_sales_added_later():
+    reconciliation = Reconciliation(sales(['A1']), collections(['A1', 'B2'], [100.0, 30.0]))
+    assert reconciliation.summary()['orphan_collections'] == 1
+
+    reconciliation.apply_delta(sales=sales(['B2', 'A1'], day='2024-01-02'))
+    summary = reconciliation.summary()
+    assert summary['orphan_collections'] == 0
+    assert summary['paid_sales'] == 2
+    assert summary['duplicate_references'] == 1
+
+
+def test_lag_and_first_collection():
+    reconciliation = Reconciliation(sales(['A1']), collections(['A1'], [40.0], day='2024-01-05'))
+    reconciliation.apply_delta(collections=collections(['A1'], [60.0], day='2024-01-03', bank='SG'))
+
+    status = reconciliation.sales_status()
+    assert status.loc[0, 'collections'] == 2
+    assert status.loc[0, 'first_collection'] == pd.Timestamp('2024-01-03')
+    assert status.loc[0, 'outstanding'] == 0
+    lag = reconciliation.lag('Banques').set_index('Banques')
+    assert lag.loc['BNP', 'lag_mean'] == 4.0
+    assert lag.loc['SG', 'lag_mean'] == 2.0
@@ -0,0 +1,114 @@
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from sql_sync import SalesSync
+
+SCHEMA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Database_Script_SQLite.sql')
+
+
+@pytest.fixture
+def db():
+    conn = sqlite3.connect(':memory:', check_same_thread=False)
+    with open(SCHEMA, encoding='utf-8') as f:
+        conn.executescript(f.read())
+    conn.execute("INSERT INTO Users (Hyp, UserName, PassWord) VALUES ('H1', 'u1', 'x')")
+    conn.execute("INSERT INTO Effectifs (Hyp, UserName, NOM, PRENOM, Team, Activité) "
+                 "VALUES ('H1', 'u1', 'N', 'P', 'T1', 'Vente')")
+    conn.commit()
+    return conn
+
+
+def add_sale(conn, id_sale, order_date, amount=10.0, hyp='H1'):
+    conn.execute(
+        "INSERT INTO Sales (Id_Sale, Hyp, ORDER_REFERENCE, ORDER_DATE, Country, City, Total_sale) "
+        "VALUES (?, ?, ?, ?, 'FR', 'Paris', ?)",
+        (id_sale, hyp, f"R{id_sale}", order_date, amount))
+    conn.commit()
+
+
+def test_delta_reads_ties_on_order_date_by_id(db, tmp_path):
+    add_sale(db, 1, '2024-01-01 10:00:00')
+    add_sale(db, 2, '2024-01-02 12:00:00')
+    sync = SalesSync(str(tmp_path))
+    assert len(sync.refresh(db)) == 2
+    assert sync.high_water_mark() == (pd.Timestamp('2024-01-02 12:00:00'), 2)
+
+    # Même ORDER_DATE que le point de reprise, Id_Sale plus grand : lue une seule fois
+    add_sale(db, 3, '2024-01-02 12:00:00')
+    add_sale(db, 4, '2024-01-03 08:00:00')
+    delta = sync.refresh(db)
+    assert sorted(delta['Id_Sale']) == [3, 4]
+    assert sorted(sync.sales_df['Id_Sale']) == [1, 2, 3, 4]
+    assert sync.high_water_mark() == (pd.Timestamp('2024-01-03 08:00:00'), 4)
+
+
+def test_refresh_without_new_sales_keeps_version(db, tmp_path):
+    add_sale(db, 1, '2024-01-01 10:00:00')
+    sync = SalesSync(str(tmp_path))
+    sync.refresh(db)
+    version = sync.version
+
+    assert sync.refresh(db).empty
+    assert sync.version == version
+    assert len(sync.sales_df) == 1
+
+
+def test_full_refresh_sees_modified_sales(db, tmp_path):
+    add_sale(db, 1, '2024-01-01 10:00:00', amount=10.0)
+    sync = SalesSync(str(tmp_path))
+    sync.refresh(db)
+    db.execute("UPDATE Sales SET Total_sale = 99 WHERE Id_Sale = 1")
+    db.commit()
+
+    assert sync.refresh(db).empty  # une modification n'est pas vue par le delta
+    sync.refresh(db, full=True)
+    assert sync.sales_df['Total_sale'].tolist() == [99.0]
+
+
+def test_local_copy_resumes_from_its_mark(db, tmp_path):
+    pytest.importorskip('pyarrow')
+    add_sale(db, 1, '2024-01-01 10:00:00')
+    add_sale(db, 2, '2024-01-01 10:00:00')
+    SalesSync(str(tmp_path)).refresh(db)
+
+    add_sale(db, 3, '2024-01-01 10:00:00')
+    restarted = SalesSync(str(tmp_path))
+    assert restarted.high_water_mark() == (pd.Timestamp('2024-01-01 10:00:00'), 2)
+    assert restarted.refresh(db)['Id_Sale'].tolist() == [3]
+    assert sorted(restarted.sales_df['Id_Sale']) == [1, 2, 3]
+
+    # Copie locale en deux fichiers (initial + delta), toujours complétable
+    add_sale(db, 4, '2024-01-02 09:00:00')
+    again = SalesSync(str(tmp_path))
+    assert again.refresh(db)['Id_Sale'].tolist() == [4]
+    assert again.sales_df['City'].dtype == 'category'
+    assert len(again.sales_df) == 4
+
+
+def test_staff_is_read_with_sales(db, tmp_path):
+    sync = SalesSync(str(tmp_path))
+    sync.refresh(db)
+    assert sync.staff_df['Hyp'].tolist() == ['H1']
+
+
+def test_published_structures_are_not_changed_by_later_deltas(db, tmp_path):
+    add_sale(db, 1, '2024-01-01 10:00:00', amount=10.0)
+    sync = SalesSync(str(tmp_path))
+    sync.refresh(db)
+    cube_spec, trend_spec = ('Total_sale', ('Country', 'City', 'Hyp')), ('Total_sale', 'Hyp')
+    before = sync.state(cubes=[cube_spec], trends=[trend_spec], leaderboards=['Total_sale'])
+
+    add_sale(db, 2, '2024-01-02 10:00:00', amount=5.0)
+    sync.refresh(db)
+    after = sync.state(cubes=[cube_spec], trends=[trend_spec], leaderboards=['Total_sale'])
+
+    assert len(before.sales_df) == 1 and len(after.sales_df) == 2
+    assert before.cubes[cube_spec].cells['sum'].sum() == 10.0
+    assert after.cubes[cube_spec].cells['sum'].sum() == 15.0
+    assert before.trends[trend_spec].totals()['H1'] == 10.0
+    assert after.trends[trend_spec].totals()['H1'] == 15.0
+    assert before.leaderboards['Total_sale'].window()[0, 0] == 10.0
+    assert after.leaderboards['Total_sale'].window()[0, 0] == 15.0
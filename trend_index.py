@@ -0,0 +1,194 @@
+"""Séries temporelles par entité (Hyp, City, Team) pour les tendances.
+
+Le seul graphique temporel (ventes d'un agent par date) regroupait les
+lignes brutes à chaque exécution. `TrendIndex` agrège une fois les montants
+au grain jour x entité, sur un calendrier continu trié, et garde leurs
+cumuls par colonne : une somme glissante sur N jours est une différence de
+deux lignes du cumul, un regroupement par semaine ou par mois une somme par
+blocs de lignes. Une requête coûte O(jours x entités demandées), jamais un
+parcours des transactions.
+
+Les nouvelles ventes (`apply_delta`) ne recalculent les cumuls qu'à partir
+du premier jour touché, le plus souvent les derniers jours du calendrier.
+"""
+import numpy as np
+import pandas as pd
+
+# Périodes de regroupement : code pandas -> période (pour les bornes)
+PERIODS = {'W': 'W', 'MS': 'M'}
+
+
+class TrendIndex:
+    """Cumuls journaliers (jours x entités) d'une colonne de montants."""
+
+    def __init__(self, df, value_column, by, date_column='ORDER_DATE'):
+        self.value_column = value_column
+        self.by = by
+        self.date_column = date_column
+        self.keys = pd.Index([])
+        self.days = pd.DatetimeIndex([])
+        self._cumsum = np.zeros((0, 0))
+        self.apply_delta(df)
+
+    @classmethod
+    def _from_cumsum(cls, cumsum, days, keys, value_column, by, date_column):
+        index = cls.__new__(cls)
+        index.value_column = value_column
+        index.by = by
+        index.date_column = date_column
+        index.keys = keys
+        index.days = days
+        index._cumsum = cumsum
+        return index
+
+    def _aggregate(self, df):
+        frame = pd.DataFrame({
+            'day': pd.to_datetime(df[self.date_column], errors='coerce').dt.normalize(),
+            'key': df[self.by],
+            'value': pd.to_numeric(df[self.value_column], errors='coerce').fillna(0),
+        })
+        return (frame.dropna(subset=['day', 'key'])
+                .groupby(['day', 'key'], observed=True, sort=False)['value'].sum()
+                .reset_index())
+
+    def apply_delta(self, delta_df):
+        """Ajoute des transactions ; les cumuls ne sont recalculés qu'à partir du premier jour touché."""
+        delta = self._aggregate(delta_df)
+        if delta.empty:
+            return
+
+        # Nouvelles entités : colonnes ajoutées en fin de matrice
+        new_keys = pd.Index(delta['key'].unique()).difference(self.keys)
+        if len(new_keys):
+            self.keys = self.keys.append(new_keys)
+            self._cumsum = np.pad(self._cumsum, ((0, 0), (0, len(new_keys))))
+
+        # Calendrier continu étendu aux nouveaux jours (avant ou après)
+        first, last = delta['day'].min(), delta['day'].max()
+        if len(self.days):
+            before = max(0, (self.days[0] - first).days)
+            after = max(0, (last - self.days[-1]).days)
+            if before:
+                self._cumsum = np.pad(self._cumsum, ((before, 0), (0, 0)))
+            if after:
+                self._cumsum = np.pad(self._cumsum, ((0, after), (0, 0)), mode='edge')
+            first, last = min(first, self.days[0]), max(last, self.days[-1])
+        elif len(self.keys):
+            self._cumsum = np.zeros(((last - first).days + 1, len(self.keys)))
+        self.days = pd.date_range(first, last, freq='D')
+
+        # Montants du delta au grain jour x entité, cumulés à partir du premier jour touché
+        rows = (delta['day'] - self.days[0]).dt.days.to_numpy()
+        columns = self.keys.get_indexer(delta['key'])
+        start = rows.min()
+        increments = np.zeros((len(self.days) - start, len(self.keys)))
+        np.add.at(increments, (rows - start, columns), delta['value'].to_numpy(dtype='float64'))
+        # Nouveau tableau (pas de modification en place) : une copie superficielle de l'index reste intacte
+        self._cumsum = np.concatenate([self._cumsum[:start], self._cumsum[start:] + np.cumsum(increments, axis=0)])
+
+    def _columns(self, keys):
+        if keys is None:
+            return slice(None), self.keys
+        keys = pd.Index(keys)
+        positions = self.keys.get_indexer(keys)
+        return positions[positions >= 0], keys[positions >= 0]
+
+    def _rows(self, start_date, end_date):
+        lo = 0 if start_date is None else self.days.searchsorted(pd.Timestamp(start_date).normalize(), 'left')
+        hi = len(self.days) if end_date is None else self.days.searchsorted(pd.Timestamp(end_date).normalize(), 'right')
+        return lo, hi
+
+    def _cumsum_before(self, row, columns):
+        """Cumul jusqu'à la veille de `row` (zéro avant le premier jour)."""
+        if row <= 0:
+            return np.zeros(self._cumsum[0:1, columns].shape[1])
+        return self._cumsum[row - 1, columns]
+
+    def daily(self, keys=None, start_date=None, end_date=None):
+        """Montants journaliers (jours x entités)."""
+        return self.rolling(1, keys, start_date, end_date)
+
+    def rolling(self, window, keys=None, start_date=None, end_date=None):
+        """Sommes glissantes sur `window` jours (jour inclus), jours x entités."""
+        columns, labels = self._columns(keys)
+        lo, hi = self._rows(start_date, end_date)
+        if hi <= lo:
+            return pd.DataFrame(columns=labels, index=self.days[:0], dtype='float64')
+        cumsum = self._cumsum[:, columns]
+        current = cumsum[lo:hi]
+        rows = np.arange(lo, hi) - window
+        previous = np.where((rows >= 0)[:, None], cumsum[np.maximum(rows, 0)], 0.0)
+        return pd.DataFrame(current - previous, index=self.days[lo:hi], columns=labels)
+
+    def totals(self, keys=None, start_date=None, end_date=None):
+        """Total par entité sur la période."""
+        columns, labels = self._columns(keys)
+        lo, hi = self._rows(start_date, end_date)
+        if hi <= lo:
+            return pd.Series(0.0, index=labels, name=self.value_column)
+        return pd.Series(self._cumsum[hi - 1, columns] - self._cumsum_before(lo, columns),
+                         index=labels, name=self.value_column)
+
+    def resample(self, freq='W', keys=None, start_date=None, end_date=None):
+        """Sommes par semaine ('W') ou par mois ('MS'), indexées par le premier jour de la période."""
+        columns, labels = self._columns(keys)
+        lo, hi = self._rows(start_date, end_date)
+        days = self.days[lo:hi]
+        if not len(days):
+            return pd.DataFrame(columns=labels, dtype='float64')
+        periods = days.to_period(PERIODS[freq])
+        starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+        ends = np.r_[starts[1:], len(days)] - 1
+        cumsum = self._cumsum[:, columns]
+        before = np.where((starts + lo > 0)[:, None], cumsum[np.maximum(starts + lo - 1, 0)], 0.0)
+        sums = cumsum[ends + lo] - before
+        return pd.DataFrame(sums, index=periods[starts].start_time, columns=labels)
+
+    def period_deltas(self, freq='W', keys=None, complete=True):
+        """Variation par entité entre les deux dernières périodes.
+
+        Avec `complete`, la période en cours (pas encore terminée au dernier
+        jour connu) est ignorée. Colonnes : entité, current, previous, delta,
+        delta_pct ; triées par variation décroissante.
+        """
+        sums = self.resample(freq, keys)
+        if complete and len(sums):
+            last_day = self.days[-1]
+            if (sums.index[-1].to_period(PERIODS[freq]).end_time.normalize()) > last_day:
+                sums = sums.iloc[:-1]
+        columns = [self.by, 'period', 'current', 'previous', 'delta', 'delta_pct']
+        if len(sums) < 2:
+            return pd.DataFrame(columns=columns)
+        current, previous = sums.iloc[-1], sums.iloc[-2]
+        delta = current - previous
+        result = pd.DataFrame({
+            self.by: sums.columns,
+            'period': sums.index[-1],
+            'current': current.to_numpy(),
+            'previous': previous.to_numpy(),
+            'delta': delta.to_numpy(),
+            'delta_pct': (delta / previous.where(previous != 0)).to_numpy() * 100,
+        })
+        return result.sort_values('delta', ascending=False, ignore_index=True)
+
+    def top_keys(self, n, window=30):
+        """Les `n` entités au plus fort total sur les `window` derniers jours."""
+        if not len(self.days):
+            return self.keys[:0]
+        recent = self.totals(start_date=self.days[-1] - pd.Timedelta(days=window - 1))
+        return recent.nlargest(n).index
+
+    def grouped(self, mapping, by=None):
+        """Index regroupé par `mapping` (entité -> groupe, par exemple Hyp -> Team).
+
+        Les cumuls sont additionnés par groupe : aucune transaction n'est relue.
+        Les entités absentes de `mapping` sont ignorées.
+        """
+        groups = pd.Series(mapping).reindex(self.keys)
+        known = groups.notna().to_numpy()
+        codes, labels = pd.factorize(groups[known])
+        cumsum = np.zeros((len(self.days), len(labels)))
+        if len(labels):
+            np.add.at(cumsum.T, codes, self._cumsum[:, known].T)
+        return self._from_cumsum(cumsum, self.days, pd.Index(labels), self.value_column,
+                                 by or groups.name or 'group', self.date_column)
@@ -0,0 +1,333 @@
+"""Lecture en flux d'un classeur XLSX/XLSM, toutes feuilles en une passe.
+
+Le zip est ouvert une seule fois ; les chaînes partagées et les styles sont lus
+une fois, puis chaque feuille demandée est parcourue ligne par ligne
+(`iterparse`). Seules les colonnes retenues sont conservées et converties au
+fil de l'eau dans des tampons typés : on ne construit jamais de DataFrame
+complet en `object` avant de le typer.
+"""
+import posixpath
+import re
+import xml.etree.ElementTree as ET
+import zipfile
+from array import array
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+
+# numFmtId intégrés d'Excel correspondant à des dates / heures
+BUILTIN_DATE_FORMATS = set(range(14, 23)) | {45, 46, 47}
+DATE_FORMAT_CODE = re.compile(r'[dmyhs]', re.IGNORECASE)
+FORMAT_NOISE = re.compile(r'"[^"]*"|\[[^\]]*\]|\\.')
+
+COLUMN_REF = re.compile(r'([A-Z]+)')
+
+
+def column_index(letters):
+    """'A' -> 0, 'AB' -> 27."""
+    index = 0
+    for char in letters:
+        index = index * 26 + (ord(char) - 64)
+    return index - 1
+
+
+def parse_column_range(usecols):
+    """Indices des colonnes d'une plage de type 'A:H' ou 'A,C,E:F'."""
+    indices = []
+    for part in usecols.replace(' ', '').upper().split(','):
+        if ':' in part:
+            start, end = part.split(':')
+            indices.extend(range(column_index(start), column_index(end) + 1))
+        elif part:
+            indices.append(column_index(part))
+    return indices
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _namespace(tag):
+    return tag[1:].split('}', 1)[0] if tag.startswith('{') else ''
+
+
+def _sheet_paths(zf):
+    """Associe chaque nom de feuille au chemin de son XML dans le zip."""
+    rels = ET.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+    targets = {}
+    for rel in rels.iter(f'{{{PKG_REL_NS}}}Relationship'):
+        target = rel.get('Target')
+        if target.startswith('/'):
+            target = target[1:]
+        else:
+            target = posixpath.normpath(posixpath.join('xl', target))
+        targets[rel.get('Id')] = target
+
+    workbook = ET.fromstring(zf.read('xl/workbook.xml'))
+    paths = {}
+    for sheet in workbook.iter():
+        if _local(sheet.tag) == 'sheet':
+            paths[sheet.get('name')] = targets[sheet.get(f'{{{REL_NS}}}id')]
+    return paths
+
+
+def _shared_strings(zf):
+    if 'xl/sharedStrings.xml' not in zf.namelist():
+        return []
+    strings = []
+    with zf.open('xl/sharedStrings.xml') as f:
+        for _, elem in ET.iterparse(f, events=('end',)):
+            if _local(elem.tag) == 'si':
+                # Texte riche : concaténation des <t>, sans les annotations phonétiques
+                strings.append(''.join(
+                    t.text or '' for t in elem.iter()
+                    if _local(t.tag) == 't'
+                ))
+                elem.clear()
+    return strings
+
+
+def _date_styles(zf):
+    """Indices de styles (attribut `s` des cellules) qui affichent une date."""
+    if 'xl/styles.xml' not in zf.namelist():
+        return set()
+    styles = ET.fromstring(zf.read('xl/styles.xml'))
+    custom_dates = set()
+    cell_xfs = None
+    for elem in styles:
+        name = _local(elem.tag)
+        if name == 'numFmts':
+            for fmt in elem:
+                code = FORMAT_NOISE.sub('', fmt.get('formatCode', ''))
+                if DATE_FORMAT_CODE.search(code):
+                    custom_dates.add(int(fmt.get('numFmtId')))
+        elif name == 'cellXfs':
+            cell_xfs = elem
+    if cell_xfs is None:
+        return set()
+    date_styles = set()
+    for index, xf in enumerate(cell_xfs):
+        fmt_id = int(xf.get('numFmtId', 0))
+        if fmt_id in BUILTIN_DATE_FORMATS or fmt_id in custom_dates:
+            date_styles.add(str(index))
+    return date_styles
+
+
+class _Column:
+    """Tampon d'une colonne retenue, typé dès la lecture."""
+
+    def __init__(self, name, dtype):
+        self.name = name
+        self.dtype = dtype
+        if dtype in ('float', 'datetime'):
+            self.values = array('d')
+            self.text = {}  # valeurs texte d'une colonne date, converties à la fin
+        else:
+            self.values = []
+            self.date_positions = set()  # valeurs numériques affichées comme des dates
+
+    def append(self, kind, raw, is_date):
+        if self.dtype == 'float':
+            if kind == 'n':
+                self.values.append(float(raw))
+            else:
+                self.values.append(_to_float(raw))
+        elif self.dtype == 'datetime':
+            if kind == 'n':
+                self.values.append(float(raw))
+            else:
+                if raw is not None:
+                    self.text[len(self.values)] = raw
+                self.values.append(np.nan)
+        elif self.dtype == 'str':
+            self.values.append(None if raw is None else str(raw) if kind != 'n' else _number_text(raw))
+        else:
+            if kind == 'n' and is_date:
+                self.date_positions.add(len(self.values))
+            self.values.append(float(raw) if kind == 'n' else raw)
+
+    def to_series(self):
+        if self.dtype == 'float':
+            return pd.Series(np.frombuffer(self.values, dtype='float64'), name=self.name)
+        if self.dtype == 'datetime':
+            dates = pd.Series(_excel_dates(np.frombuffer(self.values, dtype='float64')), name=self.name)
+            if self.text:
+                positions = list(self.text)
+                dates.iloc[positions] = pd.to_datetime(pd.Series(list(self.text.values())), errors='coerce').values
+            return dates
+        if self.dtype == 'str':
+            return pd.Series([np.nan if v is None else v for v in self.values], dtype=object, name=self.name)
+        return _infer_series(self.name, self.values, self.date_positions)
+
+
+def _to_float(raw):
+    if raw is None:
+        return np.nan
+    try:
+        return float(raw)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _number_text(raw):
+    value = float(raw)
+    return str(int(value)) if value.is_integer() else str(value)
+
+
+def _excel_dates(serials):
+    """Numéros de série Excel -> datetime64, arrondis à la milliseconde."""
+    return pd.to_datetime(np.round(serials * 86_400_000), unit='ms', origin=EXCEL_EPOCH)
+
+
+def _excel_value(value):
+    """Valeur Python d'une date Excel isolée (heure seule si < 1 jour)."""
+    timestamp = EXCEL_EPOCH + timedelta(milliseconds=round(value * 86_400_000))
+    return timestamp.time() if value < 1 else timestamp
+
+
+def _infer_series(name, values, date_positions):
+    """Inférence proche de pd.read_excel pour les colonnes sans type imposé."""
+    non_null = [v for v in values if v is not None]
+    if not non_null:
+        return pd.Series(np.full(len(values), np.nan), name=name)
+    all_numbers = all(isinstance(v, float) for v in non_null)
+    if all_numbers and len(date_positions) == len(non_null) and max(non_null) >= 1:
+        numbers = np.array([np.nan if v is None else v for v in values], dtype='float64')
+        return pd.Series(_excel_dates(numbers), name=name)
+    if all_numbers and not date_positions:
+        numbers = np.array([np.nan if v is None else v for v in values], dtype='float64')
+        if len(non_null) == len(values) and np.all(np.mod(numbers, 1) == 0):
+            return pd.Series(numbers.astype('int64'), name=name)
+        return pd.Series(numbers, name=name)
+    converted = [
+        np.nan if v is None
+        else _excel_value(v) if i in date_positions
+        else int(v) if isinstance(v, float) and v.is_integer() else v
+        for i, v in enumerate(values)
+    ]
+    return pd.Series(converted, dtype=object, name=name)
+
+
+def _cell_value(cell, kind, strings, ns_t, ns_v, ns_is):
+    """(type, valeur brute) d'une cellule ; le type 'n' garde la valeur en texte."""
+    if kind == 'inlineStr':
+        inline = cell.find(ns_is)
+        return 's', ''.join(t.text or '' for t in inline.iter(ns_t)) if inline is not None else None
+    v = cell.find(ns_v)
+    if v is None or v.text is None:
+        return None, None
+    if kind == 's':
+        return 's', strings[int(v.text)]
+    if kind in ('str', 'd'):
+        return 's', v.text
+    if kind == 'b':
+        return 'b', v.text == '1'
+    if kind == 'e':
+        return None, None
+    return 'n', v.text
+
+
+def _read_sheet(zf, path, usecols, dtypes, strings, date_styles):
+    ns_row = ns_c = None
+    header = None
+    columns = None
+    positions = {}
+    ns = {}
+    row_number = 0
+    last_row = None
+
+    with zf.open(path) as f:
+        for _, elem in ET.iterparse(f, events=('end',)):
+            if ns_row is None:
+                prefix = _namespace(elem.tag)
+                prefix = f'{{{prefix}}}' if prefix else ''
+                ns_row, ns_c = f'{prefix}row', f'{prefix}c'
+                ns = {'t': f'{prefix}t', 'v': f'{prefix}v', 'is': f'{prefix}is'}
+            if elem.tag != ns_row:
+                continue
+
+            row_number = int(elem.get('r', row_number + 1))
+            cells = {}
+            row_has_value = False
+            for position, cell in enumerate(elem.iter(ns_c)):
+                row_has_value = row_has_value or len(cell) > 0
+                ref = cell.get('r')
+                index = column_index(COLUMN_REF.match(ref).group(1)) if ref else position
+                if header is not None and index not in positions:
+                    continue
+                kind, raw = _cell_value(cell, cell.get('t'), strings, ns['t'], ns['v'], ns['is'])
+                if raw is not None:
+                    cells[index] = (kind, raw, cell.get('s') in date_styles)
+            elem.clear()
+
+            if header is None:
+                if not cells:
+                    continue
+                header = {index: _header_text(kind, raw) for index, (kind, raw, _) in cells.items()}
+                columns, positions = _select_columns(header, usecols, dtypes)
+                last_row = row_number
+                continue
+            if not row_has_value:
+                continue
+            # Comme pandas, les lignes vides intermédiaires sont conservées
+            # (et celles de fin de feuille ignorées)
+            for _ in range(row_number - last_row - 1):
+                for column in columns:
+                    column.append(None, None, False)
+            last_row = row_number
+            for index, column in positions.items():
+                kind, raw, is_date = cells.get(index, (None, None, False))
+                column.append(kind, raw, is_date)
+
+    if columns is None:
+        return pd.DataFrame()
+    return pd.concat([column.to_series() for column in columns], axis=1)
+
+
+def _header_text(kind, raw):
+    return _number_text(raw) if kind == 'n' else str(raw)
+
+
+def _select_columns(header, usecols, dtypes):
+    if usecols is None:
+        selected = sorted(header)
+    elif isinstance(usecols, str):
+        selected = [index for index in parse_column_range(usecols) if index in header]
+    else:
+        by_name = {name: index for index, name in sorted(header.items(), reverse=True)}
+        missing = [name for name in usecols if name not in by_name]
+        if missing:
+            raise ValueError(
+                f"Usecols do not match columns, columns expected but not found: {missing}"
+            )
+        selected = sorted(by_name[name] for name in usecols)
+    columns = [_Column(header[index], dtypes.get(header[index])) for index in selected]
+    return columns, dict(zip(selected, columns))
+
+
+def read_sheets(excel_file, sheets, dtypes=None):
+    """Lit plusieurs feuilles en une seule ouverture du classeur.
+
+    `sheets` associe chaque nom de feuille à ses colonnes (`usecols`) : une
+    liste de noms d'en-tête, une plage de lettres ('A:H') ou None pour tout
+    garder. `dtypes` impose par feuille un type par colonne parmi 'float',
+    'datetime' et 'str' ; les autres colonnes sont inférées.
+    """
+    dtypes = dtypes or {}
+    with zipfile.ZipFile(excel_file) as zf:
+        paths = _sheet_paths(zf)
+        missing = [name for name in sheets if name not in paths]
+        if missing:
+            raise ValueError(f"Worksheet(s) {missing} not found")
+        strings = _shared_strings(zf)
+        date_styles = _date_styles(zf)
+        return {
+            name: _read_sheet(zf, paths[name], usecols, dtypes.get(name, {}), strings, date_styles)
+            for name, usecols in sheets.items()
+        }